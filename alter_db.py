@@ -1,30 +1,81 @@
-import sqlite3
-import os
+import sys
+from app import create_app, db
+from app.migrations import upgrade, check_index_usage
 
-# 数据库路径
-db_path = os.path.join('instance', 'database.db')
-if not os.path.exists(db_path):
-    # 尝试在 app 目录下查找
-    db_path = os.path.join('app', 'dormitory.db')
+# 数据库迁移脚本
+#   python alter_db.py            执行未执行的迁移
+#   python alter_db.py --explain  检查仪表板和列表查询是否使用了索引
+#   python alter_db.py --rebuild-rollups  用账单表重建水电费汇总表
+#   python alter_db.py --reconcile-occupancy  按学生表校正各宿舍入住人数（加 --dry-run 只报告偏差）
+#   python alter_db.py --rebuild-search-index  重建学生/访客/报修的全文搜索索引
+#   python alter_db.py --archive-deleted [--days N]  把软删除超过 N 天（默认 SOFT_DELETE_RETENTION_DAYS）的记录移入归档表
+#   python alter_db.py --rotate-visitors  把过期的访客记录移入按月历史分区，删除超过保留期的分区和二维码缓存
+#   python alter_db.py --purge-photos  删除没有学生引用、超过 PHOTO_PURGE_GRACE 秒未使用的照片及缩略图
+#   python alter_db.py --checkout-visitors [--hours N]  把登记超过 N 小时（默认 VISITOR_SWEEP_MIN_AGE_HOURS）仍在访的访客标记为离开
 
-print(f"Connecting to database at: {db_path}")
+app = create_app()
 
-try:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+with app.app_context():
+    print(f"Connecting to database at: {app.config['SQLALCHEMY_DATABASE_URI']}")
 
-    # 添加 email 列到 users 表
-    try:
-        cursor.execute("ALTER TABLE users ADD COLUMN email VARCHAR(120)")
-        print("Successfully added 'email' column to 'users' table.")
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" in str(e):
-            print("'email' column already exists in 'users' table.")
+    if '--explain' in sys.argv:
+        for label, plan, full_scan in check_index_usage():
+            print(f"[{'全表扫描' if full_scan else '使用索引'}] {label}")
+            for line in plan:
+                print(f"    {line}")
+    elif '--rebuild-rollups' in sys.argv:
+        from app.services.bill_rollups import rebuild_rollups
+        with db.engine.begin() as conn:
+            rebuild_rollups(conn)
+        print("Utility bill rollups rebuilt.")
+    elif '--reconcile-occupancy' in sys.argv:
+        from app.services.occupancy import reconcile_occupancy
+        report = reconcile_occupancy(fix='--dry-run' not in sys.argv)
+        for dorm_id, dorm_number, recorded, actual in report.drift:
+            print(f"Dormitory {dorm_number} (#{dorm_id}): recorded {recorded}, actual {actual}")
+        print(f"Checked {report.checked} dormitories, {len(report.drift)} drifted"
+              f"{', fixed' if report.fixed else ''} in {report.elapsed * 1000:.1f} ms.")
+        if report.over_capacity:
+            print(f"Over capacity: {', '.join(report.over_capacity)}")
+    elif '--rebuild-search-index' in sys.argv:
+        from app.services.search import rebuild_search_index
+        with db.engine.begin() as conn:
+            counts = rebuild_search_index(conn)
+        if counts:
+            print("Search index rebuilt: " + ", ".join(f"{kind} {count}" for kind, count in counts.items()))
         else:
-            print(f"Error adding 'email' column: {e}")
-
-    conn.commit()
-    conn.close()
-
-except Exception as e:
-    print(f"Database connection error: {e}")
+            print("Search index is not available on this database; run migrations first.")
+    elif '--archive-deleted' in sys.argv:
+        from app.services.soft_delete import archive_deleted
+        days = int(sys.argv[sys.argv.index('--days') + 1]) if '--days' in sys.argv else None
+        report = archive_deleted(days)
+        for table, count in report.archived.items():
+            print(f"{table}: archived {count}, kept {report.kept.get(table, 0)} (still referenced)")
+        print(f"Archived rows deleted before {report.cutoff:%Y-%m-%d %H:%M} in {report.elapsed * 1000:.1f} ms.")
+    elif '--rotate-visitors' in sys.argv:
+        from app.services.visitor_log import rotate_visitor_log
+        report = rotate_visitor_log()
+        for month, count in sorted(report.moved.items()):
+            print(f"{month}: moved {count} visits to history")
+        if report.dropped:
+            print(f"Dropped expired partitions: {', '.join(report.dropped)}")
+        print(f"Rotated visits before {report.cutoff:%Y-%m-%d %H:%M}, removed {report.qr_removed} QR files "
+              f"in {report.elapsed * 1000:.1f} ms.")
+    elif '--purge-photos' in sys.argv:
+        from app.services.photos import purge_unused_photos
+        removed = purge_unused_photos()
+        print(f"Removed {removed} unused photos.")
+    elif '--checkout-visitors' in sys.argv:
+        from datetime import datetime, timedelta
+        from app.services.gate import bulk_checkout
+        hours = int(sys.argv[sys.argv.index('--hours') + 1]) if '--hours' in sys.argv else app.config['VISITOR_SWEEP_MIN_AGE_HOURS']
+        report = bulk_checkout(before=datetime.now() - timedelta(hours=hours))
+        for building, count in sorted(report.counts.items()):
+            print(f"Building {building}: checked out {count}")
+        print(f"Checked out {report.total} visitors registered more than {hours} hours ago in {report.elapsed * 1000:.1f} ms.")
+    else:
+        applied = upgrade()
+        for version, name in applied:
+            print(f"Applied migration {version}: {name}")
+        if not applied:
+            print("Database is up to date.")
@@ -2,10 +2,12 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 from config.config import Config
+from app.services.cache import Cache
 
 # 创建数据库实例
 db = SQLAlchemy()
 csrf = CSRFProtect()
+cache = Cache()
 
 def create_app():
     # 创建Flask应用实例
@@ -17,6 +19,31 @@ def create_app():
     # 初始化数据库
     db.init_app(app)
     csrf.init_app(app)
+    cache.init_app(app)
+    
+    # 注册仪表板计数缓存、水电费汇总表、登录身份缓存、参考数据缓存、搜索索引和软删除过滤的会话事件
+    from app.services import dashboard_counters, bill_rollups, identity, reference_data, search, soft_delete
+    
+    # 初始化后台任务执行器和周期任务调度
+    from app.services.jobs import jobs, scheduler
+    jobs.init_app(app)
+    scheduler.init_app(app)
+    
+    # 宿管端实时推送（SSE）的事件分发
+    from app.services.live_events import broker
+    broker.init_app(app)
+    
+    # 初始化发件箱后台发送线程
+    from app.services.mailer import mailer
+    mailer.init_app(app)
+    
+    # 响应压缩和 JSON 接口的 ETag/304
+    from app.services.http_cache import response_optimizer
+    response_optimizer.init_app(app)
+    
+    # 模板中按尺寸选择学生照片
+    from app.services.photos import photo_url
+    app.jinja_env.globals['photo_url'] = photo_url
     
     # 导入并注册蓝图
     from app.views.main import main_bp
@@ -0,0 +1,712 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from flask import jsonify, request, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from app.api import api_bp
+from app import db
+from app.models.models import User, Student, Dormitory, UtilityBill, Payment, Repair, Visitor, DormChangeRequest
+from app.services.billing import compute_bill_costs, bill_due_date
+from app.services.identity import hash_password
+from app.services.occupancy import apply_occupancy_changes, DormFullError
+from app.services.pagination import ListParams, paginate, building_filter
+from app.services.soft_delete import include_deleted
+from app.services.student_import import DEFAULT_PASSWORD
+
+# 管理员端 JSON 接口：
+#   GET    /api/admin/<资源>?page=&per_page=&sort=&order=&fields=a,b   分页列表
+#   GET    /api/admin/<资源>/<id>?fields=a,b                          详情
+#   POST   /api/admin/<资源>          [{...}, ...]                    批量新增
+#   PATCH  /api/admin/<资源>          [{"id": 1, ...}, ...]           批量修改
+#   DELETE /api/admin/<资源>          {"ids": [1, 2]}                 批量删除
+#   POST   /api/admin/<资源>/batch    {"create": [], "update": [], "delete": []}
+# 批量操作在一个事务中完成，任何一条校验失败都整体回滚，并返回逐条错误 [{op, index, msg}]
+
+def _fmt(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+def _require(data, *fields):
+    missing = [f for f in fields if data.get(f) in (None, '')]
+    if missing:
+        raise ValueError(f'Missing field: {", ".join(missing)}')
+
+def _number(data, field, cast=int):
+    try:
+        return cast(data[field])
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {field}')
+
+def _choice(data, field, choices):
+    if data[field] not in choices:
+        raise ValueError(f'Invalid {field}, expected one of: {", ".join(choices)}')
+    return data[field]
+
+def _existing_ids(model, values):
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    if not ids:
+        return set()
+    return {row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+
+def _dorm_id(data, dorm_ids):
+    # dorm_id 为空表示未分配宿舍
+    if data.get('dorm_id') in (None, ''):
+        return None
+    dorm_id = _number(data, 'dorm_id')
+    if dorm_id not in dorm_ids:
+        raise ValueError('Dormitory not found')
+    return dorm_id
+
+def _occupancy_errors(deltas, indexes):
+    """
+    按宿舍原子调整入住人数 {宿舍ID: 变化人数}，床位不足时该宿舍涉及的每条记录都返回错误
+    """
+    errors = []
+    for dorm_id in sorted(dorm_id for dorm_id in deltas if dorm_id):
+        try:
+            apply_occupancy_changes({dorm_id: deltas[dorm_id]})
+        except DormFullError:
+            errors += [(index, 'Dormitory is full') for index in indexes[dorm_id]]
+    return errors
+
+class BatchErrors(Exception):
+    def __init__(self, errors):
+        super().__init__('batch validation failed')
+        self.errors = errors
+
+class Resource:
+    """
+    一种管理员接口资源
+
+    fields: {字段名: (取值函数, 所需的关系预加载名或None)}，请求 fields= 时只预加载用到的关系
+    relations / batch_options 是返回预加载选项的函数（backref 在映射配置完成后才存在）
+    create(items) / update([(index, (obj, data))]) / delete([(index, obj)]) 在同一个会话中修改数据，
+    返回逐条错误 [(index, msg)]；batch_options 用于批量修改/删除时加载记录
+    """
+    def __init__(self, model, fields, relations, sort_columns, default_sort, filters=None,
+                 default_order='desc', live_only=False, create=None, update=None, delete=None, batch_options=tuple):
+        self.model = model
+        self.fields = fields
+        self.relations = relations
+        self.sort_columns = sort_columns
+        self.default_sort = default_sort
+        self.filters = filters or {}
+        self.default_order = default_order
+        self.live_only = live_only
+        self.create = create
+        self.update = update
+        self.delete = delete
+        self.batch_options = batch_options
+
+    def select_fields(self, value):
+        if not value:
+            return list(self.fields)
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+        return names
+
+    def query(self, names):
+        query = self.model.query
+        relations = {self.fields[name][1] for name in names} - {None}
+        if relations:
+            query = query.options(*[self.relations[name]() for name in sorted(relations)])
+        if self.live_only:
+            query = query.filter(self.model.is_deleted == False)
+        return query
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name][0](obj) for name in names}
+
+# 学生
+def _create_students(items):
+    student_ids = [str(data.get('student_id') or '') for data in items]
+    emails = [data['email'] for data in items if data.get('email')]
+    # 唯一性校验包含已软删除的账户
+    taken_ids = {u for (u,) in include_deleted(db.session.query(User.username)).filter(User.username.in_(student_ids))}
+    taken_ids |= {s for (s,) in include_deleted(db.session.query(Student.student_id)).filter(Student.student_id.in_(student_ids))}
+    taken_emails = {e for (e,) in include_deleted(db.session.query(User.email)).filter(User.email.in_(emails))} if emails else set()
+    dorm_ids = _existing_ids(Dormitory, [data.get('dorm_id') for data in items])
+    password = hash_password(DEFAULT_PASSWORD)  # 默认密码，整批只计算一次哈希
+
+    objects, errors = [], []
+    deltas, indexes = Counter(), defaultdict(list)
+    for index, data in enumerate(items):
+        try:
+            _require(data, 'student_id', 'name', 'gender', 'major', 'grade', 'phone')
+            student_id = str(data['student_id'])
+            if student_id in taken_ids:
+                raise ValueError('student_id already exists')
+            email = data.get('email') or None
+            if email and email in taken_emails:
+                raise ValueError('email already exists')
+            dorm_id = _dorm_id(data, dorm_ids)
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        taken_ids.add(student_id)
+        if email:
+            taken_emails.add(email)
+        user = User(username=student_id, email=email, password=password, role='student')
+        student = Student(user=user, student_id=student_id, name=data['name'], gender=data['gender'],
+                          major=data['major'], grade=data['grade'], dorm_id=dorm_id, phone=data['phone'])
+        db.session.add(student)
+        objects.append(student)
+        deltas[dorm_id] += 1
+        indexes[dorm_id].append(index)
+    if not errors:
+        errors = _occupancy_errors(deltas, indexes)
+    return objects, errors
+
+def _update_students(pairs):
+    emails = {data['email'] for _, (_, data) in pairs if data.get('email')}
+    owners = dict(include_deleted(db.session.query(User.email, User.id)).filter(User.email.in_(emails))) if emails else {}
+    dorm_ids = _existing_ids(Dormitory, [data.get('dorm_id') for _, (_, data) in pairs])
+
+    errors = []
+    deltas, indexes = Counter(), defaultdict(list)
+    for index, (student, data) in pairs:
+        try:
+            for field in ('name', 'gender', 'major', 'grade', 'phone'):
+                if field in data:
+                    _require(data, field)
+            dorm_id = _dorm_id(data, dorm_ids) if 'dorm_id' in data else student.dorm_id
+            email = data.get('email', student.user.email) or None
+            if email and owners.get(email, student.user_id) != student.user_id:
+                raise ValueError('email already exists')
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        for field in ('name', 'gender', 'major', 'grade', 'phone'):
+            if field in data:
+                setattr(student, field, data[field])
+        if dorm_id != student.dorm_id:
+            deltas[student.dorm_id] -= 1
+            deltas[dorm_id] += 1
+            indexes[dorm_id].append(index)
+            student.dorm_id = dorm_id
+        if email != student.user.email:
+            owners.pop(student.user.email, None)
+            student.user.email = email
+            if email:
+                owners[email] = student.user_id
+    if not errors:
+        errors = _occupancy_errors(deltas, indexes)
+    return errors
+
+def _delete_students(pairs):
+    deltas = Counter()
+    for _, student in pairs:
+        deltas[student.dorm_id] -= 1  # 释放床位
+        student.is_deleted = True  # 软删除
+        student.user.is_deleted = True  # 同时软删除关联的用户
+    apply_occupancy_changes(deltas)
+    return []
+
+# 宿舍
+def _dorm_numbers_taken(numbers):
+    return dict(db.session.query(Dormitory.dorm_number, Dormitory.id).filter(Dormitory.dorm_number.in_(numbers))) if numbers else {}
+
+def _create_dormitories(items):
+    taken = _dorm_numbers_taken({str(data['dorm_number']) for data in items if data.get('dorm_number')})
+    objects, errors = [], []
+    for index, data in enumerate(items):
+        try:
+            _require(data, 'dorm_number', 'building', 'floor', 'capacity')
+            dorm_number = str(data['dorm_number'])
+            if dorm_number in taken:
+                raise ValueError('dorm_number already exists')
+            floor, capacity = _number(data, 'floor'), _number(data, 'capacity')
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        dormitory = Dormitory(dorm_number=dorm_number, building=data['building'], floor=floor, capacity=capacity,
+                              current_occupancy=0, gender=data.get('gender') or 'Mix')
+        db.session.add(dormitory)
+        taken[dorm_number] = None
+        objects.append(dormitory)
+    return objects, errors
+
+def _update_dormitories(pairs):
+    taken = _dorm_numbers_taken({str(data['dorm_number']) for _, (_, data) in pairs if data.get('dorm_number')})
+    errors = []
+    for index, (dormitory, data) in pairs:
+        try:
+            for field in ('dorm_number', 'building', 'gender'):
+                if field in data:
+                    _require(data, field)
+            if 'dorm_number' in data and taken.get(str(data['dorm_number']), dormitory.id) != dormitory.id:
+                raise ValueError('dorm_number already exists')
+            values = {field: _number(data, field) for field in ('floor', 'capacity') if field in data}
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        if 'dorm_number' in data:
+            taken.pop(dormitory.dorm_number, None)
+            dormitory.dorm_number = str(data['dorm_number'])
+            taken[dormitory.dorm_number] = dormitory.id
+        for field in ('building', 'gender'):
+            if field in data:
+                setattr(dormitory, field, data[field])
+        for field, value in values.items():
+            setattr(dormitory, field, value)
+    return errors
+
+def _delete_dormitories(pairs):
+    # 只能删除没有学生、账单、报修和调宿申请引用的宿舍（已软删除的记录仍然引用宿舍）
+    ids = [dormitory.id for _, dormitory in pairs]
+    referenced = set()
+    for column in (Student.dorm_id, UtilityBill.dorm_id, Repair.dorm_id):
+        referenced |= {row_id for (row_id,) in include_deleted(db.session.query(column)).filter(column.in_(ids)).distinct()}
+    for row in include_deleted(db.session.query(DormChangeRequest.current_dorm_id, DormChangeRequest.target_dorm_id)).filter(
+            or_(DormChangeRequest.current_dorm_id.in_(ids), DormChangeRequest.target_dorm_id.in_(ids))):
+        referenced |= set(row)
+
+    errors = []
+    for index, dormitory in pairs:
+        if dormitory.id in referenced:
+            errors.append((index, 'Dormitory is still in use'))
+        else:
+            db.session.delete(dormitory)
+    return errors
+
+# 水电费账单
+def _bill_month(data):
+    try:
+        return data['month'], bill_due_date(data['month'])
+    except (TypeError, ValueError):
+        raise ValueError('Invalid month, expected YYYY-MM')
+
+def _existing_bills(keys):
+    dorm_ids = {dorm_id for dorm_id, _ in keys}
+    months = {month for _, month in keys}
+    if not keys:
+        return {}
+    rows = db.session.query(UtilityBill.dorm_id, UtilityBill.month, UtilityBill.id).filter(
+        UtilityBill.dorm_id.in_(dorm_ids), UtilityBill.month.in_(months))
+    return {(dorm_id, month): bill_id for dorm_id, month, bill_id in rows}
+
+def _candidate_bill_keys(items, bills=None):
+    # 预先查询可能冲突的 (宿舍, 月份)，修改时未传的字段取账单原值
+    keys = set()
+    for data, bill in zip(items, bills or [None] * len(items)):
+        try:
+            dorm_id = data['dorm_id'] if 'dorm_id' in data or bill is None else bill.dorm_id
+            month = data['month'] if 'month' in data or bill is None else bill.month
+            keys.add((int(dorm_id), str(month)))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return keys
+
+def _create_bills(items):
+    dorm_ids = _existing_ids(Dormitory, [data.get('dorm_id') for data in items])
+    taken = _existing_bills(_candidate_bill_keys(items))
+    objects, errors = [], []
+    for index, data in enumerate(items):
+        try:
+            _require(data, 'dorm_id', 'month', 'electricity', 'water')
+            dorm_id = _dorm_id(data, dorm_ids)
+            month, due_date = _bill_month(data)
+            if (dorm_id, month) in taken:
+                raise ValueError(f'Bill for {month} already exists')
+            electricity, water = _number(data, 'electricity', float), _number(data, 'water', float)
+            status = _choice(data, 'status', ('unpaid', 'paid')) if data.get('status') else 'unpaid'
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        electricity_cost, water_cost, total_cost = compute_bill_costs(electricity, water)
+        bill = UtilityBill(dorm_id=dorm_id, month=month, electricity=electricity, water=water,
+                           electricity_cost=electricity_cost, water_cost=water_cost, total_cost=total_cost,
+                           status=status, due_date=due_date)
+        db.session.add(bill)
+        taken[(dorm_id, month)] = None
+        objects.append(bill)
+    return objects, errors
+
+def _update_bills(pairs):
+    dorm_ids = _existing_ids(Dormitory, [data.get('dorm_id') for _, (_, data) in pairs])
+    taken = _existing_bills(_candidate_bill_keys([data for _, (_, data) in pairs], [bill for _, (bill, _) in pairs]))
+    errors = []
+    for index, (bill, data) in pairs:
+        try:
+            dorm_id = _dorm_id(data, dorm_ids) if 'dorm_id' in data else bill.dorm_id
+            if dorm_id is None:
+                raise ValueError('Missing field: dorm_id')
+            month, due_date = _bill_month(data) if 'month' in data else (bill.month, bill.due_date)
+            if taken.get((dorm_id, month), bill.id) != bill.id:
+                raise ValueError(f'Bill for {month} already exists')
+            values = {field: _number(data, field, float) for field in ('electricity', 'water') if field in data}
+            status = _choice(data, 'status', ('unpaid', 'paid')) if 'status' in data else bill.status
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        taken.pop((bill.dorm_id, bill.month), None)
+        taken[(dorm_id, month)] = bill.id
+        bill.dorm_id, bill.month, bill.due_date, bill.status = dorm_id, month, due_date, status
+        for field, value in values.items():
+            setattr(bill, field, value)
+        # 按配置的阶梯单价重新计算费用
+        bill.electricity_cost, bill.water_cost, bill.total_cost = compute_bill_costs(bill.electricity, bill.water)
+    return errors
+
+def _delete_bills(pairs):
+    # 已有缴费记录的账单不能删除，避免缴费记录失去关联账单
+    ids = [bill.id for _, bill in pairs]
+    paid = {bill_id for (bill_id,) in db.session.query(Payment.bill_id).filter(Payment.bill_id.in_(ids)).distinct()}
+    errors = []
+    for index, bill in pairs:
+        if bill.id in paid:
+            errors.append((index, 'Bill has payments'))
+        else:
+            db.session.delete(bill)
+    return errors
+
+# 报修
+def _update_repairs(pairs):
+    errors = []
+    for index, (repair, data) in pairs:
+        try:
+            status = _choice(data, 'status', ('pending', 'processing', 'completed')) if 'status' in data else repair.status
+            urgent_level = _choice(data, 'urgent_level', ('normal', 'urgent', 'very_urgent')) if 'urgent_level' in data else repair.urgent_level
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        repair.status, repair.urgent_level = status, urgent_level
+    return errors
+
+# 访客
+def _update_visitors(pairs):
+    errors = []
+    for index, (visitor, data) in pairs:
+        try:
+            status = _choice(data, 'status', ('in', 'out')) if 'status' in data else visitor.status
+        except ValueError as e:
+            errors.append((index, str(e)))
+            continue
+        if status == 'out' and visitor.status != 'out':
+            visitor.leave_date = datetime.utcnow()  # 与管理员页面“标记离开”一致
+        visitor.status = status
+    return errors
+
+def _soft_delete(pairs):
+    for _, obj in pairs:
+        obj.is_deleted = True  # 软删除
+    return []
+
+RESOURCES = {
+    'students': Resource(
+        Student,
+        fields={
+            'id': (lambda s: s.id, None),
+            'student_id': (lambda s: s.student_id, None),
+            'name': (lambda s: s.name, None),
+            'gender': (lambda s: s.gender, None),
+            'major': (lambda s: s.major, None),
+            'grade': (lambda s: s.grade, None),
+            'phone': (lambda s: s.phone, None),
+            'photo': (lambda s: s.photo, None),
+            'dorm_id': (lambda s: s.dorm_id, None),
+            'email': (lambda s: s.user.email, 'user'),
+            'username': (lambda s: s.user.username, 'user'),
+            'dorm_number': (lambda s: s.dormitory.dorm_number if s.dormitory else None, 'dormitory'),
+            'building': (lambda s: s.dormitory.building if s.dormitory else None, 'dormitory'),
+        },
+        relations={'user': lambda: joinedload(Student.user), 'dormitory': lambda: joinedload(Student.dormitory)},
+        sort_columns={'id': Student.id, 'student_id': Student.student_id, 'name': Student.name, 'grade': Student.grade},
+        default_sort='id',
+        filters={'building': building_filter(Student.dorm_id), 'grade': Student.grade, 'major': Student.major},
+        live_only=True,
+        create=_create_students, update=_update_students, delete=_delete_students,
+        batch_options=lambda: (joinedload(Student.user),),
+    ),
+    'dormitories': Resource(
+        Dormitory,
+        fields={
+            'id': (lambda d: d.id, None),
+            'dorm_number': (lambda d: d.dorm_number, None),
+            'building': (lambda d: d.building, None),
+            'floor': (lambda d: d.floor, None),
+            'capacity': (lambda d: d.capacity, None),
+            'current_occupancy': (lambda d: d.current_occupancy, None),
+            'gender': (lambda d: d.gender, None),
+        },
+        relations={},
+        sort_columns={'dorm_number': Dormitory.dorm_number, 'floor': Dormitory.floor, 'current_occupancy': Dormitory.current_occupancy},
+        default_sort='dorm_number',
+        filters={'building': Dormitory.building},
+        default_order='asc',
+        create=_create_dormitories, update=_update_dormitories, delete=_delete_dormitories,
+    ),
+    'bills': Resource(
+        UtilityBill,
+        fields={
+            'id': (lambda b: b.id, None),
+            'dorm_id': (lambda b: b.dorm_id, None),
+            'month': (lambda b: b.month, None),
+            'electricity': (lambda b: b.electricity, None),
+            'water': (lambda b: b.water, None),
+            'electricity_cost': (lambda b: b.electricity_cost, None),
+            'water_cost': (lambda b: b.water_cost, None),
+            'total_cost': (lambda b: b.total_cost, None),
+            'status': (lambda b: b.status, None),
+            'due_date': (lambda b: _fmt(b.due_date), None),
+            'created_at': (lambda b: _fmt(b.created_at), None),
+            'dorm_number': (lambda b: b.dormitory.dorm_number if b.dormitory else None, 'dormitory'),
+            'building': (lambda b: b.dormitory.building if b.dormitory else None, 'dormitory'),
+        },
+        relations={'dormitory': lambda: joinedload(UtilityBill.dormitory)},
+        sort_columns={'month': UtilityBill.month, 'total_cost': UtilityBill.total_cost, 'due_date': UtilityBill.due_date},
+        default_sort='month',
+        filters={'status': UtilityBill.status, 'month': UtilityBill.month, 'building': building_filter(UtilityBill.dorm_id)},
+        create=_create_bills, update=_update_bills, delete=_delete_bills,
+    ),
+    'payments': Resource(
+        Payment,
+        fields={
+            'id': (lambda p: p.id, None),
+            'bill_id': (lambda p: p.bill_id, None),
+            'student_id': (lambda p: p.student_id, None),
+            'amount': (lambda p: p.amount, None),
+            'payment_date': (lambda p: _fmt(p.payment_date), None),
+            'payment_method': (lambda p: p.payment_method, None),
+            'payment_status': (lambda p: p.payment_status, None),
+            'student_name': (lambda p: p.student.name if p.student else None, 'student'),
+            'month': (lambda p: p.utility_bill.month if p.utility_bill else None, 'bill'),
+            'dorm_number': (lambda p: p.utility_bill.dormitory.dorm_number if p.utility_bill and p.utility_bill.dormitory else None, 'bill'),
+        },
+        relations={'student': lambda: joinedload(Payment.student),
+                   'bill': lambda: joinedload(Payment.utility_bill).joinedload(UtilityBill.dormitory)},
+        sort_columns={'payment_date': Payment.payment_date, 'amount': Payment.amount},
+        default_sort='payment_date',
+        filters={'status': Payment.payment_status,
+                 'building': building_filter(UtilityBill.dorm_id, (UtilityBill, Payment.bill_id == UtilityBill.id))},
+    ),
+    'repairs': Resource(
+        Repair,
+        fields={
+            'id': (lambda r: r.id, None),
+            'title': (lambda r: r.title, None),
+            'content': (lambda r: r.content, None),
+            'status': (lambda r: r.status, None),
+            'urgent_level': (lambda r: r.urgent_level, None),
+            'location_type': (lambda r: r.location_type, None),
+            'repair_type': (lambda r: r.repair_type, None),
+            'location_detail': (lambda r: r.location_detail, None),
+            'contact_phone': (lambda r: r.contact_phone, None),
+            'student_id': (lambda r: r.student_id, None),
+            'dorm_id': (lambda r: r.dorm_id, None),
+            'created_at': (lambda r: _fmt(r.created_at), None),
+            'updated_at': (lambda r: _fmt(r.updated_at), None),
+            'student_name': (lambda r: r.student.name if r.student else None, 'student'),
+            'dorm_number': (lambda r: r.dormitory.dorm_number if r.dormitory else None, 'dormitory'),
+        },
+        relations={'student': lambda: joinedload(Repair.student), 'dormitory': lambda: joinedload(Repair.dormitory)},
+        sort_columns={'created_at': Repair.created_at, 'updated_at': Repair.updated_at},
+        default_sort='created_at',
+        filters={'status': Repair.status, 'building': building_filter(Repair.dorm_id)},
+        live_only=True,
+        update=_update_repairs, delete=_soft_delete,
+    ),
+    'visitors': Resource(
+        Visitor,
+        fields={
+            'id': (lambda v: v.id, None),
+            'name': (lambda v: v.name, None),
+            'id_card': (lambda v: v.id_card, None),
+            'phone': (lambda v: v.phone, None),
+            'purpose': (lambda v: v.purpose, None),
+            'dorm_number': (lambda v: v.dorm_number, None),
+            'student_id': (lambda v: v.student_id, None),
+            'student_name': (lambda v: v.student_name, None),
+            'status': (lambda v: v.status, None),
+            'visit_date': (lambda v: _fmt(v.visit_date), None),
+            'leave_date': (lambda v: _fmt(v.leave_date), None),
+        },
+        relations={},
+        sort_columns={'visit_date': Visitor.visit_date, 'name': Visitor.name},
+        default_sort='visit_date',
+        filters={'status': Visitor.status,
+                 'building': building_filter(Student.dorm_id, (Student, Visitor.student_id == Student.id))},
+        live_only=True,
+        update=_update_visitors, delete=_soft_delete,
+    ),
+}
+
+def _admin_resource(name):
+    """
+    返回 (资源, 错误响应)
+    """
+    if current_user.role != 'admin':
+        return None, (jsonify({'code':403,'msg':'Permission denied'}), 403)
+    resource = RESOURCES.get(name)
+    if resource is None:
+        return None, (jsonify({'code':404,'msg':'Resource not found'}), 404)
+    return resource, None
+
+def _load_targets(resource, ids):
+    """
+    一次查询加载要修改/删除的记录，返回 {id: 对象}
+    """
+    ids = {row_id for row_id in ids if row_id is not None}
+    if not ids:
+        return {}
+    query = resource.model.query.options(*resource.batch_options()).filter(resource.model.id.in_(ids))
+    if resource.live_only:
+        query = query.filter(resource.model.is_deleted == False)
+    return {obj.id: obj for obj in query}
+
+def _item_id(item):
+    value = item.get('id') if isinstance(item, dict) else item
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def run_batch(resource, create=(), update=(), delete=()):
+    """
+    在一个事务中执行批量新增/修改/删除，返回 (新增的对象, 修改的对象, 删除的ID)
+
+    任一条失败时回滚并抛出 BatchErrors
+    """
+    for op, items in (('create', create), ('update', update), ('delete', delete)):
+        if items and getattr(resource, op) is None:
+            raise BatchErrors([{'op': op, 'index': None, 'msg': 'Operation not supported'}])
+    total = len(create) + len(update) + len(delete)
+    limit = current_app.config['API_BATCH_MAX_ITEMS']
+    if total > limit:
+        raise BatchErrors([{'op': None, 'index': None, 'msg': f'Too many items (max {limit})'}])
+
+    errors = []
+    created, updated, deleted = [], [], []
+    try:
+        targets = _load_targets(resource, [_item_id(item) for item in list(update) + list(delete)])
+
+        if update:
+            pairs = []
+            for index, data in enumerate(update):
+                obj = targets.get(_item_id(data)) if isinstance(data, dict) else None
+                if obj is None:
+                    errors.append({'op': 'update', 'index': index, 'msg': 'Record not found'})
+                else:
+                    pairs.append((index, (obj, data)))
+            errors += [{'op': 'update', 'index': i, 'msg': msg} for i, msg in resource.update(pairs)]
+            updated = [obj for _, (obj, _) in pairs]
+
+        if delete:
+            pairs = []
+            for index, item in enumerate(delete):
+                obj = targets.get(_item_id(item))
+                if obj is None:
+                    errors.append({'op': 'delete', 'index': index, 'msg': 'Record not found'})
+                else:
+                    pairs.append((index, obj))
+            errors += [{'op': 'delete', 'index': i, 'msg': msg} for i, msg in resource.delete(pairs)]
+            deleted = [obj.id for _, obj in pairs]
+
+        if create:
+            items = [data if isinstance(data, dict) else {} for data in create]
+            created, create_errors = resource.create(items)
+            errors += [{'op': 'create', 'index': i, 'msg': msg} for i, msg in create_errors]
+
+        if errors:
+            raise BatchErrors(sorted(errors, key=lambda e: (e['op'] or '', e['index'] or 0)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created, updated, deleted
+
+def _json_list(data, key):
+    # 允许直接传数组，或 {"items": [...]} / {"ids": [...]}
+    if isinstance(data, dict):
+        data = data.get(key)
+    return data if isinstance(data, list) else None
+
+def _batch_response(resource, names, created=(), updated=(), deleted=()):
+    result = {}
+    if created:
+        result['created'] = [resource.serialize(obj, names) for obj in created]
+    if updated:
+        result['updated'] = [resource.serialize(obj, names) for obj in updated]
+    if deleted:
+        result['deleted'] = list(deleted)
+    return jsonify({'code':200,'data':result})
+
+def _handle_batch(resource, **ops):
+    try:
+        names = resource.select_fields(request.args.get('fields'))
+        created, updated, deleted = run_batch(resource, **ops)
+    except ValueError as e:
+        return jsonify({'code':400,'msg':str(e)}),400
+    except BatchErrors as e:
+        return jsonify({'code':400,'msg':'Batch rejected, nothing was saved','errors':e.errors}),400
+    return _batch_response(resource, names, created, updated, deleted)
+
+@api_bp.route('/admin/<name>', methods=['GET'])
+@login_required
+def admin_resource_list(name):
+    resource, error = _admin_resource(name)
+    if error: return error
+    try: names = resource.select_fields(request.args.get('fields'))
+    except ValueError as e: return jsonify({'code':400,'msg':str(e)}),400
+    params = ListParams.from_request(filter_names=tuple(resource.filters), default_order=resource.default_order)
+    page = paginate(resource.query(names), params, resource.model.id, sort_columns=resource.sort_columns,
+                    default_sort=resource.default_sort, filters=resource.filters)
+    return jsonify({'code':200,'data':[resource.serialize(obj, names) for obj in page.items],'pagination':page.meta()})
+
+@api_bp.route('/admin/<name>/<int:item_id>', methods=['GET'])
+@login_required
+def admin_resource_detail(name, item_id):
+    resource, error = _admin_resource(name)
+    if error: return error
+    try: names = resource.select_fields(request.args.get('fields'))
+    except ValueError as e: return jsonify({'code':400,'msg':str(e)}),400
+    obj = resource.query(names).filter(resource.model.id == item_id).first()
+    if not obj: return jsonify({'code':404,'msg':'Record not found'}),404
+    return jsonify({'code':200,'data':resource.serialize(obj, names)})
+
+@api_bp.route('/admin/<name>', methods=['POST'])
+@login_required
+def admin_resource_create(name):
+    resource, error = _admin_resource(name)
+    if error: return error
+    data = request.get_json(silent=True)
+    items = [data] if isinstance(data, dict) and 'items' not in data else _json_list(data, 'items')
+    if not items: return jsonify({'code':400,'msg':'Expected a JSON object or array'}),400
+    return _handle_batch(resource, create=items)
+
+@api_bp.route('/admin/<name>', methods=['PATCH'])
+@login_required
+def admin_resource_update(name):
+    resource, error = _admin_resource(name)
+    if error: return error
+    items = _json_list(request.get_json(silent=True), 'items')
+    if not items: return jsonify({'code':400,'msg':'Expected a JSON array of objects with id'}),400
+    return _handle_batch(resource, update=items)
+
+@api_bp.route('/admin/<name>', methods=['DELETE'])
+@login_required
+def admin_resource_delete(name):
+    resource, error = _admin_resource(name)
+    if error: return error
+    ids = _json_list(request.get_json(silent=True), 'ids')
+    if not ids: return jsonify({'code':400,'msg':'Missing ids'}),400
+    return _handle_batch(resource, delete=ids)
+
+@api_bp.route('/admin/<name>/batch', methods=['POST'])
+@login_required
+def admin_resource_batch(name):
+    resource, error = _admin_resource(name)
+    if error: return error
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict): return jsonify({'code':400,'msg':'Expected {"create": [], "update": [], "delete": []}'}),400
+    ops = {op: data.get(op) or [] for op in ('create', 'update', 'delete')}
+    if not all(isinstance(items, list) for items in ops.values()) or not any(ops.values()):
+        return jsonify({'code':400,'msg':'Expected {"create": [], "update": [], "delete": []}'}),400
+    return _handle_batch(resource, **ops)
@@ -1,12 +1,23 @@
-from flask import jsonify, request, current_app
+import time
+from flask import jsonify, request, current_app, url_for, Response
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from app.api import api_bp
 from app import db, csrf
-from app.models.models import User, Student, Repair, UtilityBill, Visitor, Dormitory, DormChangeRequest, Payment, DormManager, InvitationCode, PasswordResetRequest
-from werkzeug.security import generate_password_hash
-import os, qrcode
+from app.models.models import User, Student, Repair, UtilityBill, Visitor, Dormitory, DormChangeRequest, Payment, DormManager, InvitationCode, PasswordResetRequest, BackgroundJob
+from app.services.dashboard_counters import get_building_counters
+from app.services.http_cache import cache_policy
+from app.services.reference_data import get_buildings
+from app.services.identity import hash_password, verify_password
+from app.services.pagination import ListParams, paginate
+from app.services.jobs import job_to_dict
+from app.services.live_events import broker as live_events
+from app.services.password_resets import approve_reset_requests
+from app.services.photos import replace_student_photo, photo_url, PhotoError
+from app.services.qr_codes import FORMATS as QR_FORMATS, visitor_qr_payload, qr_etag, qr_cache, QRTokenError
+from app.services.gate import scan_visitor, ScanError, TRANSITIONS as SCAN_ACTIONS
+from app.services.search import search as search_index, SOURCES as SEARCH_SOURCES
+from app.services.soft_delete import include_deleted
 
 # CSRF 豁免
 csrf.exempt(api_bp)
@@ -19,7 +30,7 @@ def login():
     username = data.get('username'); password = data.get('password'); user_type = data.get('userType')
     if not username or not password: return jsonify({'code':400,'msg':'Missing username or password'}),400
     user = User.query.filter_by(username=username, role=user_type).first()
-    if user and check_password_hash(user.password, password):
+    if verify_password(user, password):
         login_user(user)
         info = {}
         if user.role=='student' and user.student:
@@ -54,9 +65,9 @@ def student_info():
 
 # 注册辅助：楼栋列表
 @api_bp.route('/buildings', methods=['GET'])
+@cache_policy('REFERENCE_DATA_MAX_AGE')
 def buildings():
-    buildings = db.session.query(Dormitory.building).distinct().all()
-    return jsonify({'code':200,'data':[b[0] for b in buildings]})
+    return jsonify({'code':200,'data':get_buildings()})
 
 # 注册
 @api_bp.route('/register', methods=['POST'])
@@ -76,9 +87,9 @@ def register():
         return jsonify({'code':400,'msg':'缺少必要字段'}),400
     if password != confirm_password:
         return jsonify({'code':400,'msg':'两次输入的密码不一致'}),400
-    if User.query.filter_by(username=username).first():
+    if include_deleted(User.query).filter_by(username=username).first():
         return jsonify({'code':400,'msg':'学号/工号已存在'}),400
-    if email and User.query.filter_by(email=email).first():
+    if email and include_deleted(User.query).filter_by(email=email).first():
         return jsonify({'code':400,'msg':'邮箱已存在'}),400
 
     if user_type == 'admin':
@@ -90,7 +101,7 @@ def register():
         if not record:
             return jsonify({'code':400,'msg':'无效或已使用的邀请码'}),400
 
-    user = User(username=username, email=email, password=generate_password_hash(password), role=user_type)
+    user = User(username=username, email=email, password=hash_password(password), role=user_type)
     db.session.add(user); db.session.flush()
     if user_type == 'student':
         student = Student(user_id=user.id, student_id=username, name=name, gender='男', major='未分配', grade='未分配', phone=phone)
@@ -153,15 +164,15 @@ def student_dorm():
 @login_required
 def upload_photo():
     if current_user.role!='student': return jsonify({'code':403,'msg':'Permission denied'}),403
-    if 'photo' not in request.files: return jsonify({'code':400,'msg':'No file part'}),400
+    try: has_file = 'photo' in request.files
+    except RequestEntityTooLarge: return jsonify({'code':413,'msg':'File too large'}),413
+    if not has_file: return jsonify({'code':400,'msg':'No file part'}),400
     file = request.files['photo']
     if file.filename=='': return jsonify({'code':400,'msg':'No selected file'}),400
     s = current_user.student
-    folder = os.path.join(current_app.root_path, 'static', 'uploads'); os.makedirs(folder, exist_ok=True)
-    filename = secure_filename(file.filename); ext = os.path.splitext(filename)[1].lower()
-    new_name = f'student_{s.id}{ext}'; path = os.path.join(folder, new_name); file.save(path)
-    s.photo = f'uploads/{new_name}'; db.session.commit()
-    return jsonify({'code':200,'msg':'Photo uploaded','url': s.photo})
+    try: path = replace_student_photo(s, file)
+    except PhotoError as e: return jsonify({'code':400,'msg':str(e)}),400
+    return jsonify({'code':200,'msg':'Photo uploaded','url': path,'variants':{v: photo_url(path, v) for v in current_app.config['PHOTO_VARIANTS']}})
 
 # 报修
 @api_bp.route('/repairs', methods=['GET'])
@@ -211,7 +222,7 @@ def bills_pay():
 def visitors_list():
     if current_user.role!='student': return jsonify({'code':403,'msg':'Permission denied'}),403
     arr = Visitor.query.filter_by(student_id=current_user.student.id).order_by(Visitor.visit_date.desc()).all()
-    data=[{'id':v.id,'name':v.name,'visit_date':v.visit_date.strftime('%Y-%m-%d %H:%M'),'purpose':v.purpose,'status':v.status,'qr_code':v.qr_code} for v in arr]
+    data=[{'id':v.id,'name':v.name,'visit_date':v.visit_date.strftime('%Y-%m-%d %H:%M'),'purpose':v.purpose,'status':v.status,'qr_code':v.qr_code,'qr_url':url_for('api.visitor_qr_code', visitor_id=v.id)} for v in arr]
     return jsonify({'code':200,'data':data})
 
 @api_bp.route('/visitors', methods=['POST'])
@@ -223,13 +234,47 @@ def visitors_create():
         if not data.get(f): return jsonify({'code':400,'msg':f'Missing field: {f}'}),400
     s = current_user.student
     v = Visitor(name=data['name'], id_card=data['id_card'], phone=data['phone'], purpose=data['purpose'], dorm_number=data['dorm_number'], student_name=s.name, student_id=s.id)
-    db.session.add(v); db.session.flush()
-    qr_data = f"visitor_id={v.id}&name={v.name}&id_card={v.id_card}&visit_date={v.visit_date.strftime('%Y-%m-%d %H:%M:%S')}"
-    qr = qrcode.QRCode(version=1, box_size=10, border=4); qr.add_data(qr_data); qr.make(fit=True)
-    img = qr.make_image(fill_color='black', back_color='white')
-    folder = os.path.join(current_app.root_path,'static','qr_codes'); os.makedirs(folder, exist_ok=True)
-    fname = f"visitor_{v.id}.png"; path = os.path.join(folder, fname); img.save(path)
-    v.qr_code = f"qr_codes/{fname}"; db.session.commit(); return jsonify({'code':200,'msg':'Visitor registered','qr_code':v.qr_code})
+    db.session.add(v); db.session.commit()
+    # 二维码由 /api/visitors/<id>/qr 按需生成
+    return jsonify({'code':200,'msg':'Visitor registered','qr_code':v.qr_code,'qr_url':url_for('api.visitor_qr_code', visitor_id=v.id)})
+
+def _can_view_visitor(v):
+    if current_user.role=='admin': return True
+    if current_user.role=='student': return current_user.student is not None and v.student_id==current_user.student.id
+    if current_user.role=='dorm_manager':
+        dm = current_user.dorm_manager
+        dorm = v.student.dormitory if v.student else None
+        return dm is not None and dorm is not None and dorm.building==dm.responsible_building
+    return False
+
+@api_bp.route('/visitors/<int:visitor_id>/qr', methods=['GET'])
+@login_required
+def visitor_qr_code(visitor_id):
+    v = db.session.get(Visitor, visitor_id)
+    if not v or not _can_view_visitor(v): return jsonify({'code':404,'msg':'Visitor not found'}),404
+    fmt = request.args.get('format','png')
+    if fmt not in QR_FORMATS: return jsonify({'code':400,'msg':'Unsupported format'}),400
+    payload = visitor_qr_payload(v); etag = qr_etag(payload, fmt)
+    if request.if_none_match.contains_weak(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        data, etag = qr_cache.get(payload, fmt); resp = current_app.response_class(data, mimetype=QR_FORMATS[fmt])
+    resp.set_etag(etag); resp.cache_control.private = True; resp.cache_control.max_age = current_app.config['QR_CACHE_MAX_AGE']
+    return resp
+
+# 门卫扫码：{"token": 二维码内容, "action": "out"（默认，离开）或 "in"（再次进入）}
+@api_bp.route('/gate/scan', methods=['POST'])
+@login_required
+def gate_scan():
+    if current_user.role not in ('admin','dorm_manager'): return jsonify({'code':403,'msg':'Permission denied'}),403
+    data = request.get_json(silent=True) or {}
+    action = data.get('action') or 'out'
+    if action not in SCAN_ACTIONS: return jsonify({'code':400,'msg':'Invalid action'}),400
+    building = current_user.dorm_manager.responsible_building if current_user.role=='dorm_manager' else None
+    try: visitor = scan_visitor(data.get('token'), action, building)
+    except QRTokenError as e: return jsonify({'code':400,'msg':str(e)}),400
+    except ScanError as e: return jsonify({'code':e.status,'msg':str(e),'status':e.visitor_status}),e.status
+    return jsonify({'code':200,'msg':'Checked in' if action=='in' else 'Checked out','data':visitor})
 
 # 调宿申请
 @api_bp.route('/dorm_changes', methods=['GET'])
@@ -254,39 +299,86 @@ def dorm_changes_create():
 @login_required
 def dm_dashboard():
     if current_user.role!='dorm_manager': return jsonify({'code':403,'msg':'Permission denied'}),403
-    dm = DormManager.query.filter_by(user_id=current_user.id).first()
-    total_students = Student.query.join(Dormitory).filter(Dormitory.building==dm.responsible_building).count()
-    total_dorms = Dormitory.query.filter_by(building=dm.responsible_building).count()
-    pending_repairs = Repair.query.join(Dormitory, Repair.dorm_id==Dormitory.id).filter(Dormitory.building==dm.responsible_building, Repair.status=='pending').count()
-    current_visitors = Visitor.query.join(Student).join(Dormitory).filter(Dormitory.building==dm.responsible_building, Visitor.status=='in').count()
-    return jsonify({'code':200,'data':{'total_students':total_students,'total_dorms':total_dorms,'pending_repairs':pending_repairs,'current_visitors':current_visitors}})
+    dm = current_user.dorm_manager
+    counters = get_building_counters(dm.responsible_building)
+    return jsonify({'code':200,'data':counters})
 
 @api_bp.route('/dm/students', methods=['GET'])
 @login_required
 def dm_students():
     if current_user.role!='dorm_manager': return jsonify({'code':403,'msg':'Permission denied'}),403
-    dm = DormManager.query.filter_by(user_id=current_user.id).first()
-    arr = Student.query.join(Dormitory).filter(Dormitory.building==dm.responsible_building, Student.is_deleted==False).all()
-    data=[{'name':s.name,'student_id':s.student_id,'major':s.major,'grade':s.grade,'phone':s.phone,'dorm_id':s.dorm_id} for s in arr]
-    return jsonify({'code':200,'data':data})
+    dm = current_user.dorm_manager
+    q = Student.query.join(Dormitory).filter(Dormitory.building==dm.responsible_building, Student.is_deleted==False)
+    page = paginate(q, ListParams.from_request(default_order='asc'), Student.id, sort_columns={'student_id':Student.student_id,'name':Student.name,'grade':Student.grade}, default_sort='student_id')
+    data=[{'name':s.name,'student_id':s.student_id,'major':s.major,'grade':s.grade,'phone':s.phone,'dorm_id':s.dorm_id} for s in page.items]
+    return jsonify({'code':200,'data':data,'pagination':page.meta()})
 
 @api_bp.route('/dm/dormitories', methods=['GET'])
 @login_required
+@cache_policy('DORM_LIST_MAX_AGE', private=True)
 def dm_dorms():
     if current_user.role!='dorm_manager': return jsonify({'code':403,'msg':'Permission denied'}),403
-    dm = DormManager.query.filter_by(user_id=current_user.id).first()
-    arr = Dormitory.query.filter_by(building=dm.responsible_building).all()
-    data=[{'id':d.id,'number':d.dorm_number,'building':d.building,'floor':d.floor,'capacity':d.capacity,'current_occupancy':d.current_occupancy} for d in arr]
-    return jsonify({'code':200,'data':data})
+    dm = current_user.dorm_manager
+    q = Dormitory.query.filter_by(building=dm.responsible_building)
+    page = paginate(q, ListParams.from_request(default_order='asc'), Dormitory.id, sort_columns={'dorm_number':Dormitory.dorm_number,'floor':Dormitory.floor,'current_occupancy':Dormitory.current_occupancy}, default_sort='dorm_number')
+    data=[{'id':d.id,'number':d.dorm_number,'building':d.building,'floor':d.floor,'capacity':d.capacity,'current_occupancy':d.current_occupancy} for d in page.items]
+    return jsonify({'code':200,'data':data,'pagination':page.meta()})
 
 @api_bp.route('/dm/repairs', methods=['GET'])
 @login_required
 def dm_repairs():
     if current_user.role!='dorm_manager': return jsonify({'code':403,'msg':'Permission denied'}),403
-    dm = DormManager.query.filter_by(user_id=current_user.id).first()
-    arr = Repair.query.join(Dormitory, Repair.dorm_id==Dormitory.id).filter(Dormitory.building==dm.responsible_building, Repair.is_deleted==False).all()
-    data=[{'id':r.id,'title':r.title,'status':r.status,'student_id':r.student_id} for r in arr]
-    return jsonify({'code':200,'data':data})
+    dm = current_user.dorm_manager
+    q = Repair.query.join(Dormitory, Repair.dorm_id==Dormitory.id).filter(Dormitory.building==dm.responsible_building, Repair.is_deleted==False)
+    page = paginate(q, ListParams.from_request(), Repair.id, sort_columns={'created_at':Repair.created_at,'updated_at':Repair.updated_at}, default_sort='created_at', filters={'status':Repair.status})
+    data=[{'id':r.id,'title':r.title,'status':r.status,'student_id':r.student_id} for r in page.items]
+    return jsonify({'code':200,'data':data,'pagination':page.meta()})
+
+@api_bp.route('/dm/visitors', methods=['GET'])
+@login_required
+def dm_visitors():
+    if current_user.role!='dorm_manager': return jsonify({'code':403,'msg':'Permission denied'}),403
+    dm = current_user.dorm_manager
+    q = Visitor.query.join(Student).join(Dormitory).filter(Dormitory.building==dm.responsible_building, Visitor.is_deleted==False)
+    page = paginate(q, ListParams.from_request(), Visitor.id, sort_columns={'visit_date':Visitor.visit_date,'name':Visitor.name}, default_sort='visit_date', filters={'status':Visitor.status})
+    data=[{'id':v.id,'name':v.name,'visit_date':v.visit_date.strftime('%Y-%m-%d %H:%M'),'leave_date':v.leave_date.strftime('%Y-%m-%d %H:%M') if v.leave_date else None,'dorm_number':v.dorm_number,'student_name':v.student_name,'status':v.status} for v in page.items]
+    return jsonify({'code':200,'data':data,'pagination':page.meta()})
+
+@api_bp.route('/dm/dorm_changes', methods=['GET'])
+@login_required
+def dm_dorm_changes():
+    if current_user.role!='dorm_manager': return jsonify({'code':403,'msg':'Permission denied'}),403
+    dm = current_user.dorm_manager
+    q = DormChangeRequest.query.join(Student).join(Dormitory, Student.dorm_id==Dormitory.id).filter(Dormitory.building==dm.responsible_building)
+    page = paginate(q, ListParams.from_request(), DormChangeRequest.id, sort_columns={'created_at':DormChangeRequest.created_at,'updated_at':DormChangeRequest.updated_at}, default_sort='created_at', filters={'status':DormChangeRequest.status})
+    data=[{'id':r.id,'student_id':r.student_id,'current_dorm_id':r.current_dorm_id,'target_dorm_id':r.target_dorm_id,'reason':r.reason,'status':r.status,'created_at':r.created_at.strftime('%Y-%m-%d')} for r in page.items]
+    return jsonify({'code':200,'data':data,'pagination':page.meta()})
+
+# 实时推送（SSE）：本楼栋访客/报修/宿舍调换申请的变更，事件类型 visitor/repair/dorm_change
+@api_bp.route('/dm/stream', methods=['GET'])
+@login_required
+def dm_stream():
+    if current_user.role!='dorm_manager': return jsonify({'code':403,'msg':'Permission denied'}),403
+    config = current_app.config
+    heartbeat, max_age, retry = config['SSE_HEARTBEAT'], config['SSE_MAX_AGE'], config['SSE_RETRY']
+    subscription = live_events.subscribe(current_user.dorm_manager.responsible_building)
+    if subscription is None:
+        return jsonify({'code':503,'msg':'Too many live connections'}),503,{'Retry-After':str(retry // 1000)}
+
+    # 生成器不使用应用上下文和数据库会话：请求结束时连接已归还连接池
+    def stream():
+        try:
+            yield f'retry: {retry}\n\n'
+            deadline = time.monotonic() + max_age
+            while time.monotonic() < deadline:
+                messages = subscription.get(heartbeat)
+                if messages is None:
+                    yield 'event: resync\ndata: {}\n\n'
+                    break
+                yield ''.join(messages) if messages else ': ping\n\n'
+        finally:
+            live_events.unsubscribe(subscription)
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control':'no-cache','X-Accel-Buffering':'no'})
 
 @api_bp.route('/dm/repairs/process', methods=['POST'])
 @login_required
@@ -297,4 +389,48 @@ def dm_process_repair():
     if not r: return jsonify({'code':404,'msg':'Record not found'}),404
     r.status = status; db.session.commit(); return jsonify({'code':200,'msg':'Updated'})
 
-# 管理员端接口可按需扩展（列表/新增/编辑/删除/统计），与现有视图逻辑一致
+# 批量通过密码重置申请
+@api_bp.route('/admin/password_resets/approve', methods=['POST'])
+@login_required
+def admin_bulk_approve_password_resets():
+    if current_user.role!='admin': return jsonify({'code':403,'msg':'Permission denied'}),403
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids: return jsonify({'code':400,'msg':'Missing ids'}),400
+    try: ids = [int(i) for i in ids]
+    except (TypeError, ValueError): return jsonify({'code':400,'msg':'Invalid ids'}),400
+    result = approve_reset_requests(ids, current_user.id)
+    return jsonify({'code':200,'data':result.to_dict()})
+
+# 全文搜索：/api/search?q=张三&type=student,visitor&page=1&per_page=20
+@api_bp.route('/search', methods=['GET'])
+@login_required
+def search():
+    if current_user.role!='admin': return jsonify({'code':403,'msg':'Permission denied'}),403
+    q = (request.args.get('q') or '').strip()
+    if not q: return jsonify({'code':400,'msg':'Missing q'}),400
+    kinds = [k for k in (request.args.get('type') or '').split(',') if k]
+    unknown = [k for k in kinds if k not in SEARCH_SOURCES]
+    if unknown: return jsonify({'code':400,'msg':f'Unknown type: {",".join(unknown)}'}),400
+    started = time.perf_counter()
+    try: page = search_index(q, kinds, ListParams.from_request(filter_names=()))
+    except RuntimeError as e: return jsonify({'code':503,'msg':str(e)}),503
+    return jsonify({'code':200,'data':page.items,'pagination':page.meta(),'took_ms':round((time.perf_counter()-started)*1000,2)})
+
+# 后台任务状态
+@api_bp.route('/jobs', methods=['GET'])
+@login_required
+def job_list():
+    q = BackgroundJob.query
+    if current_user.role!='admin': q = q.filter_by(created_by=current_user.id)
+    page = paginate(q, ListParams.from_request(filter_names=('status',)), BackgroundJob.id, sort_columns={'id':BackgroundJob.id}, default_sort='id', filters={'status':BackgroundJob.status})
+    return jsonify({'code':200,'data':[job_to_dict(j) for j in page.items],'pagination':page.meta()})
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = db.session.get(BackgroundJob, job_id)
+    if not job or (current_user.role!='admin' and job.created_by!=current_user.id): return jsonify({'code':404,'msg':'Job not found'}),404
+    return jsonify({'code':200,'data':job_to_dict(job)})
+
+# 管理员端资源接口（列表/详情/批量新增/修改/删除）见 app/api/admin.py
@@ -0,0 +1,164 @@
+from datetime import datetime
+from sqlalchemy import inspect, select, func
+from app import db
+
+# 已执行的迁移版本记录
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('name', db.String(100), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+def migration(version, name):
+    """
+    注册一个迁移。迁移函数接收数据库连接，需保证在 create_all 建好的新库上也能安全执行
+    """
+    def decorator(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+def _has_column(conn, table, column):
+    return column in [c['name'] for c in inspect(conn).get_columns(table)]
+
+def _create_indexes(conn, *names):
+    """
+    按名称创建模型中声明的索引，已存在的跳过；不适用于当前数据库的索引（如 PostgreSQL 部分索引）也跳过
+    """
+    existing = {}
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            existing[index.name] = index
+    for name in names:
+        index = existing[name]
+        ddl_if = index._ddl_if
+        if ddl_if is not None and ddl_if.dialect and ddl_if.dialect != conn.dialect.name:
+            continue
+        index.create(conn, checkfirst=True)
+
+@migration(1, '添加 users.email 列')
+def add_user_email(conn):
+    if not _has_column(conn, 'users', 'email'):
+        conn.exec_driver_sql('ALTER TABLE users ADD COLUMN email VARCHAR(120)')
+
+@migration(2, '为高频筛选列添加索引')
+def add_hot_column_indexes(conn):
+    _create_indexes(
+        conn,
+        'ix_students_user_id', 'ix_students_dorm_id', 'ix_students_dorm_id_live',
+        'ix_dorm_managers_user_id',
+        'ix_dormitories_building',
+        'ix_repairs_status', 'ix_repairs_student_id', 'ix_repairs_dorm_id_status',
+        'ix_repairs_created_at', 'ix_repairs_created_at_live',
+        'ix_visitors_status', 'ix_visitors_student_id', 'ix_visitors_visit_date', 'ix_visitors_student_id_live',
+        'ix_utility_bills_dorm_id_month', 'ix_utility_bills_month',
+        'ix_payments_bill_id', 'ix_payments_student_id',
+        'ix_dorm_change_requests_student_id',
+        'ix_password_reset_requests_user_id_status', 'ix_password_reset_requests_request_time',
+    )
+
+@migration(3, '添加后台任务表')
+def add_background_jobs(conn):
+    from app.models.models import BackgroundJob
+    BackgroundJob.__table__.create(conn, checkfirst=True)
+
+@migration(4, '添加水电费汇总表')
+def add_utility_bill_rollups(conn):
+    from app.models.models import UtilityBillRollup
+    from app.services.bill_rollups import rebuild_rollups
+    UtilityBillRollup.__table__.create(conn, checkfirst=True)
+    rebuild_rollups(conn)
+
+@migration(5, '添加发件箱表')
+def add_outbox_emails(conn):
+    from app.models.models import OutboxEmail
+    OutboxEmail.__table__.create(conn, checkfirst=True)
+
+@migration(6, '添加全文搜索索引')
+def add_search_index(conn):
+    from app.services.search import create_search_index, rebuild_search_index
+    if create_search_index(conn):
+        rebuild_search_index(conn)
+
+@migration(7, '添加软删除时间和归档表')
+def add_soft_delete_archive(conn):
+    from app.services.soft_delete import SOFT_DELETE_MODELS, ARCHIVE_TABLES
+    now = datetime.now()
+    for model in SOFT_DELETE_MODELS:
+        table = model.__tablename__
+        if not _has_column(conn, table, 'deleted_at'):
+            conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN deleted_at TIMESTAMP')
+        # 已删除的旧记录从本次迁移开始计算保留期
+        conn.execute(model.__table__.update().where(model.__table__.c.is_deleted == True,
+                                                    model.__table__.c.deleted_at.is_(None)).values(deleted_at=now))
+        conn.execute(model.__table__.update().where(model.__table__.c.is_deleted.is_(None)).values(is_deleted=False))
+        ARCHIVE_TABLES[model].create(conn, checkfirst=True)
+
+def current_version(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+def upgrade():
+    """
+    执行所有未执行的迁移，返回本次执行的 (版本, 名称) 列表
+    """
+    applied = []
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+    for number, name, func in MIGRATIONS:
+        if number <= version:
+            continue
+        # 每个迁移单独一个事务
+        with db.engine.begin() as conn:
+            func(conn)
+            conn.execute(schema_migrations.insert().values(version=number, name=name, applied_at=datetime.now()))
+        applied.append((number, name))
+    return applied
+
+def explain(conn, statement):
+    """
+    返回查询的执行计划（每行一条）
+    """
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+        return [row[-1] for row in rows]
+    rows = conn.exec_driver_sql('EXPLAIN ' + sql).fetchall()
+    return [row[0] for row in rows]
+
+def _is_full_scan(line):
+    # SQLite: "SCAN repairs"（无索引）；PostgreSQL: "Seq Scan on repairs"
+    return (line.startswith('SCAN ') and 'USING' not in line) or 'Seq Scan' in line
+
+def check_index_usage():
+    """
+    对仪表板和列表页的典型查询执行 EXPLAIN，返回 [(名称, 执行计划, 是否全表扫描)]
+    """
+    from app.models.models import User, Student, Dormitory, Repair, Visitor, UtilityBill, PasswordResetRequest
+
+    building = 'A'
+    queries = [
+        ('学生按用户查找', select(Student).where(Student.user_id == 1)),
+        ('楼栋学生数', select(func.count(Student.id)).join(Dormitory, Student.dorm_id == Dormitory.id).where(Dormitory.building == building)),
+        ('楼栋宿舍数', select(func.count(Dormitory.id)).where(Dormitory.building == building)),
+        ('楼栋待处理报修数', select(func.count(Repair.id)).join(Dormitory, Repair.dorm_id == Dormitory.id).where(Dormitory.building == building, Repair.status == 'pending')),
+        ('楼栋在访访客数', select(func.count(Visitor.id)).join(Student, Visitor.student_id == Student.id).join(Dormitory, Student.dorm_id == Dormitory.id).where(Dormitory.building == building, Visitor.status == 'in')),
+        ('待处理报修总数', select(func.count(Repair.id)).where(Repair.status == 'pending')),
+        ('最新报修', select(Repair).order_by(Repair.created_at.desc()).limit(5)),
+        ('最新访客', select(Visitor).order_by(Visitor.visit_date.desc()).limit(5)),
+        ('学生的报修', select(Repair).where(Repair.student_id == 1, Repair.is_deleted == False)),
+        ('学生的访客', select(Visitor).where(Visitor.student_id == 1, Visitor.is_deleted == False)),
+        ('宿舍月度账单', select(UtilityBill).where(UtilityBill.dorm_id == 1, UtilityBill.month == '2024-01')),
+        ('待处理重置申请', select(PasswordResetRequest).where(PasswordResetRequest.user_id == 1, PasswordResetRequest.status == 'pending')),
+        ('用户登录', select(User).where(User.username == '123', User.role == 'admin')),
+    ]
+    results = []
+    with db.engine.connect() as conn:
+        for label, statement in queries:
+            plan = explain(conn, statement)
+            results.append((label, plan, any(_is_full_scan(line) for line in plan)))
+    return results
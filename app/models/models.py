@@ -11,6 +11,7 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)  # admin, student, dorm_manager
     created_at = db.Column(db.DateTime, default=datetime.now)
     is_deleted = db.Column(db.Boolean, default=False)  # 软删除标记
+    deleted_at = db.Column(db.DateTime, nullable=True)  # 软删除时间，超过保留期后移入归档表
     
     # 关系
     student = db.relationship('Student', backref='user', uselist=False)
@@ -39,21 +40,27 @@ class Student(db.Model):
     __tablename__ = 'students'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     student_id = db.Column(db.String(20), unique=True, nullable=False)
     name = db.Column(db.String(50), nullable=False)
     gender = db.Column(db.String(10), nullable=False)
     major = db.Column(db.String(50), nullable=False)
     grade = db.Column(db.String(20), nullable=False)
-    dorm_id = db.Column(db.Integer, db.ForeignKey('dormitories.id'))
+    dorm_id = db.Column(db.Integer, db.ForeignKey('dormitories.id'), index=True)
     phone = db.Column(db.String(20), nullable=False)
     photo = db.Column(db.String(200), nullable=True)  # 学生照片路径
     is_deleted = db.Column(db.Boolean, default=False)  # 软删除标记
+    deleted_at = db.Column(db.DateTime, nullable=True)  # 软删除时间，超过保留期后移入归档表
     
     # 关系
     repairs = db.relationship('Repair', backref='student', lazy=True)
     visitors = db.relationship('Visitor', backref='student', lazy=True)
     
+    __table_args__ = (
+        # 部分索引只在 PostgreSQL 上创建，只索引未删除的记录
+        db.Index('ix_students_dorm_id_live', 'dorm_id', postgresql_where=db.text('is_deleted = false')).ddl_if(dialect='postgresql'),
+    )
+    
     def __repr__(self):
         return f'<Student {self.name}>'
 
@@ -61,11 +68,12 @@ class DormManager(db.Model):
     __tablename__ = 'dorm_managers'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     name = db.Column(db.String(50), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
     responsible_building = db.Column(db.String(20), nullable=False)  # 负责的楼栋
     is_deleted = db.Column(db.Boolean, default=False)  # 软删除标记
+    deleted_at = db.Column(db.DateTime, nullable=True)  # 软删除时间，超过保留期后移入归档表
     
     def __repr__(self):
         return f'<DormManager {self.name}>'
@@ -75,7 +83,7 @@ class Dormitory(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     dorm_number = db.Column(db.String(20), unique=True, nullable=False)
-    building = db.Column(db.String(20), nullable=False)
+    building = db.Column(db.String(20), nullable=False, index=True)
     floor = db.Column(db.Integer, nullable=False)
     capacity = db.Column(db.Integer, nullable=False)
     current_occupancy = db.Column(db.Integer, default=0)
@@ -105,6 +113,16 @@ class Repair(db.Model):
     contact_phone = db.Column(db.String(20), nullable=False)
     urgent_level = db.Column(db.String(20), default='normal')  # normal, urgent, very_urgent
     is_deleted = db.Column(db.Boolean, default=False)  # 软删除标记
+    deleted_at = db.Column(db.DateTime, nullable=True)  # 软删除时间，超过保留期后移入归档表
+    
+    __table_args__ = (
+        db.Index('ix_repairs_status', 'status'),
+        db.Index('ix_repairs_student_id', 'student_id'),
+        db.Index('ix_repairs_dorm_id_status', 'dorm_id', 'status'),
+        db.Index('ix_repairs_created_at', 'created_at'),
+        # 部分索引只在 PostgreSQL 上创建，只索引未删除的记录
+        db.Index('ix_repairs_created_at_live', 'created_at', postgresql_where=db.text('is_deleted = false')).ddl_if(dialect='postgresql'),
+    )
     
     def __repr__(self):
         return f'<Repair {self.title}>'
@@ -124,8 +142,17 @@ class Visitor(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=True)
     status = db.Column(db.String(20), default='in')  # in, out
     is_deleted = db.Column(db.Boolean, default=False)  # 软删除标记
+    deleted_at = db.Column(db.DateTime, nullable=True)  # 软删除时间，超过保留期后移入归档表
     qr_code = db.Column(db.String(200), nullable=True)  # 访客二维码路径
     
+    __table_args__ = (
+        db.Index('ix_visitors_status', 'status'),
+        db.Index('ix_visitors_student_id', 'student_id'),
+        db.Index('ix_visitors_visit_date', 'visit_date'),
+        # 部分索引只在 PostgreSQL 上创建，只索引未删除的记录
+        db.Index('ix_visitors_student_id_live', 'student_id', postgresql_where=db.text('is_deleted = false')).ddl_if(dialect='postgresql'),
+    )
+    
     def __repr__(self):
         return f'<Visitor {self.name}>'
 
@@ -150,15 +177,42 @@ class UtilityBill(db.Model):
     dormitory = db.relationship('Dormitory', backref='utility_bills')
     payments = db.relationship('Payment', backref='utility_bill', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_utility_bills_dorm_id_month', 'dorm_id', 'month'),
+        db.Index('ix_utility_bills_month', 'month'),
+    )
+    
     def __repr__(self):
         return f'<UtilityBill {self.dorm_id}-{self.month}>'
 
+# 水电费按 (楼栋, 月份) 汇总，由 app/services/bill_rollups.py 维护
+class UtilityBillRollup(db.Model):
+    __tablename__ = 'utility_bill_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    building = db.Column(db.String(20), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # 格式：YYYY-MM
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+    electricity = db.Column(db.Float, nullable=False, default=0)
+    water = db.Column(db.Float, nullable=False, default=0)
+    electricity_cost = db.Column(db.Float, nullable=False, default=0)
+    water_cost = db.Column(db.Float, nullable=False, default=0)
+    total_cost = db.Column(db.Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('building', 'month', name='uq_utility_bill_rollups_building_month'),
+        db.Index('ix_utility_bill_rollups_month', 'month'),
+    )
+    
+    def __repr__(self):
+        return f'<UtilityBillRollup {self.building}-{self.month}>'
+
 class Payment(db.Model):
     __tablename__ = 'payments'
     
     id = db.Column(db.Integer, primary_key=True)
-    bill_id = db.Column(db.Integer, db.ForeignKey('utility_bills.id'), nullable=False)
-    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    bill_id = db.Column(db.Integer, db.ForeignKey('utility_bills.id'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False, index=True)
     amount = db.Column(db.Float, nullable=False)
     payment_date = db.Column(db.DateTime, default=datetime.now)
     payment_method = db.Column(db.String(20), nullable=False)  # cash, wechat, alipay, bank
@@ -175,7 +229,7 @@ class DormChangeRequest(db.Model):
     __tablename__ = 'dorm_change_requests'
     
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False, index=True)
     current_dorm_id = db.Column(db.Integer, db.ForeignKey('dormitories.id'), nullable=False)
     target_dorm_id = db.Column(db.Integer, db.ForeignKey('dormitories.id'), nullable=True)
     reason = db.Column(db.Text, nullable=False)
@@ -222,6 +276,56 @@ class PasswordResetRequest(db.Model):
     
     user = db.relationship('User', foreign_keys=[user_id], backref='password_reset_requests')
     handler = db.relationship('User', foreign_keys=[handled_by], backref='handled_password_resets')
+    
+    __table_args__ = (
+        db.Index('ix_password_reset_requests_user_id_status', 'user_id', 'status'),
+        db.Index('ix_password_reset_requests_request_time', 'request_time'),
+    )
 
     def __repr__(self):
         return f'<PasswordResetRequest {self.user_id}>'
+
+# 后台任务模型
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)  # 任务类型，如 import_students
+    status = db.Column(db.String(20), default='pending')  # pending, running, succeeded, failed
+    params = db.Column(db.Text, nullable=True)  # JSON
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.String(200), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    creator = db.relationship('User', backref='background_jobs')
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.name}>'
+
+# 待发送邮件（发件箱），由 app/services/mailer.py 的后台发送线程投递
+class OutboxEmail(db.Model):
+    __tablename__ = 'outbox_emails'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.now)  # 下次发送时间（sending 状态下为租约到期时间）
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_outbox_emails_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.to_email}>'
@@ -0,0 +1,230 @@
+from collections import defaultdict
+from sqlalchemy import func, update, bindparam, and_
+from app import db
+from app.models.models import Student, Dormitory
+from app.services.dashboard_counters import invalidate_dashboard_counters
+from app.services.identity import invalidate_identity
+from app.services.reference_data import invalidate_reference_data
+from app.services.jobs import job_handler
+
+class Room:
+    __slots__ = ('id', 'dorm_number', 'building', 'free', 'gender', 'cohort', 'assigned')
+
+    def __init__(self, id, dorm_number, building, free, gender=None, cohort=None):
+        self.id = id
+        self.dorm_number = dorm_number
+        self.building = building
+        self.free = free
+        self.gender = gender    # 已入住学生的性别，空宿舍为 None
+        self.cohort = cohort    # 已入住学生中人数最多的 (专业, 年级)
+        self.assigned = 0
+
+class AllocationPlan:
+    """
+    分配方案：assignments 为 [(学生ID, 宿舍ID)]，rows 为预览用的明细
+    """
+    def __init__(self, rooms):
+        self.rooms = {room.id: room for room in rooms}
+        self.assignments = []
+        self.rows = []
+        self.unassigned = 0
+
+    def add(self, student, room):
+        room.free -= 1
+        room.assigned += 1
+        self.assignments.append((student.id, room.id))
+        self.rows.append({'student_id': student.student_id, 'name': student.name, 'gender': student.gender,
+                          'major': student.major, 'grade': student.grade,
+                          'building': room.building, 'dorm_number': room.dorm_number})
+
+    def building_summary(self):
+        summary = defaultdict(int)
+        for room in self.rooms.values():
+            if room.assigned:
+                summary[room.building] += room.assigned
+        return sorted(summary.items())
+
+def _load_rooms():
+    """
+    一次查询加载所有未满宿舍的空床数和入住学生性别，再一次分组查询得到每个宿舍的主要 (专业, 年级)
+    """
+    live = and_(Student.dorm_id == Dormitory.id, Student.is_deleted == False)
+    rows = db.session.query(
+        Dormitory.id, Dormitory.dorm_number, Dormitory.building, Dormitory.capacity, Dormitory.current_occupancy,
+        func.count(Student.id), func.min(Student.gender), func.max(Student.gender)
+    ).outerjoin(Student, live).filter(
+        Dormitory.current_occupancy < Dormitory.capacity
+    ).group_by(Dormitory.id).order_by(Dormitory.building, Dormitory.dorm_number).all()
+
+    rooms = []
+    for dorm_id, dorm_number, building, capacity, occupancy, residents, min_gender, max_gender in rows:
+        if residents and min_gender != max_gender:
+            continue  # 已经混住的宿舍不再分配
+        rooms.append(Room(dorm_id, dorm_number, building, capacity - (occupancy or 0), min_gender if residents else None))
+
+    cohorts = db.session.query(
+        Student.dorm_id, Student.major, Student.grade, func.count(Student.id)
+    ).filter(Student.dorm_id.isnot(None), Student.is_deleted == False).group_by(
+        Student.dorm_id, Student.major, Student.grade
+    ).all()
+    best = {}
+    for dorm_id, major, grade, count in cohorts:
+        if dorm_id not in best or count > best[dorm_id][1]:
+            best[dorm_id] = ((major, grade), count)
+    for room in rooms:
+        if room.gender and room.id in best:
+            room.cohort = best[room.id][0]
+    return rooms
+
+class _Buckets:
+    """
+    空床桶：有人的宿舍按 (性别, 专业, 年级)/(性别, 专业)/(性别, 年级)/(性别) 分桶，空宿舍按楼栋分桶
+
+    桶是栈，宿舍住满后惰性删除，每个宿舍最多进出每个桶一次，整体近似线性
+    """
+    def __init__(self, rooms):
+        self.partial = defaultdict(list)
+        self.empty = defaultdict(list)
+        for room in reversed(rooms):  # 栈顶为楼栋/房号最小的宿舍
+            if room.gender:
+                self.add_partial(room)
+            else:
+                self.empty[room.building].append(room)
+        self.buildings = sorted(self.empty)
+        # 入住人数多的宿舍优先，使已有宿舍尽快住满
+        for key in self.partial:
+            self.partial[key].sort(key=lambda room: -room.free)
+
+    def add_partial(self, room):
+        major, grade = room.cohort or (None, None)
+        keys = [(room.gender,)]
+        if room.cohort:
+            keys = [(room.gender, major, grade), (room.gender, 'major', major), (room.gender, 'grade', grade)] + keys
+        for key in keys:
+            self.partial[key].append(room)
+
+    @staticmethod
+    def _pop(stack):
+        while stack:
+            room = stack[-1]
+            if room.free > 0:
+                return room
+            stack.pop()
+        return None
+
+    def take(self, student, preferred_building):
+        for key in ((student.gender, student.major, student.grade),
+                    (student.gender, 'major', student.major),
+                    (student.gender, 'grade', student.grade),
+                    (student.gender,)):
+            room = self._pop(self.partial.get(key, []))
+            if room:
+                return room
+
+        # 没有合适的已入住宿舍时启用空宿舍，同一 (专业, 年级) 尽量住在同一楼栋
+        buildings = self.buildings
+        if preferred_building in self.empty:
+            buildings = [preferred_building] + buildings
+        for building in buildings:
+            stack = self.empty[building]
+            if stack:
+                room = stack.pop()
+                room.gender = student.gender
+                room.cohort = (student.major, student.grade)
+                self.add_partial(room)
+                return room
+        return None
+
+def plan_allocation(progress=None):
+    """
+    计算分配方案（不写数据库）
+
+    规则：同性别；优先同专业同年级，其次同专业，再次同年级；优先填满已有人入住的宿舍，
+    最后才启用空宿舍
+    """
+    rooms = _load_rooms()
+    plan = AllocationPlan(rooms)
+    buckets = _Buckets(rooms)
+
+    students = Student.query.filter(Student.dorm_id.is_(None), Student.is_deleted == False).order_by(
+        Student.gender, Student.major, Student.grade, Student.id
+    ).all()
+    cohort_building = {}
+    for index, student in enumerate(students, start=1):
+        cohort = (student.gender, student.major, student.grade)
+        room = buckets.take(student, cohort_building.get(cohort))
+        if room is None:
+            plan.unassigned += 1
+        else:
+            plan.add(student, room)
+            cohort_building[cohort] = room.building
+        if progress and index % 1000 == 0:
+            progress(index, len(students))
+    return plan
+
+def apply_allocation(plan):
+    """
+    在一个事务中写入分配结果。每个宿舍先按计划人数原子占用床位（UPDATE ... WHERE 入住人数 + n <= 容量），
+    期间已被其他请求占满的宿舍整体跳过；再只更新仍未分配的学生，少写入的人数退回床位
+    """
+    students = Student.__table__
+    dormitories = Dormitory.__table__
+    occupancy = func.coalesce(dormitories.c.current_occupancy, 0)
+    if not plan.assignments:
+        return 0
+    try:
+        connection = db.session.connection()
+        allocated_count = 0
+        shortfalls = []
+        by_room = defaultdict(list)
+        for student_id, dorm_id in plan.assignments:
+            by_room[dorm_id].append(student_id)
+        # 按宿舍ID顺序加锁，避免与其他事务互相死锁
+        for dorm_id in sorted(by_room):
+            student_ids = by_room[dorm_id]
+            reserved = connection.execute(
+                update(dormitories).where(
+                    dormitories.c.id == dorm_id, occupancy + len(student_ids) <= dormitories.c.capacity
+                ).values(current_occupancy=occupancy + len(student_ids))
+            ).rowcount
+            if not reserved:
+                continue
+            written = connection.execute(
+                update(students).where(students.c.id.in_(student_ids), students.c.dorm_id.is_(None)).values(dorm_id=dorm_id)
+            ).rowcount
+            allocated_count += written
+            if written < len(student_ids):
+                shortfalls.append({'dorm_id': dorm_id, 'unused': len(student_ids) - written})
+        if shortfalls:
+            connection.execute(
+                update(dormitories).where(dormitories.c.id == bindparam('dorm_id')).values(
+                    current_occupancy=occupancy - bindparam('unused')
+                ),
+                shortfalls
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # 批量更新不经过会话事件，需要手动失效仪表板计数、已缓存的学生资料和宿舍入住数
+    invalidate_dashboard_counters()
+    invalidate_identity()
+    invalidate_reference_data()
+    return allocated_count
+
+def allocate_unassigned_students(progress=None):
+    """
+    为未分配宿舍的学生分配宿舍，返回分配的学生数
+    """
+    plan = plan_allocation(progress)
+    return apply_allocation(plan)
+
+@job_handler('smart_allocate_dorm')
+def smart_allocate_job(context):
+    plan = plan_allocation(progress=lambda done, total: context.progress(done, total, f'已计算 {done} 名学生'))
+    allocated_count = apply_allocation(plan)
+    # 计划中因宿舍被并发占满而未写入的学生同样计为未分配
+    unassigned = plan.unassigned + len(plan.assignments) - allocated_count
+    context.progress(allocated_count, allocated_count + unassigned,
+                     f'已分配 {allocated_count} 名学生，{unassigned} 名学生没有合适的空床')
+    return {'allocated': allocated_count, 'unassigned': unassigned, 'buildings': dict(plan.building_summary())}
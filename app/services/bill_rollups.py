@@ -0,0 +1,126 @@
+from collections import defaultdict
+from sqlalchemy import event, inspect, select, insert, delete, func
+from app import db
+from app.models.models import UtilityBill, UtilityBillRollup, Dormitory
+
+# 汇总的用量/费用字段
+ROLLUP_FIELDS = ('electricity', 'water', 'electricity_cost', 'water_cost', 'total_cost')
+# 影响汇总结果的账单字段
+TRACKED_FIELDS = ('dorm_id', 'month') + ROLLUP_FIELDS
+
+rollups = UtilityBillRollup.__table__
+
+def _rollup_select(*criteria):
+    """
+    从账单表按 (楼栋, 月份) 分组汇总
+    """
+    return select(
+        Dormitory.building, UtilityBill.month, func.count(UtilityBill.id),
+        *[func.coalesce(func.sum(getattr(UtilityBill, field)), 0) for field in ROLLUP_FIELDS]
+    ).join(Dormitory, UtilityBill.dorm_id == Dormitory.id).where(*criteria).group_by(
+        Dormitory.building, UtilityBill.month
+    )
+
+def _insert_from_bills(connection, *criteria):
+    columns = ['building', 'month', 'bill_count'] + list(ROLLUP_FIELDS)
+    connection.execute(insert(rollups).from_select(columns, _rollup_select(*criteria)))
+
+def rebuild_rollups(connection):
+    """
+    用 GROUP BY 重建全部汇总行（迁移、修复数据或批量导入账单后使用）
+    """
+    connection.execute(delete(rollups))
+    _insert_from_bills(connection)
+
+def refresh_rollups(connection, groups):
+    """
+    重新计算受影响的汇总行。groups 为 {(宿舍ID, 月份)}
+    """
+    dorms_by_month = defaultdict(set)
+    for dorm_id, month in groups:
+        if dorm_id is not None and month:
+            dorms_by_month[month].add(int(dorm_id))
+    for month, dorm_ids in dorms_by_month.items():
+        buildings = connection.execute(
+            select(Dormitory.building).where(Dormitory.id.in_(dorm_ids)).distinct()
+        ).scalars().all()
+        if not buildings:
+            continue
+        connection.execute(delete(rollups).where(rollups.c.month == month, rollups.c.building.in_(buildings)))
+        _insert_from_bills(connection, UtilityBill.month == month, Dormitory.building.in_(buildings))
+
+def _round(value):
+    return round(value or 0, 2)
+
+def get_bill_statistics():
+    """
+    水电费统计：总计、按楼栋、按月份，全部从汇总表读取
+    """
+    sums = [func.coalesce(func.sum(getattr(UtilityBillRollup, field)), 0) for field in ROLLUP_FIELDS]
+
+    totals = db.session.query(*sums).one()
+    building_rows = db.session.query(UtilityBillRollup.building, *sums).group_by(
+        UtilityBillRollup.building
+    ).order_by(UtilityBillRollup.building).all()
+    month_rows = db.session.query(UtilityBillRollup.month, *sums).group_by(
+        UtilityBillRollup.month
+    ).order_by(UtilityBillRollup.month).all()
+
+    def as_dict(values):
+        return {field: _round(value) for field, value in zip(ROLLUP_FIELDS, values)}
+
+    return {
+        'totals': as_dict(totals),
+        'building_stats': {row[0]: as_dict(row[1:]) for row in building_rows},
+        'monthly_stats': {row[0]: as_dict(row[1:]) for row in month_rows},
+    }
+
+def _previous_group(bill):
+    """
+    返回 flush 前账单所属的 (宿舍ID, 月份)；旧值未加载而无法得知时返回 None
+    """
+    state = inspect(bill)
+    values = []
+    for field in ('dorm_id', 'month'):
+        history = state.attrs[field].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.added:
+            return None
+        else:
+            values.append(getattr(bill, field))
+    return tuple(values)
+
+def _bill_changed(bill):
+    state = inspect(bill)
+    return any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS)
+
+# 与账单写入在同一事务中刷新汇总行
+@event.listens_for(db.session, 'after_flush')
+def _refresh_bill_rollups(session, flush_context):
+    groups = set()
+    rebuild = False
+
+    for obj in session.new:
+        if isinstance(obj, UtilityBill):
+            groups.add((obj.dorm_id, obj.month))
+
+    for obj in session.deleted:
+        if isinstance(obj, UtilityBill):
+            groups.add(_previous_group(obj) or (obj.dorm_id, obj.month))
+
+    for obj in session.dirty:
+        if isinstance(obj, Dormitory) and inspect(obj).attrs.building.history.has_changes():
+            rebuild = True  # 宿舍换楼栋会移动其全部账单
+        elif isinstance(obj, UtilityBill) and _bill_changed(obj):
+            previous = _previous_group(obj)
+            if previous is None:
+                rebuild = True
+            else:
+                groups.add(previous)
+            groups.add((obj.dorm_id, obj.month))
+
+    if rebuild:
+        rebuild_rollups(session.connection())
+    elif groups:
+        refresh_rollups(session.connection(), groups)
@@ -0,0 +1,181 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from app import db
+from app.models.models import UtilityBill, Dormitory
+from app.services.bill_rollups import refresh_rollups
+from app.services.jobs import job_handler
+
+BATCH_SIZE = 1000
+READING_FIELDS = ['dorm_number', 'electricity', 'water']
+
+def tiered_cost(usage, tiers):
+    """
+    按阶梯单价计算费用。tiers 为 [[本档上限, 单价], ...]，最后一档上限为 None
+    """
+    cost = 0.0
+    lower = 0.0
+    for upper, price in tiers:
+        if upper is None or usage <= upper:
+            cost += (usage - lower) * price
+            break
+        cost += (upper - lower) * price
+        lower = upper
+    return round(cost, 2)
+
+def compute_bill_costs(electricity, water):
+    """
+    按配置的阶梯单价计算电费、水费和总费用
+    """
+    electricity_cost = tiered_cost(electricity, current_app.config['ELECTRICITY_TARIFFS'])
+    water_cost = tiered_cost(water, current_app.config['WATER_TARIFFS'])
+    return electricity_cost, water_cost, round(electricity_cost + water_cost, 2)
+
+def bill_due_date(month):
+    """
+    账单月份（须为 YYYY-MM，月份两位）的到期日，格式不对时抛出 ValueError；同时用作月份校验
+    """
+    if not re.fullmatch(r'\d{4}-\d{2}', month):
+        raise ValueError(f'Invalid month: {month}')
+    return datetime.strptime(f'{month}-28', '%Y-%m-%d')  # 假设每月28号到期
+
+class BillingReport:
+    """
+    批量出账结果：生成数、跳过数、逐行错误和吞吐量
+    """
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.errors = []  # [(行号, 错误信息)]
+        self.elapsed = 0.0
+
+    def add_error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    @property
+    def rows_per_second(self):
+        rows = self.created + self.skipped + len(self.errors)
+        return round(rows / self.elapsed, 1) if self.elapsed else None
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'skipped': self.skipped,
+            'errors': [{'line': line_no, 'message': message} for line_no, message in self.errors],
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+        }
+
+def iter_readings(stream, fmt='csv'):
+    """
+    以流的方式读取抄表文件，返回 (行号, {dorm_number, electricity, water})
+
+    CSV 需要表头（至少包含 dorm_number, electricity, water 三列）；JSONL 每行一个对象
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            for line_no, row in enumerate(csv.DictReader(text), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_no, row if isinstance(row, dict) else None
+    finally:
+        text.detach()
+
+def _parse_usage(value):
+    usage = float(value)
+    if usage < 0 or usage != usage:
+        raise ValueError
+    return usage
+
+def generate_bills(readings, month, progress=None):
+    """
+    根据抄表数据为指定月份批量生成账单
+
+    宿舍号和该月已有账单各一次查询预取；全部账单在同一个事务中分批批量插入，
+    插入后刷新该月的水电费汇总
+    """
+    started = time.perf_counter()
+    report = BillingReport()
+    dorm_ids = dict(db.session.query(Dormitory.dorm_number, Dormitory.id))
+    billed = {dorm_id for (dorm_id,) in db.session.query(UtilityBill.dorm_id).filter(UtilityBill.month == month)}
+    due_date = bill_due_date(month)
+    now = datetime.now()
+
+    batch = []
+    billed_dorms = set()
+    try:
+        for line_no, row in readings:
+            if row is None:
+                report.add_error(line_no, '无法解析该行')
+                continue
+            dorm_number = str(row.get('dorm_number') or '').strip()
+            dorm_id = dorm_ids.get(dorm_number)
+            if dorm_id is None:
+                report.add_error(line_no, f'宿舍 {dorm_number or "(空)"} 不存在')
+                continue
+            try:
+                electricity = _parse_usage(row.get('electricity'))
+                water = _parse_usage(row.get('water'))
+            except (TypeError, ValueError):
+                report.add_error(line_no, '用电量/用水量必须是非负数字')
+                continue
+            if dorm_id in billed:
+                report.skipped += 1  # 该宿舍本月账单已存在
+                continue
+
+            billed.add(dorm_id)
+            billed_dorms.add(dorm_id)
+            electricity_cost, water_cost, total_cost = compute_bill_costs(electricity, water)
+            batch.append({
+                'dorm_id': dorm_id, 'month': month, 'electricity': electricity, 'water': water,
+                'electricity_cost': electricity_cost, 'water_cost': water_cost, 'total_cost': total_cost,
+                'status': 'unpaid', 'due_date': due_date, 'created_at': now, 'updated_at': now,
+            })
+            if len(batch) >= BATCH_SIZE:
+                db.session.execute(insert(UtilityBill), batch)
+                report.created += len(batch)
+                batch = []
+                if progress:
+                    progress(report.created)
+
+        if batch:
+            db.session.execute(insert(UtilityBill), batch)
+            report.created += len(batch)
+        if billed_dorms:
+            # 批量插入不经过会话事件，手动刷新汇总
+            refresh_rollups(db.session.connection(), {(dorm_id, month) for dorm_id in billed_dorms})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+@job_handler('generate_bills')
+def generate_bills_job(context, path, month, fmt='csv'):
+    """
+    后台任务：根据已保存到临时文件的抄表数据批量出账，完成后删除临时文件
+    """
+    try:
+        with open(path, 'rb') as stream:
+            report = generate_bills(iter_readings(stream, fmt), month,
+                                    progress=lambda done: context.progress(done, message=f'已生成 {done} 张账单'))
+    finally:
+        os.remove(path)
+    context.progress(report.created, message=f'生成 {report.created} 张，跳过 {report.skipped} 张，错误 {len(report.errors)} 行，{report.rows_per_second} 行/秒')
+    return report.to_dict()
@@ -0,0 +1,140 @@
+import pickle
+import threading
+import time
+
+class MemoryBackend:
+    """
+    进程内缓存后端（带TTL），每个 gunicorn worker 各自持有一份
+    """
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _get_entry(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._get_entry(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                self._data.pop(key, None)
+
+    def get_counters(self, key):
+        with self._lock:
+            entry = self._get_entry(key)
+            return dict(entry[0]) if entry else None
+
+    def set_counters(self, key, mapping, ttl=None):
+        self.set(key, dict(mapping), ttl)
+
+    def incr_counters(self, key, deltas):
+        # 只对已存在的计数器做增量更新，不存在时等待下次读取重新计算
+        with self._lock:
+            entry = self._get_entry(key)
+            if not entry:
+                return
+            counters = entry[0]
+            for field, delta in deltas.items():
+                counters[field] = counters.get(field, 0) + delta
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class RedisBackend:
+    """
+    Redis 兼容的缓存后端（多个 worker 共享），需要安装 redis 包
+    """
+    # 仅当计数器存在时执行 HINCRBY，保证增量更新的原子性
+    INCR_SCRIPT = """
+    if redis.call('exists', KEYS[1]) == 1 then
+        for i = 1, #ARGV, 2 do
+            redis.call('hincrby', KEYS[1], ARGV[i], ARGV[i + 1])
+        end
+    end
+    """
+
+    def __init__(self, url, prefix='dormitory:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._incr = self._client.register_script(self.INCR_SCRIPT)
+
+    def get(self, key):
+        value = self._client.get(self._prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, pickle.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+    def delete_prefix(self, prefix):
+        keys = list(self._client.scan_iter(match=self._prefix + prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def get_counters(self, key):
+        data = self._client.hgetall(self._prefix + key)
+        if not data:
+            return None
+        return {k.decode(): int(v) for k, v in data.items()}
+
+    def set_counters(self, key, mapping, ttl=None):
+        pipe = self._client.pipeline()
+        pipe.delete(self._prefix + key)
+        pipe.hset(self._prefix + key, mapping=mapping)
+        if ttl:
+            pipe.expire(self._prefix + key, ttl)
+        pipe.execute()
+
+    def incr_counters(self, key, deltas):
+        args = []
+        for field, delta in deltas.items():
+            args.extend([field, delta])
+        if args:
+            self._incr(keys=[self._prefix + key], args=args)
+
+    def clear(self):
+        self.delete_prefix('')
+
+class Cache:
+    """
+    应用级缓存，默认使用进程内后端；配置 CACHE_REDIS_URL 时切换为 Redis 兼容后端
+    """
+    def __init__(self, app=None):
+        self.backend = MemoryBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        redis_url = app.config.get('CACHE_REDIS_URL')
+        if redis_url:
+            self.backend = RedisBackend(redis_url, app.config.get('CACHE_KEY_PREFIX', 'dormitory:'))
+        else:
+            self.backend = MemoryBackend()
+        app.extensions['cache'] = self
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
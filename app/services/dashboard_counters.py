@@ -0,0 +1,199 @@
+from collections import Counter
+from flask import current_app
+from sqlalchemy import event, inspect
+from app import db, cache
+from app.models.models import Student, Dormitory, Repair, Visitor
+
+GLOBAL_KEY = 'dashboard:global'
+BUILDING_PREFIX = 'dashboard:building:'
+
+# 各模型参与计数的字段
+TRACKED_FIELDS = {
+    Student: ('dorm_id', 'is_deleted'),
+    Dormitory: ('building',),
+    Repair: ('dorm_id', 'status', 'is_deleted'),
+    Visitor: ('student_id', 'status', 'is_deleted'),
+}
+
+def building_key(building):
+    return f'{BUILDING_PREFIX}{building}'
+
+def _ttl():
+    return current_app.config.get('DASHBOARD_CACHE_TTL', 300)
+
+def get_global_counters():
+    """
+    管理员仪表板计数（总学生数/总宿舍数/总报修数/待处理报修），缓存未命中时才查询数据库
+    """
+    counters = cache.get_counters(GLOBAL_KEY)
+    if counters is None:
+        counters = {
+            'total_students': Student.query.count(),
+            'total_dorms': Dormitory.query.count(),
+            'total_repairs': Repair.query.count(),
+            'pending_repairs': Repair.query.filter_by(status='pending').count(),
+        }
+        cache.set_counters(GLOBAL_KEY, counters, _ttl())
+    return counters
+
+def get_building_counters(building):
+    """
+    宿管仪表板计数（本楼栋学生数/宿舍数/待处理报修/在访访客），缓存未命中时才查询数据库
+    """
+    key = building_key(building)
+    counters = cache.get_counters(key)
+    if counters is None:
+        counters = {
+            'total_students': Student.query.join(Dormitory).filter(
+                Dormitory.building == building
+            ).count(),
+            'total_dorms': Dormitory.query.filter_by(building=building).count(),
+            'pending_repairs': Repair.query.join(Dormitory, Repair.dorm_id == Dormitory.id).filter(
+                Dormitory.building == building,
+                Repair.status == 'pending'
+            ).count(),
+            'current_visitors': Visitor.query.join(Student).join(Dormitory).filter(
+                Dormitory.building == building,
+                Visitor.status == 'in'
+            ).count(),
+        }
+        cache.set_counters(key, counters, _ttl())
+    return counters
+
+def invalidate_dashboard_counters(building=None):
+    """
+    使计数缓存失效；用于绕过 ORM 的批量 UPDATE/INSERT 之后。building 为空时清除所有楼栋
+    """
+    cache.delete(GLOBAL_KEY)
+    if building is None:
+        cache.delete_prefix(BUILDING_PREFIX)
+    else:
+        cache.delete(building_key(building))
+
+class BuildingResolver:
+    """
+    在一次 flush 中查找宿舍/学生所属楼栋，优先使用会话中已加载的对象
+    """
+    def __init__(self, session):
+        self.session = session
+
+    def dorm_building(self, dorm_id):
+        if dorm_id is None:
+            return None
+        dorm = self.session.get(Dormitory, int(dorm_id))
+        return dorm.building if dorm else None
+
+    def student_building(self, student_id):
+        if student_id is None:
+            return None
+        # 访客所属学生可能已软删除，仍按其宿舍计算楼栋
+        student = self.session.get(Student, int(student_id), execution_options={'include_deleted': True})
+        return self.dorm_building(student.dorm_id) if student else None
+
+def _contributions(obj, values, resolver):
+    """
+    计算单条记录对各计数器的贡献，返回 {(缓存键, 字段): 数量}
+    """
+    result = Counter()
+    if values.get('is_deleted'):
+        return result  # 已软删除的记录不计数
+    if isinstance(obj, Student):
+        result[(GLOBAL_KEY, 'total_students')] += 1
+        building = resolver.dorm_building(values['dorm_id'])
+        if building:
+            result[(building_key(building), 'total_students')] += 1
+    elif isinstance(obj, Dormitory):
+        result[(GLOBAL_KEY, 'total_dorms')] += 1
+        result[(building_key(values['building']), 'total_dorms')] += 1
+    elif isinstance(obj, Repair):
+        result[(GLOBAL_KEY, 'total_repairs')] += 1
+        if values['status'] == 'pending':
+            result[(GLOBAL_KEY, 'pending_repairs')] += 1
+            building = resolver.dorm_building(values['dorm_id'])
+            if building:
+                result[(building_key(building), 'pending_repairs')] += 1
+    elif isinstance(obj, Visitor):
+        if values['status'] == 'in':
+            building = resolver.student_building(values['student_id'])
+            if building:
+                result[(building_key(building), 'current_visitors')] += 1
+    return result
+
+def _current_values(obj):
+    return {field: getattr(obj, field) for field in TRACKED_FIELDS[type(obj)]}
+
+def _previous_values(obj):
+    """
+    返回 flush 前的字段值；若旧值未加载而无法得知则返回 None
+    """
+    state = inspect(obj)
+    values = {}
+    for field in TRACKED_FIELDS[type(obj)]:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        elif history.added:
+            return None
+        else:
+            values[field] = getattr(obj, field)
+    return values
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_counter_deltas(session, flush_context):
+    deltas = session.info.setdefault('dashboard_deltas', Counter())
+    invalidated = session.info.setdefault('dashboard_invalidated', set())
+    resolver = BuildingResolver(session)
+
+    for obj in session.new:
+        if type(obj) in TRACKED_FIELDS:
+            deltas.update(_contributions(obj, _current_values(obj), resolver))
+
+    for obj in session.deleted:
+        if type(obj) in TRACKED_FIELDS:
+            deltas.subtract(_contributions(obj, _previous_values(obj) or _current_values(obj), resolver))
+
+    for obj in session.dirty:
+        if type(obj) not in TRACKED_FIELDS or not session.is_modified(obj):
+            continue
+        previous = _previous_values(obj)
+        current = _current_values(obj)
+        if previous == current:
+            continue
+        if previous is None or isinstance(obj, Dormitory):
+            # 旧值未知或宿舍楼栋变更，直接清除全部计数
+            invalidated.add(None)
+            continue
+        if isinstance(obj, Student):
+            # 学生换宿舍会带走其在访访客，清除新旧两个楼栋的计数；删除学生还会改变总学生数
+            if previous['is_deleted'] != current['is_deleted']:
+                invalidated.add(GLOBAL_KEY)
+            for dorm_id in (previous['dorm_id'], current['dorm_id']):
+                building = resolver.dorm_building(dorm_id)
+                if building:
+                    invalidated.add(building_key(building))
+            continue
+        deltas.subtract(_contributions(obj, previous, resolver))
+        deltas.update(_contributions(obj, current, resolver))
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_counter_deltas(session):
+    deltas = session.info.pop('dashboard_deltas', None)
+    invalidated = session.info.pop('dashboard_invalidated', set())
+
+    if None in invalidated:
+        invalidate_dashboard_counters()
+        return
+    for key in invalidated:
+        cache.delete(key)
+
+    grouped = {}
+    for (key, field), delta in (deltas or {}).items():
+        if delta and key not in invalidated:
+            grouped.setdefault(key, {})[field] = delta
+    for key, fields in grouped.items():
+        cache.incr_counters(key, fields)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_counter_deltas(session):
+    session.info.pop('dashboard_deltas', None)
+    session.info.pop('dashboard_invalidated', None)
@@ -0,0 +1,34 @@
+from sqlalchemy import func, case
+from app import db
+from app.models.models import Dormitory, Repair
+
+def get_dorm_occupancy_data():
+    """
+    宿舍入住率统计（已住满/未住满/空置），在数据库端一次聚合完成
+    """
+    full_dorms, partial_dorms, empty_dorms = db.session.query(
+        func.coalesce(func.sum(case((Dormitory.current_occupancy == Dormitory.capacity, 1), else_=0)), 0),
+        func.coalesce(func.sum(case(((Dormitory.current_occupancy > 0) & (Dormitory.current_occupancy < Dormitory.capacity), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Dormitory.current_occupancy == 0, 1), else_=0)), 0)
+    ).one()
+
+    return [
+        {"value": int(full_dorms), "name": '已住满'},
+        {"value": int(partial_dorms), "name": '未住满'},
+        {"value": int(empty_dorms), "name": '空置'}
+    ]
+
+def get_building_repair_data():
+    """
+    各楼栋报修数量统计，使用 GROUP BY 代替逐条加载报修记录
+    """
+    rows = db.session.query(Dormitory.building, func.count(Repair.id)) \
+        .join(Repair, Repair.dorm_id == Dormitory.id) \
+        .group_by(Dormitory.building) \
+        .order_by(Dormitory.building) \
+        .all()
+
+    return {
+        "buildings": [building for building, _ in rows],
+        "counts": [count for _, count in rows]
+    }
@@ -0,0 +1,197 @@
+import time
+from collections import Counter
+from functools import lru_cache
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, bindparam
+from app import db, cache
+from app.models.models import Visitor, Student, Dormitory
+from app.services.dashboard_counters import building_key
+from app.services.jobs import job_handler, scheduler
+from app.services.live_events import publish_change, visitor_event_data
+from app.services.qr_codes import verify_visitor_token
+
+# 扫码动作：(当前状态, 扫码后状态)
+TRANSITIONS = {
+    'in': ('out', 'in'),
+    'out': ('in', 'out'),
+}
+
+class ScanError(ValueError):
+    def __init__(self, message, status=409, visitor_status=None):
+        super().__init__(message)
+        self.status = status
+        self.visitor_status = visitor_status
+
+def _visitor_building():
+    # 访客所属楼栋（被访学生所在宿舍的楼栋）
+    return select(Dormitory.building).join(Student, Student.dorm_id == Dormitory.id).where(
+        Student.id == Visitor.student_id
+    ).scalar_subquery()
+
+@lru_cache(maxsize=None)
+def _scan_statement(action, by_building):
+    """
+    扫码用的 UPDATE 语句，按（动作, 是否限定楼栋）只构造一次，取值通过绑定参数传入：
+    复用同一个语句对象时 SQLAlchemy 不必每次重新构造语句和计算编译缓存键
+    """
+    source, target = TRANSITIONS[action]
+    statement = update(Visitor).where(
+        Visitor.id == bindparam('visitor_id'),
+        Visitor.visit_date >= bindparam('registered_from'),
+        Visitor.visit_date < bindparam('registered_to'),
+        Visitor.status == source,
+        Visitor.is_deleted == False
+    )
+    if by_building:
+        statement = statement.where(_visitor_building() == bindparam('building'))
+    return statement.values(
+        status=target,
+        leave_date=bindparam('new_leave_date')
+    ).returning(
+        Visitor.id, Visitor.name, Visitor.dorm_number, Visitor.student_name, Visitor.status,
+        Visitor.visit_date, Visitor.leave_date, Visitor.student_id
+    )
+
+def scan_visitor(token, action='out', building=None):
+    """
+    门卫扫描访客二维码办理进出：校验签名令牌后用一条条件 UPDATE 切换状态并返回访客信息
+
+    UPDATE ... WHERE id = 令牌中的ID AND 登记时间与令牌一致 AND status = 当前状态 [AND 楼栋 = building] RETURNING ...，
+    重复扫码或并发扫码只有一次成功，其余抛出 ScanError；令牌无效时抛出 QRTokenError
+    """
+    visitor_id, registered = verify_visitor_token(token)
+    target = TRANSITIONS[action][1]
+    # 令牌中的登记时间精确到秒：访客的登记时间须落在 [registered, registered + 1秒)，
+    # 令牌只对签发时的那次登记有效（访客ID被复用或登记时间被修改后旧二维码失效）
+    params = {
+        'visitor_id': visitor_id,
+        'registered_from': registered,
+        'registered_to': registered + timedelta(seconds=1),
+        'new_leave_date': datetime.now() if target == 'out' else None,
+    }
+    if building is not None:
+        params['building'] = building
+    statement = _scan_statement(action, building is not None)
+    row = db.session.execute(statement, params, execution_options={'synchronize_session': False}).first()
+    if row is None:
+        db.session.rollback()
+        raise _scan_failure(visitor_id, registered, target, building)
+    db.session.commit()
+
+    # 宿管扫码时楼栋已知；管理员扫码再按被访学生查一次楼栋
+    # （SQLite 的 RETURNING 列不带表名，无法在同一条语句中用关联子查询返回楼栋）
+    if building is None and row.student_id is not None:
+        building = db.session.execute(
+            select(Dormitory.building).join(Student, Student.dorm_id == Dormitory.id).where(Student.id == row.student_id)
+        ).scalar()
+
+    # 绕过了会话事件，手动更新本楼栋在访人数并推送给宿管页面
+    if building:
+        cache.incr_counters(building_key(building), {'current_visitors': 1 if target == 'in' else -1})
+        publish_change(building, 'visitor', visitor_event_data(row))
+    return dict(visitor_event_data(row), building=building)
+
+def _scan_failure(visitor_id, registered, target, building):
+    # 只在扫码失败时多查一次，区分记录不存在（含令牌不是为这次登记签发的）和重复扫码
+    visitor_building = _visitor_building()
+    current = db.session.execute(
+        select(Visitor.status, visitor_building.label('building')).where(
+            Visitor.id == visitor_id,
+            Visitor.visit_date >= registered,
+            Visitor.visit_date < registered + timedelta(seconds=1)
+        )
+    ).first()
+    if current is None or (building is not None and current.building != building):
+        return ScanError('访客记录不存在！', 404)
+    message = '访客已在访！' if target == 'in' else '访客已离开！'
+    return ScanError(message, 409, current.status)
+
+# 批量离开“登记超过 N 小时”的上限（一年）
+MAX_CHECKOUT_AGE_HOURS = 24 * 366
+
+def checkout_cutoff(older_than):
+    """
+    把表单中的“登记超过 N 小时”转换为登记时间上限；留空返回 None（不限），
+    不是 0 到 MAX_CHECKOUT_AGE_HOURS 之间的整数时抛出 ValueError
+    """
+    older_than = (older_than or '').strip()
+    if not older_than:
+        return None
+    try:
+        hours = int(older_than)
+    except ValueError:
+        hours = -1
+    if not 0 <= hours <= MAX_CHECKOUT_AGE_HOURS:
+        raise ValueError(f'登记时长须为 0 到 {MAX_CHECKOUT_AGE_HOURS} 之间的整数（小时）！')
+    return datetime.now() - timedelta(hours=hours)
+
+class CheckoutReport:
+    """
+    批量离开结果：counts 为各楼栋标记离开的人数（被访学生未分配宿舍的只计入 total）
+    """
+    def __init__(self):
+        self.total = 0
+        self.counts = Counter()
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'buildings': dict(self.counts),
+            'elapsed_ms': round(self.elapsed * 1000, 2),
+        }
+
+def bulk_checkout(building=None, dorm_number=None, before=None):
+    """
+    把符合条件的在访访客一次性标记为离开：一条 UPDATE ... WHERE status = 'in' [AND 楼栋/宿舍号/登记时间早于 before]
+
+    条件为 None 时不按该项筛选；返回 CheckoutReport
+    """
+    started = time.perf_counter()
+    report = CheckoutReport()
+    statement = update(Visitor).where(Visitor.status == 'in', Visitor.is_deleted == False)
+    if building is not None:
+        statement = statement.where(_visitor_building() == building)
+    if dorm_number:
+        statement = statement.where(Visitor.dorm_number == dorm_number)
+    if before is not None:
+        statement = statement.where(Visitor.visit_date < before)
+    student_ids = db.session.execute(
+        statement.values(status='out', leave_date=datetime.now()).returning(Visitor.student_id),
+        execution_options={'synchronize_session': False}
+    ).scalars().all()
+    db.session.commit()
+    report.total = len(student_ids)
+
+    # 按楼栋汇总：已知楼栋时直接计数，否则按被访学生查一次楼栋（含已软删除的学生）
+    if building is not None:
+        if report.total:
+            report.counts[building] = report.total
+    else:
+        per_student = Counter(student_id for student_id in student_ids if student_id is not None)
+        if per_student:
+            rows = db.session.execute(
+                select(Student.id, Dormitory.building).join(Dormitory, Student.dorm_id == Dormitory.id)
+                .where(Student.id.in_(per_student)),
+                execution_options={'include_deleted': True}
+            )
+            for student_id, student_building in rows:
+                report.counts[student_building] += per_student[student_id]
+
+    # 绕过了会话事件，手动更新各楼栋在访人数并通知宿管页面刷新
+    for student_building, count in report.counts.items():
+        cache.incr_counters(building_key(student_building), {'current_visitors': -count})
+        publish_change(student_building, 'visitor', {'count': count}, action='checked_out')
+    report.elapsed = time.perf_counter() - started
+    return report
+
+@job_handler('visitor_checkout_sweep')
+def visitor_checkout_sweep_job(context, hours=None):
+    hours = current_app.config['VISITOR_SWEEP_MIN_AGE_HOURS'] if hours is None else hours
+    context.progress(0, None, f'正在把登记超过 {hours} 小时仍在访的访客标记为离开')
+    report = bulk_checkout(before=datetime.now() - timedelta(hours=hours))
+    context.progress(report.total, report.total, f'标记离开 {report.total} 名访客')
+    return report.to_dict()
+
+scheduler.daily('visitor_checkout_sweep', 'VISITOR_SWEEP_TIME')
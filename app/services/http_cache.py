@@ -0,0 +1,104 @@
+import gzip
+from functools import wraps
+from flask import request, current_app, make_response
+
+# 值得压缩的文本类型（图片、压缩包等已经是压缩格式）
+# 不压缩 text/html：页面同时包含 CSRF 令牌和回显的查询参数（如 ?q=），压缩后的长度会泄露令牌（BREACH 攻击）
+COMPRESSIBLE_MIMETYPES = {
+    'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'image/svg+xml',
+}
+
+def _brotli():
+    # brotli 为可选依赖，未安装时只使用 gzip
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+def cache_policy(max_age, private=False):
+    """
+    视图装饰器：为变化缓慢的数据（楼栋、宿舍列表等）设置明确的 Cache-Control
+
+    max_age 可以是秒数或配置项名称；按用户返回不同内容的接口须设置 private=True
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                seconds = current_app.config[max_age] if isinstance(max_age, str) else max_age
+                response.cache_control.max_age = seconds
+                if private:
+                    response.cache_control.private = True
+                else:
+                    response.cache_control.public = True
+            return response
+        return wrapper
+    return decorator
+
+class ResponseOptimizer:
+    """
+    响应层：GET 接口返回的 JSON 加弱 ETag 并支持 If-None-Match 返回 304；
+    JSON 和静态文本响应超过 COMPRESS_MIN_SIZE 字节时按 Accept-Encoding 使用 brotli 或 gzip 压缩（HTML 页面不压缩）
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['response_optimizer'] = self
+        app.after_request(self.process_response)
+
+    def process_response(self, response):
+        if response.direct_passthrough or response.is_streamed:
+            return response  # 静态文件和流式响应（如 SSE）原样返回
+        if request.method in ('GET', 'HEAD'):
+            self.add_etag(response)
+            if response.status_code == 304:
+                return response
+        self.compress(response)
+        return response
+
+    def add_etag(self, response):
+        if response.status_code != 200 or response.mimetype != 'application/json':
+            return
+        if not response.get_etag()[0]:
+            # 弱 ETag：gzip/brotli/未压缩 三种表示共用同一个 ETag
+            response.add_etag(weak=True)
+        if not response.cache_control.max_age and not response.cache_control.no_store:
+            # 接口数据按用户区分，浏览器可缓存但每次须带 ETag 回源验证
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        response.make_conditional(request)
+
+    def compress(self, response):
+        config = current_app.config
+        if not config.get('COMPRESS_ENABLED', True):
+            return
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return
+        if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return
+
+        data = response.get_data()
+        response.vary.add('Accept-Encoding')
+        if len(data) < config.get('COMPRESS_MIN_SIZE', 500):
+            return
+
+        accepted = request.accept_encodings
+        brotli = _brotli() if accepted['br'] else None
+        if brotli is not None:
+            body, encoding = brotli.compress(data, quality=config.get('COMPRESS_BROTLI_QUALITY', 5)), 'br'
+        elif accepted['gzip']:
+            body, encoding = gzip.compress(data, compresslevel=config.get('COMPRESS_LEVEL', 6), mtime=0), 'gzip'
+        else:
+            return
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)  # 压缩后字节不同，强 ETag 改为弱 ETag
+
+response_optimizer = ResponseOptimizer()
@@ -0,0 +1,100 @@
+import pickle
+from functools import lru_cache
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import db, cache
+from app.models.models import User, Student, DormManager
+
+IDENTITY_PREFIX = 'identity:user:'
+
+def identity_key(user_id):
+    return f'{IDENTITY_PREFIX}{user_id}'
+
+def _ttl():
+    return current_app.config.get('IDENTITY_CACHE_TTL', 30)
+
+def load_user(user_id):
+    """
+    Flask-Login 的 user_loader：一次查询同时加载用户及其学生/宿管资料，结果按用户ID短时缓存
+
+    Flask-Login 在同一请求内只调用一次，视图中通过 current_user.student / current_user.dorm_manager
+    直接取得资料，不再单独查询
+    """
+    user_id = int(user_id)
+    ttl = _ttl()
+    if ttl:
+        cached = cache.get(identity_key(user_id))
+        if cached is not None:
+            # load=False 直接把缓存的状态放入当前会话，不访问数据库
+            return db.session.merge(cached, load=False)
+
+    user = User.query.options(
+        joinedload(User.student),
+        joinedload(User.dorm_manager),
+    ).filter(User.id == user_id).first()
+    if user is not None and ttl:
+        # 缓存与会话脱离的副本，避免请求中对 user 的修改影响缓存
+        cache.set(identity_key(user_id), pickle.loads(pickle.dumps(user)), ttl)
+    return user
+
+def current_student():
+    return current_user.student if current_user.is_authenticated else None
+
+def current_dorm_manager():
+    return current_user.dorm_manager if current_user.is_authenticated else None
+
+def invalidate_identity(user_id=None):
+    """
+    使身份缓存失效；用于绕过 ORM 修改用户/学生/宿管资料之后。user_id 为空时清除所有用户
+    """
+    if user_id is None:
+        cache.delete_prefix(IDENTITY_PREFIX)
+    else:
+        cache.delete(identity_key(user_id))
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_identity_changes(session, flush_context):
+    changed = session.info.setdefault('identity_changed', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+        elif isinstance(obj, (Student, DormManager)):
+            changed.add(obj.user_id)
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_identity_changes(session):
+    for user_id in session.info.pop('identity_changed', ()):
+        if user_id is not None:
+            invalidate_identity(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_identity_changes(session):
+    session.info.pop('identity_changed', None)
+
+def hash_password(password, method=None):
+    """
+    按 PASSWORD_HASH_METHOD 配置的算法和成本计算密码哈希（在线程池中调用时需显式传入 method）
+    """
+    return generate_password_hash(password, method=method or current_app.config['PASSWORD_HASH_METHOD'])
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # 'scrypt' 等简写会被展开为 'scrypt:32768:8:1'，以实际生成的哈希前缀为准
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+def password_needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _method_prefix(current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(user, password):
+    """
+    校验登录密码；旧哈希的算法或成本与当前配置不一致时，用本次明文透明地重新哈希并提交
+    """
+    if user is None or not check_password_hash(user.password, password):
+        return False
+    if password_needs_rehash(user.password):
+        user.password = hash_password(password)
+        db.session.commit()
+    return True
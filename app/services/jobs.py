@@ -0,0 +1,214 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from app import db, cache
+from app.models.models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# 任务名 -> 处理函数(context, **params)，由各服务模块通过 job_handler 注册
+JOB_HANDLERS = {}
+PROGRESS_PREFIX = 'job:progress:'
+PROGRESS_TTL = 3600
+
+def job_handler(name):
+    """
+    注册后台任务处理函数。处理函数的返回值（可JSON序列化）保存为任务结果
+    """
+    def decorator(func):
+        JOB_HANDLERS[name] = func
+        return func
+    return decorator
+
+class JobContext:
+    """
+    传给任务处理函数的上下文，用于上报进度
+
+    进度写入共享缓存而不是任务表，避免和任务自身的长事务争用数据库锁（SQLite）
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.done = 0
+        self.total = None
+        self.message = None
+
+    def progress(self, done, total=None, message=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        cache.set(PROGRESS_PREFIX + str(self.job_id),
+                  {'progress': self.done, 'total': self.total, 'message': self.message}, PROGRESS_TTL)
+
+class JobRunner:
+    """
+    进程内后台任务执行器：任务记录保存在 background_jobs 表，在线程池中执行
+
+    JOB_WORKERS 为 0 时在当前线程同步执行（便于测试和命令行脚本）
+    """
+    def __init__(self, app=None):
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config.get('JOB_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job') if workers > 0 else None
+        app.extensions['jobs'] = self
+
+    def submit(self, name, params=None, created_by=None):
+        if name not in JOB_HANDLERS:
+            raise ValueError(f'未知的任务类型：{name}')
+        job = BackgroundJob(name=name, params=json.dumps(params or {}, ensure_ascii=False), created_by=created_by)
+        db.session.add(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        if self._executor is None:
+            self._run(app, job.id)
+            db.session.refresh(job)
+        else:
+            self._executor.submit(self._run, app, job.id)
+        return job
+
+    def _run(self, app, job_id):
+        # 新的应用上下文拥有独立的数据库会话
+        with app.app_context():
+            job = db.session.get(BackgroundJob, job_id)
+            job.status = 'running'
+            job.started_at = datetime.now()
+            db.session.commit()
+
+            context = JobContext(job_id)
+            handler = JOB_HANDLERS[job.name]
+            params = json.loads(job.params or '{}')
+            try:
+                result = handler(context, **params)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception('后台任务 %s(%s) 执行失败', job_id, handler.__name__)
+                job = db.session.get(BackgroundJob, job_id)
+                job.status = 'failed'
+                job.error = str(e) or e.__class__.__name__
+            else:
+                job = db.session.get(BackgroundJob, job_id)
+                job.status = 'succeeded'
+                job.result = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+
+            job.progress = context.done
+            job.total = context.total
+            job.message = context.message
+            job.finished_at = datetime.now()
+            db.session.commit()
+            cache.delete(PROGRESS_PREFIX + str(job_id))
+
+def job_to_dict(job):
+    """
+    任务状态（运行中的任务合并缓存中的实时进度）
+    """
+    data = {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S') if job.created_at else None,
+        'started_at': job.started_at.strftime('%Y-%m-%d %H:%M:%S') if job.started_at else None,
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None,
+    }
+    if job.status in ('pending', 'running'):
+        live = cache.get(PROGRESS_PREFIX + str(job.id))
+        if live:
+            data.update(live)
+    return data
+
+jobs = JobRunner()
+
+class JobScheduler:
+    """
+    周期任务：后台线程每 JOB_SCHEDULER_TICK 秒检查一次，距上次同名任务超过配置的间隔（或已过每天的执行时间）时提交任务
+
+    上次运行时间以 background_jobs 表中同名任务的创建时间为准，重启或多进程部署时不会按进程重复执行
+    （多个进程恰好同时到期时可能各提交一次，周期任务须可重复执行）。线程在第一个请求时启动
+    """
+    def __init__(self, app=None):
+        self.app = None
+        self.schedules = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['job_scheduler'] = self
+        if app.config.get('JOB_SCHEDULER_ENABLED', True):
+            app.before_request(self.start)
+
+    def every(self, name, interval_key, params=None):
+        """
+        注册周期任务，间隔（秒）取自配置项 interval_key，为 0 时不自动执行
+        """
+        self.schedules[name] = ('every', interval_key, params or {})
+
+    def daily(self, name, time_key, params=None):
+        """
+        注册每天执行一次的任务，执行时间（HH:MM）取自配置项 time_key，为空时不自动执行
+        """
+        self.schedules[name] = ('daily', time_key, params or {})
+
+    @staticmethod
+    def _is_due(kind, value, last, now):
+        if kind == 'every':
+            return last is None or now - last >= timedelta(seconds=value)
+        hour, minute = (int(part) for part in value.split(':'))
+        scheduled = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if now < scheduled:
+            if last is None:
+                return False  # 首次部署不补执行前一天的任务
+            scheduled -= timedelta(days=1)
+        return last is None or last < scheduled
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.app.config.get('JOB_SCHEDULER_TICK', 60))
+            try:
+                with self.app.app_context():
+                    self.run_due()
+            except Exception:
+                logger.exception('周期任务调度失败')
+
+    def run_due(self, now=None):
+        """
+        提交所有到期的周期任务，返回提交的任务列表
+        """
+        now = now or datetime.now()
+        submitted = []
+        for name, (kind, config_key, params) in self.schedules.items():
+            value = current_app.config.get(config_key) or 0
+            if not value or (kind == 'every' and value <= 0):
+                continue
+            last = db.session.query(func.max(BackgroundJob.created_at)).filter(BackgroundJob.name == name).scalar()
+            if not self._is_due(kind, value, last, now):
+                continue
+            submitted.append(jobs.submit(name, params))
+        return submitted
+
+scheduler = JobScheduler()
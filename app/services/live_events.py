@@ -0,0 +1,227 @@
+import itertools
+import json
+import threading
+from collections import deque
+from sqlalchemy import event
+from app import db, cache
+from app.models.models import Student, Repair, Visitor, DormChangeRequest
+from app.services.dashboard_counters import BuildingResolver, building_key
+
+# 宿管端实时推送：访客/报修/宿舍调换申请提交后，按楼栋把变更推送给打开页面的宿管（SSE）
+# 每条变更只在提交时序列化一次，再由进程内的 EventBroker 分发给该楼栋的所有连接，连接本身不查询数据库。
+# 配置 CACHE_REDIS_URL 时通过 Redis 发布/订阅在多个 worker 之间转发，每个 worker 只保持一个订阅连接
+
+class Subscription:
+    """
+    一个 SSE 连接的待发送消息队列；积压超过 maxlen 条时标记为 lagged，连接应通知页面刷新
+    """
+    def __init__(self, channel, maxlen):
+        self.channel = channel
+        self.lagged = False
+        self._maxlen = maxlen
+        self._messages = deque()
+        self._condition = threading.Condition()
+
+    def put(self, message):
+        with self._condition:
+            if len(self._messages) >= self._maxlen:
+                self.lagged = True
+                self._messages.clear()
+            else:
+                self._messages.append(message)
+            self._condition.notify()
+
+    def get(self, timeout):
+        """
+        等待新消息，返回期间积压的全部消息；超时返回空列表，积压溢出返回 None
+        """
+        with self._condition:
+            if not self._messages and not self.lagged:
+                self._condition.wait(timeout)
+            if self.lagged:
+                return None
+            messages = list(self._messages)
+            self._messages.clear()
+            return messages
+
+class RedisRelay:
+    """
+    通过 Redis 发布/订阅在 worker 之间转发事件，需要安装 redis 包
+    """
+    def __init__(self, url, prefix, deliver):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._pattern = f'{prefix}events:'
+        self._deliver = deliver
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        self._client.publish(self._pattern + channel, message)
+
+    def start(self):
+        # 第一个连接订阅时才启动监听线程
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='live-events-relay', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self._pattern + '*')
+        for item in pubsub.listen():
+            channel = item['channel'].decode()[len(self._pattern):]
+            self._deliver(channel, item['data'].decode())
+
+class EventBroker:
+    """
+    进程内的发布/订阅：按频道（楼栋）保存订阅者，发布时把同一条已格式化的 SSE 消息放入每个订阅者的队列
+    """
+    def __init__(self, app=None):
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._relay = None
+        self.max_clients = 500
+        self.queue_size = 100
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_clients = app.config.get('SSE_MAX_CLIENTS', 500)
+        self.queue_size = app.config.get('SSE_QUEUE_SIZE', 100)
+        redis_url = app.config.get('CACHE_REDIS_URL')
+        if redis_url:
+            self._relay = RedisRelay(redis_url, app.config.get('CACHE_KEY_PREFIX', 'dormitory:'), self._deliver)
+        else:
+            self._relay = None
+        app.extensions['live_events'] = self
+
+    @property
+    def client_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._channels.values())
+
+    def subscribe(self, channel):
+        """
+        订阅频道；本进程连接数已达 SSE_MAX_CLIENTS 时返回 None
+        """
+        with self._lock:
+            if sum(len(subscriptions) for subscriptions in self._channels.values()) >= self.max_clients:
+                return None
+            subscription = Subscription(channel, self.queue_size)
+            self._channels.setdefault(channel, set()).add(subscription)
+        if self._relay:
+            self._relay.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event_type, data):
+        """
+        向频道发布一条事件（data 须可 JSON 序列化）
+        """
+        message = f'id: {next(self._ids)}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+        if self._relay:
+            self._relay.publish(channel, message)
+        else:
+            self._deliver(channel, message)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+broker = EventBroker()
+
+# ---- 会话事件：提交后推送变更 ----
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+def _student_name(session, student_id):
+    if student_id is None:
+        return None
+    student = session.get(Student, int(student_id), execution_options={'include_deleted': True})
+    return student.name if student else None
+
+def visitor_event_data(visitor):
+    """
+    访客事件内容；visitor 可以是 Visitor 对象或含相同字段的查询结果行
+    """
+    return {
+        'id': visitor.id, 'name': visitor.name, 'dorm_number': visitor.dorm_number, 'student_name': visitor.student_name,
+        'status': visitor.status, 'visit_date': _format_time(visitor.visit_date), 'leave_date': _format_time(visitor.leave_date),
+    }
+
+def _visitor_event(obj, session, resolver):
+    return 'visitor', visitor_event_data(obj), {resolver.student_building(obj.student_id)}
+
+def _repair_event(obj, session, resolver):
+    data = {
+        'id': obj.id, 'title': obj.title, 'status': obj.status, 'urgent_level': obj.urgent_level,
+        'student_name': _student_name(session, obj.student_id), 'created_at': _format_time(obj.created_at),
+    }
+    return 'repair', data, {resolver.dorm_building(obj.dorm_id)}
+
+def _dorm_change_event(obj, session, resolver):
+    data = {
+        'id': obj.id, 'status': obj.status, 'student_name': _student_name(session, obj.student_id),
+        'current_dorm_id': obj.current_dorm_id, 'target_dorm_id': obj.target_dorm_id,
+        'created_at': _format_time(obj.created_at),
+    }
+    # 调出和调入楼栋的宿管都能看到申请
+    return 'dorm_change', data, {resolver.dorm_building(obj.current_dorm_id), resolver.dorm_building(obj.target_dorm_id)}
+
+EVENT_BUILDERS = {
+    Visitor: _visitor_event,
+    Repair: _repair_event,
+    DormChangeRequest: _dorm_change_event,
+}
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_live_events(session, flush_context):
+    pending = session.info.setdefault('live_events', {})
+    resolver = BuildingResolver(session)
+    changes = [(obj, 'created') for obj in session.new] + [(obj, 'deleted') for obj in session.deleted]
+    changes += [(obj, 'updated') for obj in session.dirty if session.is_modified(obj)]
+    for obj, action in changes:
+        build = EVENT_BUILDERS.get(type(obj))
+        if build is None:
+            continue
+        if getattr(obj, 'is_deleted', False):
+            action = 'deleted'
+        event_type, data, buildings = build(obj, session, resolver)
+        data['action'] = action
+        # 同一事务内多次 flush 同一条记录时只推送最后的状态（新建后又修改仍算新建）
+        key = (event_type, data['id'])
+        if key in pending and pending[key][1]['action'] == 'created' and action == 'updated':
+            data['action'] = 'created'
+        pending[key] = (event_type, data, {building for building in buildings if building})
+
+def publish_change(building, event_type, data, action='updated'):
+    """
+    推送一条变更，附带本楼栋仪表板计数（只读缓存，未缓存时页面保留原值）；
+    用于绕过会话的批量 UPDATE 等，提交之后调用
+    """
+    broker.publish(building, event_type, dict(data, action=action, counters=cache.get_counters(building_key(building))))
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_live_events(session):
+    pending = session.info.pop('live_events', None)
+    if not pending:
+        return
+    for event_type, data, buildings in pending.values():
+        for building in buildings:
+            publish_change(building, event_type, data, data['action'])
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_live_events(session):
+    session.info.pop('live_events', None)
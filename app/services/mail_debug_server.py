@@ -0,0 +1,100 @@
+import argparse
+import socketserver
+import threading
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    最小的 SMTP 会话处理：接受任意登录和收件人，收到的邮件保存到 server.messages 并打印
+    """
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        self.reply('220 localhost debug SMTP')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'AUTH':
+                parts = command.split()
+                if len(parts) == 2 and parts[1].upper() == 'LOGIN':
+                    # AUTH LOGIN 需要依次读取用户名和密码
+                    self.reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self.reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                elif len(parts) == 2:
+                    self.reply('334 ')
+                    self.rfile.readline()
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(' <>'), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.deliver(sender, recipients, b''.join(lines))
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    本地调试用的 SMTP 替身（不加密），发件箱发送线程可直接连接它进行联调和测试
+
+        server = DebugSMTPServer(('127.0.0.1', 1025)); server.start()
+        ... MAIL_SERVER=127.0.0.1 MAIL_PORT=1025 MAIL_USE_SSL=False ...
+        server.messages  # [(发件人, [收件人], 原始邮件)]
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 1025), quiet=False):
+        super().__init__(address, _SMTPHandler)
+        self.messages = []
+        self.quiet = quiet
+        self._lock = threading.Lock()
+
+    def deliver(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append((sender, recipients, data))
+        if not self.quiet:
+            print(f'---------- MESSAGE FROM {sender} TO {", ".join(recipients)} ----------')
+            print(data.decode('utf-8', 'replace'))
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='debug-smtp', daemon=True)
+        thread.start()
+        return thread
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地调试 SMTP 服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+    print(f'Debug SMTP server listening on {args.host}:{args.port}')
+    DebugSMTPServer((args.host, args.port)).serve_forever()
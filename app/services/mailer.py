@@ -0,0 +1,244 @@
+import logging
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.header import Header
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from flask import current_app
+from sqlalchemy import event, update, delete, or_, and_
+from app import db
+from app.models.models import OutboxEmail
+from app.services.jobs import job_handler, scheduler
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_RESET_SUBJECT = '密码重置通知 - 宿舍管理系统'
+PASSWORD_RESET_BODY = """
+        亲爱的用户，
+
+        您的密码重置申请已通过审批。
+        您的新密码是：{new_password}
+
+        请尽快登录系统并修改密码。
+
+        宿舍管理系统
+        """
+
+def enqueue_email(to_email, subject, body):
+    """
+    把邮件写入发件箱（随调用方的事务一起提交），提交后唤醒后台发送线程
+    """
+    email = OutboxEmail(to_email=to_email, subject=subject, body=body)
+    db.session.add(email)
+    return email
+
+def enqueue_password_reset_email(to_email, new_password):
+    return enqueue_email(to_email, PASSWORD_RESET_SUBJECT, PASSWORD_RESET_BODY.format(new_password=new_password))
+
+class SMTPTransport:
+    """
+    一次连接、登录后发送一批邮件
+    """
+    def __init__(self, config):
+        self.config = config
+        self.sender = config['MAIL_DEFAULT_SENDER']
+        self.smtp = None
+
+    def __enter__(self):
+        if self.config['MAIL_USE_SSL']:
+            self.smtp = smtplib.SMTP_SSL(self.config['MAIL_SERVER'], self.config['MAIL_PORT'], timeout=self.config['MAIL_TIMEOUT'])
+        else:
+            self.smtp = smtplib.SMTP(self.config['MAIL_SERVER'], self.config['MAIL_PORT'], timeout=self.config['MAIL_TIMEOUT'])
+        if self.config['MAIL_USERNAME']:
+            self.smtp.login(self.config['MAIL_USERNAME'], self.config['MAIL_PASSWORD'])
+        return self
+
+    def send(self, to_email, subject, body):
+        message = MIMEText(body, 'plain', 'utf-8')
+        # 正确设置发件人格式： 显示名称 <邮箱地址>
+        message['From'] = formataddr((str(Header("宿舍管理系统", 'utf-8')), self.sender))
+        message['To'] = Header("用户", 'utf-8')
+        message['Subject'] = Header(subject, 'utf-8')
+        self.smtp.sendmail(self.sender, [to_email], message.as_string())
+
+    def __exit__(self, *exc_info):
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+class ConsoleTransport:
+    """
+    未配置真实邮箱时把邮件打印到控制台
+    """
+    def __init__(self, config):
+        self.config = config
+
+    def __enter__(self):
+        return self
+
+    def send(self, to_email, subject, body):
+        print(f"\n========== MOCK EMAIL (未配置真实邮箱) ==========")
+        print(f"To: {to_email}")
+        print(f"Subject: {subject}")
+        print(body)
+        print(f"================================================\n")
+
+    def __exit__(self, *exc_info):
+        pass
+
+class Mailer:
+    """
+    发件箱后台发送线程：每批复用一个已登录的 SMTP 连接，失败按指数退避重试
+
+    线程在第一个请求时启动；MAIL_QUEUE_THREAD 为 False 时不启动线程，需要手动调用 process_outbox()
+    """
+    def __init__(self, app=None):
+        self.app = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['mailer'] = self
+        if app.config.get('MAIL_QUEUE_THREAD', True):
+            app.before_request(self.start)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='mailer', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._event.set()
+
+    def _loop(self):
+        while True:
+            self._event.wait(self.app.config['MAIL_POLL_INTERVAL'])
+            self._event.clear()
+            try:
+                with self.app.app_context():
+                    while self.process_outbox():
+                        pass
+            except Exception:
+                logger.exception('发件箱处理失败')
+
+    def _transport(self):
+        config = self.app.config
+        if config.get('MAIL_BACKEND') == 'console' or config['MAIL_USERNAME'] == 'your_email@163.com':
+            return ConsoleTransport(config)
+        return SMTPTransport(config)
+
+    def _claim(self, now):
+        """
+        领取一批到期的邮件并标记为 sending（带租约，发送进程崩溃后到期可被重新领取）
+        """
+        config = self.app.config
+        due = or_(OutboxEmail.status == 'pending', OutboxEmail.status == 'sending')
+        ids = [row[0] for row in db.session.query(OutboxEmail.id).filter(
+            due, OutboxEmail.next_attempt_at <= now
+        ).order_by(OutboxEmail.next_attempt_at).limit(config['MAIL_BATCH_SIZE'])]
+        if not ids:
+            return []
+        lease = now + timedelta(seconds=config['MAIL_SEND_LEASE'])
+        db.session.execute(
+            update(OutboxEmail).where(OutboxEmail.id.in_(ids), due, OutboxEmail.next_attempt_at <= now)
+            .values(status='sending', next_attempt_at=lease)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return OutboxEmail.query.filter(
+            OutboxEmail.id.in_(ids), and_(OutboxEmail.status == 'sending', OutboxEmail.next_attempt_at == lease)
+        ).all()
+
+    def _retry_later(self, email, error, now):
+        config = self.app.config
+        email.attempts = (email.attempts or 0) + 1
+        email.last_error = str(error)[:500]
+        if email.attempts >= config['MAIL_MAX_ATTEMPTS']:
+            email.status = 'failed'
+            email.body = ''
+            logger.error('邮件 %s 发送失败，已放弃: %s', email.id, error)
+        else:
+            delay = min(config['MAIL_RETRY_BACKOFF'] * 2 ** (email.attempts - 1), config['MAIL_RETRY_BACKOFF_MAX'])
+            email.status = 'pending'
+            email.next_attempt_at = now + timedelta(seconds=delay)
+
+    def process_outbox(self):
+        """
+        发送一批到期的邮件，返回本批处理的数量
+        """
+        now = datetime.now()
+        emails = self._claim(now)
+        if not emails:
+            return 0
+        try:
+            with self._transport() as transport:
+                for email in emails:
+                    try:
+                        transport.send(email.to_email, email.subject, email.body)
+                    except (smtplib.SMTPException, OSError) as e:
+                        self._retry_later(email, e, now)
+                    else:
+                        # 正文含新密码，发送后不再保留
+                        email.status = 'sent'
+                        email.body = ''
+                        email.attempts = (email.attempts or 0) + 1
+                        email.sent_at = datetime.now()
+        except (smtplib.SMTPException, OSError) as e:
+            # 连接或登录失败，本批未发送的邮件全部稍后重试
+            for email in emails:
+                if email.status == 'sending':
+                    self._retry_later(email, e, now)
+        db.session.commit()
+        return len(emails)
+
+mailer = Mailer()
+
+def purge_outbox(days=None):
+    """
+    删除已发送或已放弃超过 days 天的发件箱记录，并清空其余已结束记录的正文，返回删除的行数
+    """
+    days = current_app.config['MAIL_OUTBOX_RETENTION_DAYS'] if days is None else days
+    finished = OutboxEmail.status.in_(('sent', 'failed'))
+    cutoff = datetime.now() - timedelta(days=days)
+    deleted = db.session.execute(
+        delete(OutboxEmail).where(finished, OutboxEmail.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.execute(
+        update(OutboxEmail).where(finished, OutboxEmail.body != '').values(body='')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return deleted
+
+@job_handler('purge_outbox')
+def purge_outbox_job(context, days=None):
+    context.progress(0, None, '正在清理已结束的发件箱记录')
+    deleted = purge_outbox(days)
+    context.progress(deleted, deleted, f'删除 {deleted} 条发件箱记录')
+    return {'deleted': deleted}
+
+scheduler.every('purge_outbox', 'MAIL_OUTBOX_PURGE_INTERVAL')
+
+@event.listens_for(db.session, 'after_flush')
+def _note_outbox_email(session, flush_context):
+    if any(isinstance(obj, OutboxEmail) for obj in session.new):
+        session.info['outbox_pending'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_mailer(session):
+    if session.info.pop('outbox_pending', False):
+        mailer.wake()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_outbox_flag(session):
+    session.info.pop('outbox_pending', None)
@@ -0,0 +1,149 @@
+import time
+from collections import Counter
+from sqlalchemy import update, bindparam, case, func
+from app import db
+from app.models.models import Student, Dormitory, DormChangeRequest
+from app.services.jobs import job_handler
+from app.services.reference_data import mark_reference_data_changed, invalidate_reference_data
+
+class DormFullError(ValueError):
+    def __init__(self, dorm_id):
+        super().__init__('该宿舍已满员！')
+        self.dorm_id = dorm_id
+
+def _occupancy():
+    return func.coalesce(Dormitory.current_occupancy, 0)
+
+def occupy(dorm_id, count=1):
+    """
+    原子地占用床位：UPDATE ... WHERE 入住人数 + count <= 容量，床位不足时抛出 DormFullError
+
+    在调用方的事务中执行（PostgreSQL 上同时锁定该宿舍行直到提交），失败时由调用方回滚
+    """
+    if not dorm_id or count <= 0:
+        return
+    result = db.session.execute(
+        update(Dormitory)
+        .where(Dormitory.id == dorm_id, _occupancy() + count <= Dormitory.capacity)
+        .values(current_occupancy=_occupancy() + count)
+        .execution_options(synchronize_session='fetch')
+    )
+    if result.rowcount != 1:
+        raise DormFullError(dorm_id)
+    mark_reference_data_changed(db.session)
+
+def vacate(dorm_id, count=1):
+    """
+    原子地释放床位，入住人数不会减到 0 以下
+    """
+    if not dorm_id or count <= 0:
+        return
+    db.session.execute(
+        update(Dormitory)
+        .where(Dormitory.id == dorm_id)
+        .values(current_occupancy=case((_occupancy() > count, _occupancy() - count), else_=0))
+        .execution_options(synchronize_session='fetch')
+    )
+    mark_reference_data_changed(db.session)
+
+def apply_occupancy_changes(deltas):
+    """
+    按宿舍ID升序执行一组 {宿舍ID: 变化人数}，固定加锁顺序避免并发事务互相死锁
+
+    任一宿舍床位不足时抛出 DormFullError
+    """
+    for dorm_id in sorted(dorm_id for dorm_id in deltas if dorm_id):
+        delta = deltas[dorm_id]
+        if delta > 0:
+            occupy(dorm_id, delta)
+        elif delta < 0:
+            vacate(dorm_id, -delta)
+
+def move_student(student, dorm_id):
+    """
+    把学生调到 dorm_id（None 表示退宿），同时调整新旧宿舍的入住人数；不提交事务
+    """
+    dorm_id = int(dorm_id) if dorm_id else None
+    if dorm_id == student.dorm_id:
+        return
+    if not student.is_deleted:
+        deltas = Counter()
+        deltas[student.dorm_id] -= 1
+        deltas[dorm_id] += 1
+        apply_occupancy_changes(deltas)
+    student.dorm_id = dorm_id
+
+def lock_dorm_change_request(request_id):
+    """
+    加锁读取调宿申请（PostgreSQL 上为 SELECT ... FOR UPDATE），防止两个宿管同时审批同一申请
+    """
+    return DormChangeRequest.query.filter_by(id=request_id).with_for_update().first()
+
+class ReconcileReport:
+    """
+    入住人数校正结果：drift 为 [(宿舍ID, 宿舍号, 记录的人数, 实际人数)]，over_capacity 为实际超员的宿舍
+    """
+    def __init__(self):
+        self.checked = 0
+        self.drift = []
+        self.over_capacity = []
+        self.fixed = False
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'checked': self.checked,
+            'drifted': len(self.drift),
+            'fixed': self.fixed,
+            'drift': [{'dorm_id': dorm_id, 'dorm_number': number, 'recorded': recorded, 'actual': actual}
+                      for dorm_id, number, recorded, actual in self.drift[:100]],
+            'over_capacity': self.over_capacity[:100],
+            'elapsed_ms': round(self.elapsed * 1000, 2),
+        }
+
+def reconcile_occupancy(fix=True):
+    """
+    用一次 GROUP BY 统计每个宿舍实际入住的（未删除）学生数，与 current_occupancy 比较并报告偏差
+
+    fix=True 时在一个事务中批量修正有偏差的宿舍
+    """
+    report = ReconcileReport()
+    started = time.perf_counter()
+    actual = dict(db.session.query(Student.dorm_id, func.count(Student.id)).filter(
+        Student.dorm_id.isnot(None), Student.is_deleted == False
+    ).group_by(Student.dorm_id).all())
+    dorms = db.session.query(Dormitory.id, Dormitory.dorm_number, Dormitory.current_occupancy, Dormitory.capacity).all()
+
+    report.checked = len(dorms)
+    for dorm_id, dorm_number, recorded, capacity in dorms:
+        count = actual.get(dorm_id, 0)
+        if (recorded or 0) != count or recorded is None:
+            report.drift.append((dorm_id, dorm_number, recorded, count))
+        if count > capacity:
+            report.over_capacity.append(dorm_number)
+
+    if fix and report.drift:
+        dormitories = Dormitory.__table__
+        try:
+            db.session.connection().execute(
+                update(dormitories).where(dormitories.c.id == bindparam('dorm_id')).values(current_occupancy=bindparam('actual')),
+                [{'dorm_id': dorm_id, 'actual': count} for dorm_id, _, _, count in report.drift]
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.expire_all()
+        # 批量更新不经过会话事件，需要手动失效宿舍下拉框缓存
+        invalidate_reference_data()
+        report.fixed = True
+    report.elapsed = time.perf_counter() - started
+    return report
+
+@job_handler('reconcile_occupancy')
+def reconcile_occupancy_job(context, fix=True):
+    context.progress(0, 1, '正在统计各宿舍实际入住人数')
+    report = reconcile_occupancy(fix=fix)
+    context.progress(1, 1, f'检查 {report.checked} 间宿舍，{len(report.drift)} 间入住人数有偏差'
+                           + ('，已修正' if report.fixed else ''))
+    return report.to_dict()
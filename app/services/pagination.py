@@ -0,0 +1,203 @@
+import base64
+import json
+import math
+from datetime import datetime
+from sqlalchemy import and_, or_, DateTime
+from sqlalchemy.orm import QueryableAttribute
+from flask import request
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+class ListParams:
+    """
+    列表查询参数：页码/每页数量/排序列/排序方向/游标/筛选条件
+    """
+    def __init__(self, page=1, per_page=DEFAULT_PER_PAGE, sort=None, order='desc', cursor=None, filters=None):
+        self.page = page
+        self.per_page = per_page
+        self.sort = sort
+        self.order = order
+        self.cursor = cursor
+        self.filters = filters or {}
+
+    @classmethod
+    def from_request(cls, filter_names=('status', 'building'), default_order='desc'):
+        args = request.args
+        page = args.get('page', 1, type=int) or 1
+        per_page = args.get('per_page', DEFAULT_PER_PAGE, type=int) or DEFAULT_PER_PAGE
+        order = args.get('order', default_order)
+        filters = {}
+        for name in filter_names:
+            value = args.get(name)
+            if value:
+                filters[name] = value
+        return cls(
+            page=max(page, 1),
+            per_page=min(max(per_page, 1), MAX_PER_PAGE),
+            sort=args.get('sort'),
+            order=order if order in ('asc', 'desc') else default_order,
+            cursor=args.get('cursor') or None,
+            filters=filters
+        )
+
+class Page:
+    """
+    分页结果。游标模式下不统计总数，只返回 next_cursor
+    """
+    def __init__(self, items, params, total=None, next_cursor=None, has_next=False):
+        self.items = items
+        self.params = params
+        self.page = params.page
+        self.per_page = params.per_page
+        self.sort = params.sort
+        self.order = params.order
+        self.filters = params.filters
+        self.total = total
+        self.next_cursor = next_cursor
+        self._has_next = has_next
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return max(math.ceil(self.total / self.per_page), 1)
+
+    @property
+    def has_prev(self):
+        return self.params.cursor is None and self.page > 1
+
+    @property
+    def has_next(self):
+        if self.total is None:
+            return self._has_next
+        return self.page < self.pages
+
+    def iter_pages(self, window=2):
+        """
+        返回页码列表，省略处用 None 表示
+        """
+        if self.pages is None:
+            return []
+        result = []
+        last = 0
+        for num in range(1, self.pages + 1):
+            if num <= 1 or num > self.pages - 1 or abs(num - self.page) <= window:
+                if last and num - last > 1:
+                    result.append(None)
+                result.append(num)
+                last = num
+        return result
+
+    def url_args(self, **overrides):
+        """
+        生成保留当前排序和筛选条件的URL参数
+        """
+        args = dict(self.filters)
+        args.update(per_page=self.per_page, order=self.order)
+        if self.sort:
+            args['sort'] = self.sort
+        args.update(overrides)
+        return {k: v for k, v in args.items() if v is not None}
+
+    def meta(self):
+        return {
+            'page': self.page,
+            'per_page': self.per_page,
+            'total': self.total,
+            'pages': self.pages,
+            'has_next': self.has_next,
+            'next_cursor': self.next_cursor,
+            'sort': self.sort,
+            'order': self.order,
+        }
+
+def _encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor, sort_column):
+    # 游标来自客户端，格式或取值不对时一律按没有游标处理
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        decoded = json.loads(raw)
+        if not isinstance(decoded, list):
+            return None
+        sort_value, row_id = decoded
+        if not isinstance(row_id, int) or isinstance(row_id, bool):
+            return None
+        if not isinstance(sort_value, (str, int, float, type(None))):
+            return None
+        if sort_value is not None and isinstance(sort_column.type, DateTime):
+            sort_value = datetime.fromisoformat(sort_value)
+    except (ValueError, TypeError):
+        return None
+    return sort_value, row_id
+
+def paginate(query, params, id_column, sort_columns, default_sort, filters=None, with_total=True):
+    """
+    对查询应用筛选、排序和分页
+
+    sort_columns: {排序名: 列}，列须属于查询的主模型且不为空；params.sort 不在其中时使用 default_sort
+    filters: {筛选名: 列 或 函数(query, value)}
+    传入 params.cursor 时使用 keyset 分页（按排序列+主键），否则使用页码分页
+    """
+    for name, value in params.filters.items():
+        target = (filters or {}).get(name)
+        if target is None:
+            continue
+        if isinstance(target, QueryableAttribute):
+            query = query.filter(target == value)
+        else:
+            query = target(query, value)
+
+    if params.sort not in sort_columns:
+        params.sort = default_sort
+    sort_column = sort_columns[params.sort]
+    descending = params.order == 'desc'
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    if params.cursor:
+        decoded = _decode_cursor(params.cursor, sort_column)
+        if decoded is not None:
+            sort_value, row_id = decoded
+            if descending:
+                query = query.filter(or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id)))
+            else:
+                query = query.filter(or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > row_id)))
+        items = query.limit(params.per_page + 1).all()
+        has_next = len(items) > params.per_page
+        items = items[:params.per_page]
+        next_cursor = None
+        if has_next and items:
+            last = items[-1]
+            next_cursor = _encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+        return Page(items, params, next_cursor=next_cursor, has_next=has_next)
+
+    total = query.order_by(None).count() if with_total else None
+    items = query.offset((params.page - 1) * params.per_page).limit(params.per_page + 1).all()
+    has_next = len(items) > params.per_page
+    items = items[:params.per_page]
+    next_cursor = None
+    if has_next and items:
+        last = items[-1]
+        next_cursor = _encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return Page(items, params, total=total, next_cursor=next_cursor, has_next=has_next)
+
+def building_filter(dorm_id_column, *joins):
+    """
+    生成按楼栋筛选的函数：先按 joins 依次连接，再通过 dorm_id_column 连接宿舍表
+    """
+    from app.models.models import Dormitory
+
+    def apply(query, building):
+        for target, onclause in joins:
+            query = query.join(target, onclause)
+        return query.join(Dormitory, dorm_id_column == Dormitory.id).filter(Dormitory.building == building)
+    return apply
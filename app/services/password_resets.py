@@ -0,0 +1,103 @@
+import logging
+import os
+import secrets
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models.models import PasswordResetRequest
+from app.services.identity import hash_password
+from app.services.mailer import enqueue_password_reset_email
+
+logger = logging.getLogger(__name__)
+
+def generate_reset_password(length=8):
+    # 生成8位随机密码
+    chars = string.ascii_letters + string.digits
+    return ''.join(secrets.choice(chars) for _ in range(length))
+
+def hash_passwords(passwords):
+    """
+    在线程池中并行计算密码哈希（hashlib 的 scrypt/pbkdf2 计算时会释放 GIL）
+    """
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS') or min(4, os.cpu_count() or 1)
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if workers <= 1 or len(passwords) <= 1:
+        return [hash_password(password, method) for password in passwords]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hash') as executor:
+        return list(executor.map(partial(hash_password, method=method), passwords))
+
+class BulkResetResult:
+    """
+    批量重置结果：approved 为 [(申请, 新密码, 是否发送邮件)]，timings 为各阶段耗时（毫秒）
+    """
+    def __init__(self):
+        self.approved = []
+        self.skipped = 0
+        self.timings = {}
+
+    @property
+    def per_request_ms(self):
+        if not self.approved:
+            return None
+        return round(self.timings.get('total', 0) / len(self.approved), 2)
+
+    def to_dict(self):
+        return {
+            'approved': [{'request_id': req.id, 'user_id': req.user_id, 'username': req.user.username,
+                          'new_password': password, 'email_queued': emailed}
+                         for req, password, emailed in self.approved],
+            'skipped': self.skipped,
+            'timings_ms': self.timings,
+            'per_request_ms': self.per_request_ms,
+        }
+
+def approve_reset_requests(request_ids, handled_by):
+    """
+    在一个事务中批量通过密码重置申请
+
+    已处理或不存在的申请计入 skipped；新密码并行哈希，邮件写入发件箱由后台线程批量发送
+    """
+    result = BulkResetResult()
+    started = time.perf_counter()
+
+    request_ids = {int(request_id) for request_id in request_ids}
+    reqs = PasswordResetRequest.query.options(joinedload(PasswordResetRequest.user)).filter(
+        PasswordResetRequest.id.in_(request_ids), PasswordResetRequest.status == 'pending'
+    ).order_by(PasswordResetRequest.id).all()
+    result.skipped = len(request_ids) - len(reqs)
+    loaded = time.perf_counter()
+
+    passwords = [generate_reset_password() for _ in reqs]
+    hashes = hash_passwords(passwords)
+    hashed = time.perf_counter()
+
+    now = datetime.now()
+    try:
+        for req, password, password_hash in zip(reqs, passwords, hashes):
+            req.user.password = password_hash
+            req.status = 'completed'
+            req.handled_at = now
+            req.handled_by = handled_by
+            if req.user.email:
+                enqueue_password_reset_email(req.user.email, password)
+            result.approved.append((req, password, bool(req.user.email)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finished = time.perf_counter()
+
+    result.timings = {
+        'query': round((loaded - started) * 1000, 2),
+        'hashing': round((hashed - loaded) * 1000, 2),
+        'write': round((finished - hashed) * 1000, 2),
+        'total': round((finished - started) * 1000, 2),
+    }
+    logger.info('批量通过 %d 个密码重置申请（跳过 %d 个），耗时 %s，平均每个 %s ms',
+                len(result.approved), result.skipped, result.timings, result.per_request_ms)
+    return result
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from flask import current_app, url_for
+from sqlalchemy import select
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app import db
+from app.models.models import Student
+from app.services.jobs import job_handler, jobs, scheduler
+from app.services.soft_delete import include_deleted, ARCHIVE_TABLES
+
+CHUNK_SIZE = 64 * 1024
+PHOTO_DIR = 'uploads/photos'  # 相对 static 目录
+# Pillow 识别出的格式 -> 扩展名（不信任上传文件名中的扩展名）
+ALLOWED_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+_ORIGINAL_RE = re.compile(r'^[0-9a-f]{64}\.(jpg|png|webp|gif)$')
+
+class PhotoError(ValueError):
+    pass
+
+def _static_path(relative_path):
+    return os.path.join(current_app.static_folder, relative_path)
+
+def variant_path(relative_path, variant):
+    """
+    缩略图路径：uploads/photos/ab/<哈希>.jpg -> uploads/photos/ab/<哈希>_thumb.webp
+    """
+    base, _ = os.path.splitext(relative_path)
+    return f'{base}_{variant}.webp'
+
+def save_photo(file):
+    """
+    把上传的照片分块写入磁盘并计算内容哈希，按哈希去重保存，返回相对 static 目录的路径
+
+    超过 PHOTO_MAX_BYTES 或不是有效图片时抛出 PhotoError
+    """
+    max_bytes = current_app.config['PHOTO_MAX_BYTES']
+    folder = _static_path(PHOTO_DIR)
+    os.makedirs(folder, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(suffix='.upload', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PhotoError(f'照片不能超过 {max_bytes // (1024 * 1024)} MB')
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise PhotoError('上传的文件为空')
+
+        try:
+            with Image.open(tmp_path) as image:
+                image_format = image.format
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+            raise PhotoError('请上传有效的图片文件')
+        if image_format not in ALLOWED_FORMATS:
+            raise PhotoError('仅支持 JPG、PNG、WEBP、GIF 格式的图片')
+
+        key = digest.hexdigest()
+        relative_path = f'{PHOTO_DIR}/{key[:2]}/{key}{ALLOWED_FORMATS[image_format]}'
+        final_path = _static_path(relative_path)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)  # 相同内容已存在，直接复用
+            # 刷新修改时间：复用者提交前，清理任务不会把它当作未使用的照片删除
+            os.utime(final_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return relative_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def make_variants(relative_path):
+    """
+    生成固定尺寸的 WebP 缩略图（已存在的跳过），返回生成的路径列表
+    """
+    created = []
+    with Image.open(_static_path(relative_path)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for variant, size in current_app.config['PHOTO_VARIANTS'].items():
+            path = variant_path(relative_path, variant)
+            target = _static_path(path)
+            if os.path.exists(target):
+                continue
+            thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            # 同一张照片可能有多个任务同时生成缩略图，临时文件名不能只按进程区分
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(target))
+            os.close(fd)
+            thumbnail.save(tmp_path, 'WEBP', quality=80, method=4)
+            os.replace(tmp_path, target)
+            created.append(path)
+    return created
+
+def delete_photo(relative_path):
+    """
+    删除不再被引用的照片原图及其缩略图（仅限去重目录下的文件）
+    """
+    if not relative_path or not relative_path.startswith(PHOTO_DIR + '/'):
+        return
+    paths = [relative_path] + [variant_path(relative_path, variant) for variant in current_app.config['PHOTO_VARIANTS']]
+    for path in paths:
+        try:
+            os.remove(_static_path(path))
+        except FileNotFoundError:
+            pass
+
+def photo_url(relative_path, variant=None, default=None):
+    """
+    模板中使用：返回指定尺寸缩略图的URL，缩略图尚未生成时回退到原图
+    """
+    if not relative_path:
+        return url_for('static', filename=default) if default else None
+    if variant:
+        path = variant_path(relative_path, variant)
+        if os.path.exists(_static_path(path)):
+            return url_for('static', filename=path)
+    return url_for('static', filename=relative_path)
+
+def replace_student_photo(student, file):
+    """
+    保存学生的新照片，并提交后台任务生成缩略图；换下的旧照片由 purge_unused_photos 任务清理
+    """
+    new_path = save_photo(file)
+    student.photo = new_path
+    db.session.commit()
+
+    if not all(os.path.exists(_static_path(variant_path(new_path, variant))) for variant in current_app.config['PHOTO_VARIANTS']):
+        jobs.submit('photo_variants', {'path': new_path}, created_by=student.user_id)
+    return new_path
+
+def purge_unused_photos(now=None):
+    """
+    删除没有任何学生（包括已软删除和已归档的学生）引用、且超过 PHOTO_PURGE_GRACE 秒未写入的照片及其缩略图，返回删除的照片数
+
+    不在换照片时立即删除：另一个学生可能正在上传相同内容的照片，save_photo 已复用该文件但尚未提交，
+    此时查不到引用。save_photo 复用时会刷新文件修改时间，宽限期内的文件一律跳过
+    """
+    folder = _static_path(PHOTO_DIR)
+    if not os.path.isdir(folder):
+        return 0
+    now = now or datetime.now()
+    expires = (now - timedelta(seconds=current_app.config['PHOTO_PURGE_GRACE'])).timestamp()
+    referenced = {photo for (photo,) in include_deleted(db.session.query(Student.photo)).filter(Student.photo != None).distinct()}
+    archive = ARCHIVE_TABLES[Student]
+    referenced.update(db.session.execute(select(archive.c.photo).where(archive.c.photo != None).distinct()).scalars())
+
+    removed = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith('.upload') or name.endswith('.tmp'):
+                # 中断的上传或缩略图生成留下的临时文件
+                try:
+                    if os.path.getmtime(path) < expires:
+                        os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not _ORIGINAL_RE.match(name):
+                continue
+            relative_path = f'{PHOTO_DIR}/{os.path.relpath(path, folder).replace(os.sep, "/")}'
+            try:
+                if relative_path in referenced or os.path.getmtime(path) >= expires:
+                    continue
+            except OSError:
+                continue
+            delete_photo(relative_path)
+            removed += 1
+    return removed
+
+@job_handler('purge_unused_photos')
+def purge_unused_photos_job(context):
+    context.progress(0, None, '正在清理未使用的照片')
+    removed = purge_unused_photos()
+    context.progress(removed, removed, f'删除 {removed} 张未使用的照片')
+    return {'removed': removed}
+
+scheduler.every('purge_unused_photos', 'PHOTO_PURGE_INTERVAL')
+
+@job_handler('photo_variants')
+def photo_variants_job(context, path):
+    created = make_variants(path)
+    context.progress(len(created), len(current_app.config['PHOTO_VARIANTS']), f'已生成 {len(created)} 张缩略图')
+    return {'path': path, 'variants': created}
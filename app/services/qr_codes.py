@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import hmac
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+import qrcode
+import qrcode.image.svg
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+TOKEN_VERSION = 'V1'
+_BASE36 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+class QRTokenError(ValueError):
+    pass
+
+def _base36(number):
+    digits = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        digits = _BASE36[remainder] + digits
+        if not number:
+            return digits
+
+def _sign(message):
+    secret = current_app.config.get('VISITOR_QR_SECRET') or current_app.config['SECRET_KEY']
+    key = hmac.new(secret.encode('utf-8'), b'visitor-qr', hashlib.sha256).digest()
+    digest = hmac.new(key, message.encode('ascii'), hashlib.sha256).digest()[:10]
+    return base64.b32encode(digest).decode('ascii')
+
+def visitor_qr_payload(visitor):
+    """
+    访客二维码内容：签名令牌 V1.<访客ID>.<登记时间戳>.<HMAC签名>，不含姓名和身份证号
+
+    数字为36进制大写、签名为 base32，整串只含大写字母、数字和点，二维码可使用字母数字模式（版本更小、扫码更快）
+    """
+    message = f'{TOKEN_VERSION}.{_base36(visitor.id)}.{_base36(int(visitor.visit_date.timestamp()))}'
+    return f'{message}.{_sign(message)}'
+
+def verify_visitor_token(token, now=None):
+    """
+    校验访客二维码令牌，返回 (访客ID, 登记时间)；签名错误或登记超过 VISITOR_QR_MAX_AGE_DAYS 天时抛出 QRTokenError
+    """
+    # 令牌来自请求（JSON 中可能是数字等非字符串），只接受 ASCII 字符串
+    if not isinstance(token, str) or not token.isascii():
+        raise QRTokenError('无效的二维码！')
+    parts = token.strip().upper().split('.')
+    if len(parts) != 4 or parts[0] != TOKEN_VERSION:
+        raise QRTokenError('无效的二维码！')
+    message = '.'.join(parts[:3])
+    if not hmac.compare_digest(_sign(message), parts[3]):
+        raise QRTokenError('无效的二维码！')
+    try:
+        visitor_id, timestamp = int(parts[1], 36), int(parts[2], 36)
+        visit_date = datetime.fromtimestamp(timestamp)
+    except (ValueError, OverflowError, OSError):
+        raise QRTokenError('无效的二维码！')
+    max_age = current_app.config['VISITOR_QR_MAX_AGE_DAYS']
+    if max_age and (now or datetime.now()) - visit_date > timedelta(days=max_age):
+        raise QRTokenError('二维码已过期！')
+    return visitor_id, visit_date
+
+def qr_etag(payload, fmt='png'):
+    """
+    以内容哈希作为缓存键和 ETag，内容相同的二维码只渲染一次
+    """
+    return hashlib.sha256(f'{fmt}:{payload}'.encode('utf-8')).hexdigest()
+
+def render_qr(payload, fmt='png'):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class QRCodeCache:
+    """
+    二维码缓存：进程内 LRU + 按内容哈希命名的磁盘文件（多个 worker 共享）
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key, fmt):
+        folder = current_app.config.get('QR_CACHE_DIR') or os.path.join(current_app.instance_path, 'qr_cache')
+        return os.path.join(folder, key[:2], f'{key}.{fmt}')
+
+    def _remember(self, key, data):
+        max_entries = current_app.config.get('QR_MEMORY_CACHE_SIZE', self.max_entries)
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, payload, fmt='png'):
+        """
+        返回 (二维码内容, ETag)，依次查找内存、磁盘，都未命中时渲染并写入缓存
+        """
+        key = qr_etag(payload, fmt)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data, key
+
+        path = self._disk_path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = render_qr(payload, fmt)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再改名，避免其他进程读到半个文件
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._remember(key, data)
+        return data, key
+
+qr_cache = QRCodeCache()
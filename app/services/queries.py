@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models.models import User, Student, Repair, Visitor, UtilityBill, Payment, DormChangeRequest, PasswordResetRequest
+
+# 列表页查询构造器：按模板实际访问的关系预加载，避免逐行触发懒加载（N+1）
+
+def student_list_query():
+    # 模板访问 student.user.email / student.dormitory.dorm_number
+    return Student.query.options(
+        joinedload(Student.user),
+        joinedload(Student.dormitory)
+    )
+
+def repair_list_query():
+    # 模板访问 repair.student.name / repair.dormitory.dorm_number
+    return Repair.query.options(
+        joinedload(Repair.student),
+        joinedload(Repair.dormitory)
+    )
+
+def visitor_list_query():
+    # 仪表板活动访问 visitor.student.name
+    return Visitor.query.options(
+        joinedload(Visitor.student)
+    )
+
+def utility_bill_list_query():
+    # 模板访问 bill.dormitory.dorm_number
+    return UtilityBill.query.options(
+        joinedload(UtilityBill.dormitory)
+    )
+
+def payment_list_query():
+    # 模板访问 payment.student / payment.utility_bill.dormitory
+    return Payment.query.options(
+        joinedload(Payment.student),
+        joinedload(Payment.utility_bill).joinedload(UtilityBill.dormitory)
+    )
+
+def dorm_change_request_list_query():
+    # 模板访问 request.student / request.current_dorm / request.target_dorm
+    return DormChangeRequest.query.options(
+        joinedload(DormChangeRequest.student),
+        joinedload(DormChangeRequest.current_dorm),
+        joinedload(DormChangeRequest.target_dorm)
+    )
+
+def password_reset_request_list_query():
+    # 模板访问 req.user 以及 req.user.student.dormitory
+    return PasswordResetRequest.query.options(
+        joinedload(PasswordResetRequest.user).joinedload(User.student).joinedload(Student.dormitory)
+    )
+
+class QueryCounter:
+    """
+    记录代码块内执行的SQL语句
+    """
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    统计代码块内发出的SQL语句数量，用于排查 N+1 查询
+
+        with count_queries() as counter:
+            client.get('/admin/repairs')
+        print(counter.count)
+    """
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._on_execute)
@@ -0,0 +1,89 @@
+import uuid
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event
+from app import db, cache
+from app.models.models import Dormitory
+
+VERSION_KEY = 'reference:version'
+DATA_PREFIX = 'reference:data:'
+
+# 下拉框使用的宿舍信息（可序列化，可放入 Redis）
+DormOption = namedtuple('DormOption', 'id dorm_number building floor gender capacity current_occupancy')
+
+def _ttl():
+    return current_app.config.get('REFERENCE_CACHE_TTL', 3600)
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(VERSION_KEY, version)
+    return version
+
+def invalidate_reference_data():
+    """
+    更换版本号使所有参考数据失效（旧版本的数据等待 TTL 过期）；用于绕过 ORM 修改宿舍表之后
+    """
+    cache.set(VERSION_KEY, uuid.uuid4().hex)
+
+def mark_reference_data_changed(session):
+    """
+    标记当前事务修改了宿舍数据（如 ORM 批量 UPDATE 不会触发 flush 事件），提交后失效缓存
+    """
+    session.info['reference_changed'] = True
+
+def _cached(name, build):
+    key = f'{DATA_PREFIX}{_version()}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, _ttl())
+    return value
+
+def get_buildings():
+    """
+    楼栋名称列表（登录/注册页、筛选下拉框、/api/buildings）
+    """
+    return _cached('buildings', lambda: [
+        building for (building,) in db.session.query(Dormitory.building).distinct().order_by(Dormitory.building)
+    ])
+
+def get_dorm_options():
+    """
+    所有宿舍，按楼栋和宿舍号排序（添加/编辑学生、水电费账单的宿舍下拉框）
+    """
+    return _cached('dorm_options', lambda: [
+        DormOption(*row) for row in db.session.query(
+            Dormitory.id, Dormitory.dorm_number, Dormitory.building, Dormitory.floor,
+            Dormitory.gender, Dormitory.capacity, Dormitory.current_occupancy
+        ).order_by(Dormitory.building, Dormitory.dorm_number)
+    ])
+
+def get_available_dorms(gender=None, exclude_dorm_id=None):
+    """
+    还有空床位的宿舍，可按性别筛选并排除指定宿舍（学生调宿申请的目标宿舍）
+    """
+    dorms = _cached('available_dorms', lambda: [
+        dorm for dorm in get_dorm_options() if (dorm.current_occupancy or 0) < dorm.capacity
+    ])
+    return [dorm for dorm in dorms
+            if (gender is None or dorm.gender == gender) and dorm.id != exclude_dorm_id]
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_dormitory_changes(session, flush_context):
+    if session.info.get('reference_changed'):
+        return
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Dormitory) and (obj in session.new or obj in session.deleted or session.is_modified(obj)):
+            session.info['reference_changed'] = True
+            return
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_dormitory_changes(session):
+    if session.info.pop('reference_changed', False):
+        invalidate_reference_data()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_dormitory_changes(session):
+    session.info.pop('reference_changed', None)
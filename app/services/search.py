@@ -0,0 +1,289 @@
+import re
+from collections import defaultdict
+from sqlalchemy import event, inspect, select, text, bindparam, or_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models.models import Student, Visitor, Repair
+from app.services.pagination import ListParams, Page
+
+# 全文搜索索引：SQLite 使用 FTS5 虚拟表，PostgreSQL 使用 tsvector + GIN 索引，表名都为 search_index
+#
+# 文本先在应用中切分为词元：连续的字母数字为一个词元，汉字逐字为一个词元，用空格连接后写入索引。
+# 查询时每个关键词作为短语匹配（相邻词元），最后一个字母数字词元按前缀匹配，
+# 因此"张三"可匹配"张三丰"，"2023"可匹配学号"2023001"，两种数据库的匹配规则一致
+
+INDEX_TABLE = 'search_index'
+CHUNK_SIZE = 500
+
+# 文档编号 = 记录ID * KIND_SLOTS + 类型编号，按编号即可定位/删除，不需要额外的类型列
+KIND_SLOTS = 4
+
+_TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]|[0-9a-z]+')
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+class SearchSource:
+    """
+    一类可搜索的记录：title_columns 为标题（排序权重高），body_columns 为其他可搜索字段
+    """
+    def __init__(self, kind, code, model, title_columns, body_columns):
+        self.kind = kind
+        self.code = code
+        self.model = model
+        self.title_columns = title_columns
+        self.body_columns = body_columns
+
+    @property
+    def columns(self):
+        return [getattr(self.model, name) for name in self.title_columns + self.body_columns]
+
+    def doc_id(self, ref_id):
+        return ref_id * KIND_SLOTS + self.code
+
+SOURCES = {source.kind: source for source in (
+    SearchSource('student', 1, Student, ['name'], ['student_id', 'major', 'phone']),
+    SearchSource('visitor', 2, Visitor, ['name'], ['id_card', 'dorm_number']),
+    SearchSource('repair', 3, Repair, ['title'], ['content']),
+)}
+SOURCES_BY_CODE = {source.code: source for source in SOURCES.values()}
+SOURCES_BY_MODEL = {source.model: source for source in SOURCES.values()}
+
+def tokenize(value):
+    return _TOKEN_RE.findall(str(value).lower()) if value else []
+
+def parse_query(q):
+    """
+    把搜索框输入拆成关键词，返回 [(词元列表, 最后一个词元是否前缀匹配)]
+    """
+    terms = []
+    for word in (q or '').split():
+        tokens = tokenize(word)
+        if tokens:
+            terms.append((tokens, not _CJK_RE.fullmatch(tokens[-1])))
+    return terms
+
+# ---- 两种数据库的差异 ----
+
+def _supported(conn):
+    return conn.dialect.name in ('sqlite', 'postgresql')
+
+_available = {}
+
+def index_available(conn):
+    """
+    当前数据库是否已建好搜索索引（未执行迁移的数据库回退为 LIKE 查询）
+    """
+    key = str(conn.engine.url)
+    if key not in _available:
+        _available[key] = _supported(conn) and inspect(conn).has_table(INDEX_TABLE)
+    return _available[key]
+
+def create_search_index(conn):
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "title, body, tokenize = 'unicode61 remove_diacritics 0', prefix = '2 3 4')"
+        )
+    elif conn.dialect.name == 'postgresql':
+        conn.exec_driver_sql(f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} (id BIGINT PRIMARY KEY, document TSVECTOR NOT NULL)')
+        conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS ix_{INDEX_TABLE}_document ON {INDEX_TABLE} USING GIN (document)')
+    else:
+        return False
+    _available[str(conn.engine.url)] = True
+    return True
+
+def _tsvector(title_tokens, body_tokens):
+    # 直接拼出带位置和权重的 tsvector 文本，不经过 PostgreSQL 的分词器（C 语言环境下会丢弃汉字）
+    lexemes = [f"'{token}':{position}A" for position, token in enumerate(title_tokens, start=1)]
+    start = len(title_tokens) + 2  # 标题和正文之间空一个位置，短语不会跨字段匹配
+    lexemes += [f"'{token}':{min(position, 16383)}B" for position, token in enumerate(body_tokens, start=start)]
+    return ' '.join(lexemes)
+
+def _document_row(conn, source, row):
+    values = list(row[1:])
+    title_tokens = [token for value in values[:len(source.title_columns)] for token in tokenize(value)]
+    body_tokens = [token for value in values[len(source.title_columns):] for token in tokenize(value)]
+    if conn.dialect.name == 'sqlite':
+        return {'id': source.doc_id(row[0]), 'title': ' '.join(title_tokens), 'body': ' '.join(body_tokens)}
+    return {'id': source.doc_id(row[0]), 'document': _tsvector(title_tokens, body_tokens)}
+
+def _write_documents(conn, documents):
+    if not documents:
+        return
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text(f'INSERT INTO {INDEX_TABLE} (rowid, title, body) VALUES (:id, :title, :body)'), documents)
+    else:
+        conn.execute(text(f'INSERT INTO {INDEX_TABLE} (id, document) VALUES (:id, CAST(:document AS tsvector))'), documents)
+
+def _delete_documents(conn, doc_ids):
+    id_column = 'rowid' if conn.dialect.name == 'sqlite' else 'id'
+    conn.execute(
+        text(f'DELETE FROM {INDEX_TABLE} WHERE {id_column} IN :ids').bindparams(bindparam('ids', expanding=True)),
+        {'ids': doc_ids}
+    )
+
+def _match_sql(conn, terms, codes):
+    """
+    返回 (FROM/WHERE 子句, 排序表达式, 参数)；SQLite 的 bm25 越小越相关，统一取负数使分数越大越相关
+    """
+    params = {}
+    if conn.dialect.name == 'sqlite':
+        clauses = []
+        for tokens, prefix in terms:
+            clauses.append('"' + ' '.join(tokens) + '"' + ('*' if prefix else ''))
+        params['q'] = ' AND '.join(clauses)
+        sql = f'FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH :q'
+        id_column, score = 'rowid', f'-bm25({INDEX_TABLE}, 10.0, 1.0)'
+    else:
+        clauses = []
+        for tokens, prefix in terms:
+            lexemes = [f"'{token}'" for token in tokens]
+            if prefix:
+                lexemes[-1] += ':*'
+            clauses.append('(' + ' <-> '.join(lexemes) + ')')
+        params['q'] = ' & '.join(clauses)
+        sql = f'FROM {INDEX_TABLE} WHERE document @@ CAST(:q AS tsquery)'
+        id_column, score = 'id', 'ts_rank(document, CAST(:q AS tsquery))'
+    if codes:
+        sql += f' AND {id_column} % {KIND_SLOTS} IN ({", ".join(str(code) for code in sorted(codes))})'
+    return sql, id_column, score, params
+
+# ---- 索引维护 ----
+
+def reindex(conn, kind, ref_ids):
+    """
+    按数据库中的当前数据重建指定记录的索引条目；已删除/软删除的记录从索引中移除
+    """
+    if not ref_ids or not index_available(conn):
+        return
+    source = SOURCES[kind]
+    ref_ids = sorted(ref_ids)
+    for start in range(0, len(ref_ids), CHUNK_SIZE):
+        chunk = ref_ids[start:start + CHUNK_SIZE]
+        _delete_documents(conn, [source.doc_id(ref_id) for ref_id in chunk])
+        rows = conn.execute(
+            select(source.model.id, *source.columns)
+            .where(source.model.id.in_(chunk), source.model.is_deleted.isnot(True))
+        )
+        _write_documents(conn, [_document_row(conn, source, row) for row in rows])
+
+def rebuild_search_index(conn, progress=None):
+    """
+    清空并重建整个搜索索引，返回 {类型: 条目数}
+    """
+    if not index_available(conn):
+        return {}
+    conn.execute(text(f'DELETE FROM {INDEX_TABLE}'))
+    counts = {}
+    for source in SOURCES.values():
+        counts[source.kind] = 0
+        rows = conn.execution_options(yield_per=CHUNK_SIZE).execute(
+            select(source.model.id, *source.columns).where(source.model.is_deleted.isnot(True))
+        )
+        for partition in rows.partitions():
+            documents = [_document_row(conn, source, row) for row in partition]
+            _write_documents(conn, documents)
+            counts[source.kind] += len(documents)
+            if progress:
+                progress(source.kind, counts[source.kind])
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text(f"INSERT INTO {INDEX_TABLE} ({INDEX_TABLE}) VALUES ('optimize')"))
+    return counts
+
+@event.listens_for(db.session, 'after_flush')
+def _reindex_flushed(session, flush_context):
+    # 在同一事务中更新索引：事务回滚时索引修改一并回滚
+    changed = defaultdict(set)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        source = SOURCES_BY_MODEL.get(type(obj))
+        if source is None:
+            continue
+        if obj in session.dirty:
+            state = inspect(obj)
+            names = source.title_columns + source.body_columns + ['is_deleted']
+            if not any(state.attrs[name].history.has_changes() for name in names):
+                continue
+        changed[source.kind].add(obj.id)
+    if changed:
+        conn = session.connection()
+        for kind, ref_ids in changed.items():
+            reindex(conn, kind, ref_ids)
+
+# ---- 查询 ----
+
+def _describe(kind, obj):
+    if kind == 'student':
+        return {'name': obj.name, 'student_id': obj.student_id, 'major': obj.major, 'phone': obj.phone,
+                'dorm_number': obj.dormitory.dorm_number if obj.dormitory else None}
+    if kind == 'visitor':
+        return {'name': obj.name, 'id_card': obj.id_card, 'dorm_number': obj.dorm_number,
+                'student_name': obj.student_name, 'status': obj.status,
+                'visit_date': obj.visit_date.strftime('%Y-%m-%d %H:%M') if obj.visit_date else None}
+    return {'title': obj.title, 'status': obj.status,
+            'dorm_number': obj.dormitory.dorm_number if obj.dormitory else None,
+            'created_at': obj.created_at.strftime('%Y-%m-%d %H:%M') if obj.created_at else None}
+
+_LOADERS = {
+    'student': lambda ids: Student.query.options(joinedload(Student.dormitory)).filter(Student.id.in_(ids)),
+    'visitor': lambda ids: Visitor.query.filter(Visitor.id.in_(ids)),
+    'repair': lambda ids: Repair.query.options(joinedload(Repair.dormitory)).filter(Repair.id.in_(ids)),
+}
+
+def search(q, kinds=None, params=None):
+    """
+    按相关度分页搜索学生/访客/报修，返回 Page，items 为 {'type', 'id', 'score', 'data'}
+
+    kinds 为要搜索的类型列表（默认全部）；索引不可用时抛出 RuntimeError
+    """
+    params = params or ListParams()
+    conn = db.session.connection()
+    if not index_available(conn):
+        raise RuntimeError('搜索索引不可用，请先执行 python alter_db.py')
+    terms = parse_query(q)
+    if not terms:
+        return Page([], params, total=0)
+
+    codes = {SOURCES[kind].code for kind in kinds or () if kind in SOURCES}
+    sql, id_column, score, bind = _match_sql(conn, terms, codes)
+    total = conn.execute(text(f'SELECT count(*) {sql}'), bind).scalar()
+    rows = conn.execute(
+        text(f'SELECT {id_column}, {score} AS score {sql} ORDER BY score DESC, {id_column} LIMIT :limit OFFSET :offset'),
+        dict(bind, limit=params.per_page, offset=(params.page - 1) * params.per_page)
+    ).all()
+
+    # 按类型各一次查询取回记录，再按相关度顺序组装
+    wanted = defaultdict(list)
+    for doc_id, _ in rows:
+        wanted[SOURCES_BY_CODE[doc_id % KIND_SLOTS].kind].append(doc_id // KIND_SLOTS)
+    loaded = {}
+    for kind, ids in wanted.items():
+        for obj in _LOADERS[kind](ids):
+            loaded[kind, obj.id] = obj
+
+    hits = []
+    for doc_id, rank in rows:
+        kind, ref_id = SOURCES_BY_CODE[doc_id % KIND_SLOTS].kind, doc_id // KIND_SLOTS
+        obj = loaded.get((kind, ref_id))
+        if obj is None or obj.is_deleted:
+            continue  # 索引中残留的条目（绕过 ORM 删除的记录），等待下次重建
+        hits.append({'type': kind, 'id': ref_id, 'score': round(float(rank), 4), 'data': _describe(kind, obj)})
+    return Page(hits, params, total=total)
+
+def search_filter(kind):
+    """
+    列表页的关键词筛选（paginate 的 filters 函数）：有索引时用索引查出ID，否则回退为 LIKE
+    """
+    source = SOURCES[kind]
+
+    def apply(query, q):
+        terms = parse_query(q)
+        if not terms:
+            return query
+        conn = db.session.connection()
+        if index_available(conn):
+            sql, id_column, _, bind = _match_sql(conn, terms, {source.code})
+            matched = text(f'SELECT {id_column} / {KIND_SLOTS} AS id {sql}').bindparams(**bind).columns(id=db.Integer)
+            return query.filter(source.model.id.in_(matched))
+        for word in q.split():
+            query = query.filter(or_(*[column.ilike(f'%{word}%') for column in source.columns]))
+        return query
+    return apply
@@ -0,0 +1,144 @@
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, inspect, select, insert, delete, exists, literal, func, and_, Table, Column, DateTime
+from sqlalchemy.orm import with_loader_criteria
+from app import db
+from app.models.models import User, Student, DormManager, Repair, Visitor
+from app.services.jobs import job_handler, scheduler
+
+# 带 is_deleted 软删除标记的模型，按归档顺序排列：引用其他软删除表的记录先归档，用户最后归档
+SOFT_DELETE_MODELS = (Visitor, Repair, DormManager, Student, User)
+
+# ---- 全局查询过滤 ----
+
+_LIVE_CRITERIA = [
+    with_loader_criteria(model, lambda cls: cls.is_deleted == False, propagate_to_loaders=False)
+    for model in SOFT_DELETE_MODELS
+]
+
+def include_deleted(query):
+    """
+    让查询包含已软删除的记录；用于唯一性校验（已删除的用户名/邮箱/学号在数据库中仍然占用）
+    """
+    return query.execution_options(include_deleted=True)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _exclude_deleted(execute_state):
+    """
+    ORM 查询自动排除已软删除的记录（包括 count()、get() 和显式 join 的表）
+
+    多对一关系（如 repair.student）和 joinedload 预加载仍能取到已删除的记录，历史数据可以正常显示；
+    一对多集合（如 dormitory.students）只包含未删除的记录
+    """
+    if not execute_state.is_select or execute_state.is_column_load:
+        return
+    if execute_state.execution_options.get('include_deleted', False):
+        return
+    if execute_state.is_relationship_load:
+        path = execute_state.loader_strategy_path
+        if not path or not getattr(path[-1], 'uselist', False):
+            return
+    execute_state.statement = execute_state.statement.options(*_LIVE_CRITERIA)
+
+@event.listens_for(db.session, 'before_flush')
+def _stamp_deleted_at(session, flush_context, instances):
+    # 记录软删除时间（恢复时清空），归档按该时间判断是否超过保留期
+    now = datetime.now()
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, SOFT_DELETE_MODELS):
+            continue
+        if obj in session.new or inspect(obj).attrs.is_deleted.history.has_changes():
+            obj.deleted_at = (obj.deleted_at or now) if obj.is_deleted else None
+
+# ---- 归档 ----
+
+def _archive_table(table):
+    # 与原表相同的列（不含外键和唯一约束），另加归档时间
+    columns = [Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+               for column in table.columns]
+    return Table(f'{table.name}_archive', db.metadata, *columns,
+                 Column('archived_at', DateTime, nullable=False, index=True))
+
+ARCHIVE_TABLES = {model: _archive_table(model.__table__) for model in SOFT_DELETE_MODELS}
+
+def _references(table):
+    """
+    引用 table 主键的其他表的外键列（归档表除外）
+    """
+    archives = {archive.name for archive in ARCHIVE_TABLES.values()}
+    return [fk.parent for other in db.metadata.sorted_tables if other.name not in archives
+            for fk in other.foreign_keys if fk.column.table is table and other is not table]
+
+class ArchiveReport:
+    """
+    归档结果：archived 为各表归档的行数，kept 为超过保留期但仍被其他记录引用而保留的行数
+    """
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
+        self.archived = {}
+        self.kept = {}
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'cutoff': self.cutoff.strftime('%Y-%m-%d %H:%M:%S'),
+            'archived': self.archived,
+            'kept': self.kept,
+            'elapsed_ms': round(self.elapsed * 1000, 2),
+        }
+
+def archive_deleted(days=None, batch_size=None, progress=None):
+    """
+    把软删除超过 days 天的记录移入 *_archive 表并从原表删除，保持在用表和索引的规模
+
+    每批（batch_size 行）一个事务：INSERT ... SELECT 到归档表后 DELETE 原表。
+    仍被在用记录引用的行（如还有报修记录的已删除学生）保留在原表，避免破坏外键
+    """
+    config = current_app.config
+    days = config['SOFT_DELETE_RETENTION_DAYS'] if days is None else days
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    now = datetime.now()
+    report = ArchiveReport(now - timedelta(days=days))
+    started = time.perf_counter()
+
+    for model in SOFT_DELETE_MODELS:
+        table, archive = model.__table__, ARCHIVE_TABLES[model]
+        expired = and_(table.c.is_deleted == True, table.c.deleted_at < report.cutoff)
+        unreferenced = [~exists().where(column == table.c.id) for column in _references(table)]
+        columns = [column.name for column in table.columns]
+        archived = 0
+        while True:
+            with db.engine.begin() as conn:
+                ids = conn.execute(
+                    select(table.c.id).where(expired, *unreferenced).order_by(table.c.id).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    report.kept[table.name] = conn.execute(
+                        select(func.count()).select_from(table).where(expired)
+                    ).scalar()
+                    break
+                conn.execute(insert(archive).from_select(
+                    columns + ['archived_at'],
+                    select(*table.columns, literal(now, DateTime)).where(table.c.id.in_(ids))
+                ))
+                conn.execute(delete(table).where(table.c.id.in_(ids)))
+            archived += len(ids)
+            if progress:
+                progress(table.name, archived)
+        report.archived[table.name] = archived
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+@job_handler('archive_deleted')
+def archive_deleted_job(context, days=None):
+    context.progress(0, len(SOFT_DELETE_MODELS), '正在归档已删除的记录')
+    tables = [model.__tablename__ for model in SOFT_DELETE_MODELS]
+    report = archive_deleted(days, progress=lambda table, done: context.progress(
+        tables.index(table), message=f'{table}：已归档 {done} 行'))
+    total = sum(report.archived.values())
+    context.progress(len(tables), len(tables), f'归档 {total} 行，{sum(report.kept.values())} 行仍被引用而保留')
+    return report.to_dict()
+
+scheduler.every('archive_deleted', 'ARCHIVE_INTERVAL')
@@ -0,0 +1,126 @@
+import csv
+import io
+import os
+from sqlalchemy import insert
+from app import db
+from app.models.models import User, Student
+from app.services.dashboard_counters import invalidate_dashboard_counters
+from app.services.identity import hash_password
+from app.services.jobs import job_handler
+from app.services.search import reindex
+from app.services.soft_delete import include_deleted
+
+DEFAULT_PASSWORD = '123456'
+BATCH_SIZE = 1000
+CSV_COLUMNS = ['student_id', 'name', 'gender', 'major', 'grade', 'phone']
+
+class ImportReport:
+    """
+    批量导入结果：成功数、跳过数以及逐行错误
+    """
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []  # [(行号, 错误信息)]
+
+    def add_error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'errors': [{'line': line_no, 'message': message} for line_no, message in self.errors]
+        }
+
+def iter_csv_rows(stream):
+    """
+    以流的方式逐行读取上传的CSV（跳过表头），返回 (行号, 行数据)
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        next(reader, None)  # Skip header row
+        for line_no, row in enumerate(reader, start=2):
+            yield line_no, row
+    finally:
+        text.detach()
+
+def _insert_batch(batch, password):
+    # 批量插入用户并取回ID，再批量插入学生
+    user_rows = db.session.execute(
+        insert(User).returning(User.id, User.username),
+        [{'username': item['student_id'], 'password': password, 'role': 'student'} for item in batch]
+    ).all()
+    user_ids = {username: user_id for user_id, username in user_rows}
+    student_ids = db.session.execute(
+        insert(Student).returning(Student.id),
+        [dict(item, user_id=user_ids[item['student_id']]) for item in batch]
+    ).scalars().all()
+    # 批量插入不触发会话事件，在同一事务中写入搜索索引
+    reindex(db.session.connection(), 'student', student_ids)
+
+def import_students(rows, batch_size=BATCH_SIZE, progress=None):
+    """
+    批量导入学生。rows 为 (行号, 行数据) 的可迭代对象；progress(已导入数) 在每批插入后调用
+
+    已存在的学号一次性预取到内存集合中；默认密码只哈希一次并由所有新账户共用；
+    用户和学生按批次批量插入，整个导入在同一个事务中完成
+    """
+    report = ImportReport()
+    # 已删除的账户仍占用用户名和学号
+    existing = {username for (username,) in include_deleted(db.session.query(User.username))}
+    existing.update(student_id for (student_id,) in include_deleted(db.session.query(Student.student_id)))
+    password = hash_password(DEFAULT_PASSWORD)
+
+    batch = []
+    try:
+        for line_no, row in rows:
+            if not any(cell.strip() for cell in row):
+                continue
+            if len(row) != len(CSV_COLUMNS):
+                report.add_error(line_no, f'列数应为{len(CSV_COLUMNS)}，实际为{len(row)}')
+                continue
+            item = dict(zip(CSV_COLUMNS, (cell.strip() for cell in row)))
+            missing = [column for column in CSV_COLUMNS if not item[column]]
+            if missing:
+                report.add_error(line_no, f'缺少字段：{", ".join(missing)}')
+                continue
+            if item['student_id'] in existing:
+                report.skipped += 1  # 如果已存在，跳过
+                continue
+
+            existing.add(item['student_id'])
+            batch.append(item)
+            if len(batch) >= batch_size:
+                _insert_batch(batch, password)
+                report.imported += len(batch)
+                batch = []
+                if progress:
+                    progress(report.imported)
+
+        if batch:
+            _insert_batch(batch, password)
+            report.imported += len(batch)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if report.imported:
+        invalidate_dashboard_counters()
+    return report
+
+@job_handler('import_students')
+def import_students_job(context, path):
+    """
+    后台任务：导入已保存到临时文件的CSV，完成后删除临时文件
+    """
+    try:
+        with open(path, 'rb') as stream:
+            report = import_students(iter_csv_rows(stream),
+                                     progress=lambda done: context.progress(done, message=f'已导入 {done} 名学生'))
+    finally:
+        os.remove(path)
+    context.progress(report.imported, message=f'成功 {report.imported} 条，跳过 {report.skipped} 条，错误 {len(report.errors)} 条')
+    return report.to_dict()
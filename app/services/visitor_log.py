@@ -0,0 +1,234 @@
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import inspect, select, insert, delete, literal, MetaData, Table, Column, DateTime
+from app import db
+from app.models.models import Visitor
+from app.services.jobs import job_handler, scheduler
+from app.services.qr_codes import FORMATS as QR_FORMATS, qr_etag, visitor_qr_payload
+from app.services.search import reindex
+
+# 访客记录分为两部分：
+#   visitors 表只保留工作集——在访的访客和最近 VISITOR_HOT_DAYS 天内的访问，门卫/宿管/管理员页面只扫描这部分；
+#   更早且已离开的访问按访问月份移入历史分区 visitor_history_YYYY_MM。
+# PostgreSQL 上各月份表是 visitor_history 的原生范围分区（按 visit_date），可直接查询父表；
+# SQLite 上是独立的按月表。超过 VISITOR_HISTORY_RETENTION_MONTHS 个月的分区整表删除
+
+HISTORY_PREFIX = 'visitor_history'
+_PARTITION_RE = re.compile(rf'^{HISTORY_PREFIX}_(\d{{4}})_(\d{{2}})$')
+_LEGACY_QR_RE = re.compile(r'^visitor_(\d+)\.png$')
+
+# 历史分区不放入 db.metadata，create_all 不会创建它们
+_history_metadata = MetaData()
+
+def partition_name(month):
+    return f'{HISTORY_PREFIX}_{month[:4]}_{month[5:7]}'
+
+def history_table(month):
+    """
+    月份（YYYY-MM）对应的历史分区表：与 visitors 相同的列（不含外键），另加移入时间
+    """
+    name = partition_name(month)
+    if name in _history_metadata.tables:
+        return _history_metadata.tables[name]
+    columns = [Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+               for column in Visitor.__table__.columns]
+    return Table(name, _history_metadata, *columns, Column('moved_at', DateTime, nullable=False))
+
+def _month_bounds(month):
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+def _ensure_partition(conn, month):
+    table = history_table(month)
+    if conn.dialect.name != 'postgresql':
+        table.create(conn, checkfirst=True)
+        return table
+    columns = ', '.join(f'{column.name} {column.type.compile(conn.dialect)}' for column in table.columns)
+    conn.exec_driver_sql(
+        f'CREATE TABLE IF NOT EXISTS {HISTORY_PREFIX} ({columns}, PRIMARY KEY (id, visit_date)) '
+        'PARTITION BY RANGE (visit_date)'
+    )
+    start, end = _month_bounds(month)
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {table.name} PARTITION OF {HISTORY_PREFIX} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    )
+    return table
+
+def history_months(conn=None):
+    """
+    已有的历史分区月份（YYYY-MM），新的在前
+    """
+    conn = conn or db.session.connection()
+    months = []
+    for name in inspect(conn).get_table_names():
+        match = _PARTITION_RE.match(name)
+        if match:
+            months.append(f'{match.group(1)}-{match.group(2)}')
+    return sorted(months, reverse=True)
+
+def _qr_cache_folder():
+    return current_app.config.get('QR_CACHE_DIR') or os.path.join(current_app.instance_path, 'qr_cache')
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+def _purge_visitor_qr(rows):
+    """
+    删除移出工作集的访客的二维码：旧版登记时写入的 PNG 和按内容哈希缓存的 PNG/SVG
+    """
+    legacy_folder = os.path.join(current_app.static_folder, 'qr_codes')
+    folder = _qr_cache_folder()
+    removed = 0
+    for row in rows:
+        if row.qr_code:
+            # 旧版记录的路径形如 qr_codes/visitor_1.png（相对 static 目录）
+            removed += _remove(os.path.join(legacy_folder, os.path.basename(row.qr_code)))
+        if row.visit_date is None:
+            continue
+        payload = visitor_qr_payload(row)
+        for fmt in QR_FORMATS:
+            key = qr_etag(payload, fmt)
+            removed += _remove(os.path.join(folder, key[:2], f'{key}.{fmt}'))
+    return removed
+
+class RotationReport:
+    """
+    访客日志轮转结果：moved 为各月份移入历史分区的行数，dropped 为按保留期删除的分区
+    """
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
+        self.moved = defaultdict(int)
+        self.dropped = []
+        self.qr_removed = 0
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'cutoff': self.cutoff.strftime('%Y-%m-%d %H:%M:%S'),
+            'moved': dict(self.moved),
+            'dropped': self.dropped,
+            'qr_removed': self.qr_removed,
+            'elapsed_ms': round(self.elapsed * 1000, 2),
+        }
+
+def rotate_visitor_log(now=None, progress=None):
+    """
+    把早于 VISITOR_HOT_DAYS 天且已离开的访问移入对应月份的历史分区，再按保留期删除旧分区、清理二维码缓存
+
+    每批 VISITOR_ROTATE_BATCH_SIZE 行一个事务（写入分区、删除原行、移除搜索索引条目），可重复执行
+    """
+    config = current_app.config
+    now = now or datetime.now()
+    report = RotationReport(now - timedelta(days=config['VISITOR_HOT_DAYS']))
+    started = time.perf_counter()
+    visitors = Visitor.__table__
+    columns = [column.name for column in visitors.columns]
+    stale = (visitors.c.status == 'out') & (visitors.c.visit_date < report.cutoff)
+
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                select(visitors).where(stale).order_by(visitors.c.id).limit(config['VISITOR_ROTATE_BATCH_SIZE'])
+            ).all()
+            if not rows:
+                break
+            by_month = defaultdict(list)
+            for row in rows:
+                by_month[row.visit_date.strftime('%Y-%m')].append(row.id)
+            for month, ids in sorted(by_month.items()):
+                table = _ensure_partition(conn, month)
+                conn.execute(insert(table).from_select(
+                    columns + ['moved_at'],
+                    select(*visitors.columns, literal(now, DateTime)).where(visitors.c.id.in_(ids))
+                ))
+                report.moved[month] += len(ids)
+            ids = [row.id for row in rows]
+            conn.execute(delete(visitors).where(visitors.c.id.in_(ids)))
+            reindex(conn, 'visitor', ids)
+        report.qr_removed += _purge_visitor_qr(rows)
+        if progress:
+            progress(sum(report.moved.values()))
+
+    report.dropped = drop_expired_partitions(now)
+    report.qr_removed += purge_qr_cache(now)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+def drop_expired_partitions(now=None):
+    """
+    删除超过 VISITOR_HISTORY_RETENTION_MONTHS 个月的历史分区（0 表示永久保留），返回删除的月份
+    """
+    months_kept = current_app.config['VISITOR_HISTORY_RETENTION_MONTHS']
+    if not months_kept:
+        return []
+    now = now or datetime.now()
+    index = now.year * 12 + now.month - 1 - months_kept
+    oldest = f'{index // 12:04d}-{index % 12 + 1:02d}'
+    dropped = []
+    with db.engine.begin() as conn:
+        for month in history_months(conn):
+            if month < oldest:
+                conn.exec_driver_sql(f'DROP TABLE IF EXISTS {partition_name(month)}')
+                dropped.append(month)
+    for month in dropped:
+        _history_metadata.remove(history_table(month))
+    return dropped
+
+def purge_qr_cache(now=None):
+    """
+    删除超过 QR_CACHE_MAX_AGE_DAYS 天未修改的二维码缓存文件（需要时会重新生成），
+    以及工作集中已不存在的访客的旧版二维码 PNG
+    """
+    now = now or datetime.now()
+    removed = 0
+    expires = (now - timedelta(days=current_app.config['QR_CACHE_MAX_AGE_DAYS'])).timestamp()
+    for root, _, files in os.walk(_qr_cache_folder()):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < expires:
+                    removed += _remove(path)
+            except OSError:
+                pass
+
+    legacy_folder = os.path.join(current_app.static_folder, 'qr_codes')
+    legacy = {}
+    for name in os.listdir(legacy_folder) if os.path.isdir(legacy_folder) else ():
+        match = _LEGACY_QR_RE.match(name)
+        if match:
+            legacy[int(match.group(1))] = name
+    if legacy:
+        live = {visitor_id for (visitor_id,) in db.session.query(Visitor.id).execution_options(include_deleted=True)
+                .filter(Visitor.id.in_(legacy))}
+        for visitor_id, name in legacy.items():
+            if visitor_id not in live:
+                removed += _remove(os.path.join(legacy_folder, name))
+    return removed
+
+def history_query(month):
+    """
+    某月历史访问的查询（行对象，字段与 Visitor 相同），月份不存在时返回 None
+    """
+    if month not in history_months():
+        return None
+    return db.session.query(history_table(month))
+
+@job_handler('rotate_visitor_log')
+def rotate_visitor_log_job(context):
+    context.progress(0, None, '正在把过期访客记录移入历史分区')
+    report = rotate_visitor_log(progress=lambda done: context.progress(done, message=f'已移入 {done} 条访客记录'))
+    moved = sum(report.moved.values())
+    context.progress(moved, moved, f'移入 {moved} 条，删除 {len(report.dropped)} 个过期分区，清理 {report.qr_removed} 个二维码文件')
+    return report.to_dict()
+
+scheduler.every('rotate_visitor_log', 'VISITOR_ROTATE_INTERVAL')
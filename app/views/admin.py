@@ -1,18 +1,35 @@
-import csv
-import io
-from collections import Counter
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
 from app import db
-from app.models.models import User, Student, Dormitory, Repair, Visitor, DormManager, DormChangeRequest, UtilityBill, Payment, InvitationCode, PasswordResetRequest
-from werkzeug.security import generate_password_hash
+from app.models.models import User, Student, Dormitory, Repair, Visitor, DormManager, DormChangeRequest, UtilityBill, Payment, InvitationCode, PasswordResetRequest, BackgroundJob
+from app.services.identity import hash_password
 from datetime import datetime
+import os
 import random
 import string
+import tempfile
 from app.utils import send_password_reset_email
+from app.services.dashboard_stats import get_dorm_occupancy_data, get_building_repair_data
+from app.services.dashboard_counters import get_global_counters
+from app.services.bill_rollups import get_bill_statistics
+from app.services.pagination import ListParams, paginate, building_filter
+from app.services.jobs import jobs, job_to_dict
+from app.services import student_import, allocation, occupancy, visitor_log  # 注册后台任务
+from app.services.billing import compute_bill_costs, bill_due_date
+from app.services.password_resets import approve_reset_requests
+from app.services.reference_data import get_buildings, get_dorm_options
+from app.services.occupancy import occupy, vacate, move_student, DormFullError
+from app.services.search import search_filter
+from app.services.soft_delete import include_deleted
+from app.services.gate import bulk_checkout, checkout_cutoff
+from app.services.queries import student_list_query, repair_list_query, visitor_list_query, utility_bill_list_query, payment_list_query, password_reset_request_list_query
 
 admin_bp = Blueprint('admin', __name__)
 
+def _building_choices():
+    # 列表页楼栋筛选下拉框
+    return get_buildings()
+
 @admin_bp.route('/dashboard')
 @login_required
 def dashboard():
@@ -20,14 +37,15 @@ def dashboard():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    # 统计数据
-    total_students = Student.query.count()
-    total_dorms = Dormitory.query.count()
-    total_repairs = Repair.query.count()
-    pending_repairs = Repair.query.filter_by(status='pending').count()
+    # 统计数据（从计数缓存读取）
+    counters = get_global_counters()
+    total_students = counters['total_students']
+    total_dorms = counters['total_dorms']
+    total_repairs = counters['total_repairs']
+    pending_repairs = counters['pending_repairs']
     
     # 获取最新活动
-    latest_repairs = Repair.query.order_by(Repair.created_at.desc()).limit(5).all()
+    latest_repairs = repair_list_query().order_by(Repair.created_at.desc()).limit(5).all()
     latest_visitors = Visitor.query.order_by(Visitor.visit_date.desc()).limit(5).all()
     
     # 准备活动数据
@@ -54,23 +72,10 @@ def dashboard():
         })
     
     # 宿舍入住率统计
-    dorms = Dormitory.query.all()
-    full_dorms = sum(1 for d in dorms if d.current_occupancy == d.capacity)
-    partial_dorms = sum(1 for d in dorms if 0 < d.current_occupancy < d.capacity)
-    empty_dorms = sum(1 for d in dorms if d.current_occupancy == 0)
-    dorm_occupancy_data = [
-        {"value": full_dorms, "name": '已住满'},
-        {"value": partial_dorms, "name": '未住满'},
-        {"value": empty_dorms, "name": '空置'}
-    ]
+    dorm_occupancy_data = get_dorm_occupancy_data()
 
     # 各楼栋报修数量统计
-    repairs = Repair.query.all()
-    building_repairs = Counter(r.dormitory.building for r in repairs if r.dormitory)
-    building_repair_data = {
-        "buildings": list(building_repairs.keys()),
-        "counts": list(building_repairs.values())
-    }
+    building_repair_data = get_building_repair_data()
 
     # 按时间排序
     activities.sort(key=lambda x: x['time'], reverse=True)
@@ -92,8 +97,12 @@ def students():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    students = Student.query.filter_by(is_deleted=False).all()  # 只显示未删除的学生
-    return render_template('admin/students.html', students=students)
+    query = student_list_query().filter_by(is_deleted=False)  # 只显示未删除的学生
+    page = paginate(query, ListParams.from_request(filter_names=('building', 'q')), Student.id,
+                    sort_columns={'id': Student.id, 'student_id': Student.student_id, 'name': Student.name, 'grade': Student.grade},
+                    default_sort='id',
+                    filters={'building': building_filter(Student.dorm_id), 'q': search_filter('student')})
+    return render_template('admin/students.html', students=page.items, page=page, buildings=_building_choices())
 
 @admin_bp.route('/students/add', methods=['GET', 'POST'])
 @login_required
@@ -102,7 +111,7 @@ def add_student():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dormitories = Dormitory.query.all()
+    dormitories = get_dorm_options()
     
     if request.method == 'POST':
         # 获取表单数据
@@ -117,15 +126,15 @@ def add_student():
         
         # 创建用户账户
         username = student_id  # 使用学号作为用户名
-        password = generate_password_hash('123456')  # 默认密码
+        password = hash_password('123456')  # 默认密码
         
         # 检查用户名是否已存在
-        if User.query.filter_by(username=username).first():
+        if include_deleted(User.query).filter_by(username=username).first():
             flash('学号已被使用！', 'danger')
             return redirect(url_for('admin.add_student'))
 
         # 检查邮箱是否已存在
-        if User.query.filter_by(email=email).first():
+        if include_deleted(User.query).filter_by(email=email).first():
             flash('邮箱已存在！', 'danger')
             return redirect(url_for('admin.add_student'))
         
@@ -152,6 +161,12 @@ def add_student():
         )
         
         db.session.add(student)
+        try:
+            occupy(student.dorm_id)  # 原子占用床位，宿舍已满时整体回滚
+        except DormFullError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.add_student'))
         db.session.commit()
         
         flash('学生添加成功！', 'success')
@@ -167,6 +182,8 @@ def delete_student(student_id):
         return redirect(url_for('main.login'))
     
     student = Student.query.get_or_404(student_id)
+    if not student.is_deleted:
+        vacate(student.dorm_id)  # 释放床位（已删除学生不计入入住人数）
     student.is_deleted = True  # 软删除
     student.user.is_deleted = True  # 同时软删除关联的用户
     db.session.commit()
@@ -182,21 +199,26 @@ def edit_student(student_id):
         return redirect(url_for('main.login'))
     
     student = Student.query.get_or_404(student_id)
-    dormitories = Dormitory.query.all()
+    dormitories = get_dorm_options()
     
     if request.method == 'POST':
         student.name = request.form['name']
         student.gender = request.form['gender']
         student.major = request.form['major']
         student.grade = request.form['grade']
-        student.dorm_id = request.form['dorm_id'] if request.form['dorm_id'] else None
         student.phone = request.form['phone']
+        try:
+            move_student(student, request.form['dorm_id'])  # 调整新旧宿舍入住人数
+        except DormFullError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.edit_student', student_id=student_id))
         
         # 更新邮箱
         email = request.form['email']
         if email != student.user.email:
              # 检查邮箱是否被其他用户占用
-            if User.query.filter(User.email == email, User.id != student.user_id).first():
+            if include_deleted(User.query).filter(User.email == email, User.id != student.user_id).first():
                 flash('该邮箱已被使用！', 'danger')
                 return redirect(url_for('admin.edit_student', student_id=student_id))
             student.user.email = email
@@ -224,47 +246,13 @@ def bulk_import_students():
         flash('请上传CSV格式的文件！', 'danger')
         return redirect(url_for('admin.students'))
 
-    try:
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.reader(stream)
-        next(csv_reader)  # Skip header row
-
-        for row in csv_reader:
-            student_id, name, gender, major, grade, phone = row
-
-            # 检查用户是否已存在
-            if User.query.filter_by(username=student_id).first():
-                continue  # 如果已存在，跳过
-
-            # 创建用户
-            user = User(
-                username=student_id,
-                password=generate_password_hash('123456'),  # 默认密码
-                role='student'
-            )
-            db.session.add(user)
-            db.session.flush()
-
-            # 创建学生
-            student = Student(
-                user_id=user.id,
-                student_id=student_id,
-                name=name,
-                gender=gender,
-                major=major,
-                grade=grade,
-                phone=phone
-            )
-            db.session.add(student)
-
-        db.session.commit()
-        flash('学生批量导入成功！', 'success')
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'导入失败：{e}', 'danger')
-
-    return redirect(url_for('admin.students'))
+    # 先保存到临时文件，再交给后台任务导入
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=current_app.config['JOB_UPLOAD_FOLDER'])
+    with os.fdopen(fd, 'wb') as f:
+        file.save(f)
+    job = jobs.submit('import_students', {'path': path}, created_by=current_user.id)
+    flash(f'学生批量导入已提交为后台任务（#{job.id}），可在任务列表中查看进度和导入报告。', 'success')
+    return redirect(url_for('admin.jobs_list'))
 
 # 宿管管理
 @admin_bp.route('/dorm_managers')
@@ -292,12 +280,12 @@ def add_dorm_manager():
         responsible_building = request.form['responsible_building']
         
         # 检查用户名是否已存在
-        if User.query.filter_by(username=username).first():
+        if include_deleted(User.query).filter_by(username=username).first():
             flash('用户名已存在！', 'danger')
             return redirect(url_for('admin.add_dorm_manager'))
 
         # 检查邮箱是否已存在
-        if User.query.filter_by(email=email).first():
+        if include_deleted(User.query).filter_by(email=email).first():
             flash('邮箱已存在！', 'danger')
             return redirect(url_for('admin.add_dorm_manager'))
         
@@ -305,7 +293,7 @@ def add_dorm_manager():
         user = User(
             username=username,
             email=email,
-            password=generate_password_hash('123456'),  # 默认密码
+            password=hash_password('123456'),  # 默认密码
             role='dorm_manager'
         )
         db.session.add(user)
@@ -344,7 +332,7 @@ def edit_dorm_manager(manager_id):
         email = request.form['email']
         if email != dorm_manager.user.email:
              # 检查邮箱是否被其他用户占用
-            if User.query.filter(User.email == email, User.id != dorm_manager.user_id).first():
+            if include_deleted(User.query).filter(User.email == email, User.id != dorm_manager.user_id).first():
                 flash('该邮箱已被使用！', 'danger')
                 return redirect(url_for('admin.edit_dorm_manager', manager_id=manager_id))
             dorm_manager.user.email = email
@@ -379,8 +367,11 @@ def dormitories():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dormitories = Dormitory.query.all()
-    return render_template('admin/dormitories.html', dormitories=dormitories)
+    page = paginate(Dormitory.query, ListParams.from_request(default_order='asc'), Dormitory.id,
+                    sort_columns={'dorm_number': Dormitory.dorm_number, 'floor': Dormitory.floor, 'current_occupancy': Dormitory.current_occupancy},
+                    default_sort='dorm_number',
+                    filters={'building': Dormitory.building})
+    return render_template('admin/dormitories.html', dormitories=page.items, page=page, buildings=_building_choices())
 
 @admin_bp.route('/get_dorm_students/<int:dorm_id>')
 @login_required
@@ -478,6 +469,18 @@ def edit_dormitory(dorm_id):
             
     return render_template('admin/edit_dormitory.html', dormitory=dormitory)
 
+@admin_bp.route('/dormitories/reconcile_occupancy', methods=['POST'])
+@login_required
+def reconcile_dorm_occupancy():
+    if current_user.role != 'admin':
+        flash('无权访问！', 'danger')
+        return redirect(url_for('main.login'))
+    
+    # 按学生表重新统计各宿舍入住人数，修正偏差
+    job = jobs.submit('reconcile_occupancy', {'fix': True}, created_by=current_user.id)
+    flash(f'入住人数校正已提交为后台任务（#{job.id}），可在任务列表中查看偏差报告。', 'success')
+    return redirect(url_for('admin.jobs_list'))
+
 # 智能宿舍分配
 @admin_bp.route('/smart_allocate_dorm', methods=['GET', 'POST'])
 @login_required
@@ -486,48 +489,33 @@ def smart_allocate_dorm():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    # 获取未分配宿舍的学生
-    unallocated_students = Student.query.filter_by(dorm_id=None).all()
-    
     if request.method == 'POST':
-        allocated_count = 0
-        
-        # 获取所有未满宿舍
-        available_dorms = Dormitory.query.filter(Dormitory.current_occupancy < Dormitory.capacity).all()
-        
-        # 简单的分配逻辑：按顺序填空
-        # 注意：这里移除了性别匹配逻辑，因为宿舍不再区分性别
-        # 如果需要保留“同性别住一起”的逻辑，需要根据已入住学生的性别来判断，或者在Dormitory模型中虽然不显示但保留gender字段作为动态属性
-        
-        # 这里的逻辑是：如果宿舍是空的，谁都可以住。如果有人，必须性别相同。
-        # 由于我们移除了Dormitory.gender的强制设置，我们需要动态判断。
-        
-        for student in unallocated_students:
-            for dorm in available_dorms:
-                if dorm.current_occupancy < dorm.capacity:
-                    # 检查该宿舍当前入住学生的性别
-                    existing_students = dorm.students.all()
-                    if not existing_students:
-                        # 宿舍为空，可以入住
-                        student.dorm_id = dorm.id
-                        dorm.current_occupancy += 1
-                        db.session.commit()
-                        allocated_count += 1
-                        break # 继续下一个学生
-                    else:
-                        # 宿舍不为空，检查性别是否一致
-                        first_student_gender = existing_students[0].gender
-                        if first_student_gender == student.gender:
-                            student.dorm_id = dorm.id
-                            dorm.current_occupancy += 1
-                            db.session.commit()
-                            allocated_count += 1
-                            break # 继续下一个学生
-        
-        flash(f'智能分配完成，共分配 {allocated_count} 名学生。', 'success')
-        return redirect(url_for('admin.dashboard'))
-        
-    return render_template('admin/smart_allocate_dorm.html', unallocated_count=len(unallocated_students))
+        job = jobs.submit('smart_allocate_dorm', created_by=current_user.id)
+        flash(f'智能分配已提交为后台任务（#{job.id}），可在任务列表中查看进度。', 'success')
+        return redirect(url_for('admin.jobs_list'))
+    
+    # 获取未分配宿舍的学生数
+    unallocated_count = Student.query.filter_by(dorm_id=None, is_deleted=False).count()
+    
+    # 预览模式：只计算分配方案，不写数据库
+    plan = None
+    if request.args.get('preview') and unallocated_count:
+        plan = allocation.plan_allocation()
+    return render_template('admin/smart_allocate_dorm.html', unallocated_count=unallocated_count, plan=plan)
+
+# 后台任务
+@admin_bp.route('/jobs')
+@login_required
+def jobs_list():
+    if current_user.role != 'admin':
+        flash('无权访问！', 'danger')
+        return redirect(url_for('main.login'))
+    
+    page = paginate(BackgroundJob.query, ListParams.from_request(filter_names=('status',)), BackgroundJob.id,
+                    sort_columns={'id': BackgroundJob.id}, default_sort='id',
+                    filters={'status': BackgroundJob.status})
+    
+    return render_template('admin/jobs.html', jobs=[job_to_dict(job) for job in page.items], page=page)
 
 # 水电费管理
 @admin_bp.route('/utility_bills')
@@ -537,10 +525,13 @@ def utility_bills():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    # 获取所有水电费账单
-    bills = UtilityBill.query.order_by(UtilityBill.month.desc(), UtilityBill.dorm_id).all()
+    # 分页获取水电费账单
+    page = paginate(utility_bill_list_query(), ListParams.from_request(), UtilityBill.id,
+                    sort_columns={'month': UtilityBill.month, 'total_cost': UtilityBill.total_cost, 'due_date': UtilityBill.due_date},
+                    default_sort='month',
+                    filters={'status': UtilityBill.status, 'building': building_filter(UtilityBill.dorm_id)})
     
-    return render_template('admin/utility_bills.html', bills=bills)
+    return render_template('admin/utility_bills.html', bills=page.items, page=page, buildings=_building_choices())
 
 @admin_bp.route('/utility_bills/add', methods=['GET', 'POST'])
 @login_required
@@ -554,11 +545,14 @@ def add_utility_bill():
         month = request.form['month']
         electricity = float(request.form['electricity'])
         water = float(request.form['water'])
+        try:
+            due_date = bill_due_date(month)
+        except ValueError:
+            flash('请选择正确的月份！', 'danger')
+            return redirect(url_for('admin.add_utility_bill'))
         
-        # 计算费用（这里假设电费1元/度，水费2元/吨，实际可根据学校规定调整）
-        electricity_cost = round(electricity * 1.0, 2)
-        water_cost = round(water * 2.0, 2)
-        total_cost = round(electricity_cost + water_cost, 2)
+        # 按配置的阶梯单价计算费用（ELECTRICITY_TARIFFS / WATER_TARIFFS）
+        electricity_cost, water_cost, total_cost = compute_bill_costs(electricity, water)
         
         # 检查是否已存在该宿舍该月份的账单
         existing_bill = UtilityBill.query.filter_by(dorm_id=dorm_id, month=month).first()
@@ -575,7 +569,7 @@ def add_utility_bill():
             electricity_cost=electricity_cost,
             water_cost=water_cost,
             total_cost=total_cost,
-            due_date=datetime.strptime(f'{month}-28', '%Y-%m-%d')  # 假设每月28号到期
+            due_date=due_date
         )
         
         db.session.add(utility_bill)
@@ -585,10 +579,48 @@ def add_utility_bill():
         return redirect(url_for('admin.utility_bills'))
     
     # 获取所有宿舍列表
-    dormitories = Dormitory.query.order_by(Dormitory.building, Dormitory.dorm_number).all()
+    dormitories = get_dorm_options()
     
     return render_template('admin/add_utility_bill.html', dormitories=dormitories)
 
+@admin_bp.route('/utility_bills/generate', methods=['GET', 'POST'])
+@login_required
+def generate_utility_bills():
+    if current_user.role != 'admin':
+        flash('无权访问！', 'danger')
+        return redirect(url_for('main.login'))
+    
+    if request.method == 'POST':
+        month = request.form.get('month', '')
+        file = request.files.get('file')
+        try:
+            bill_due_date(month)
+        except ValueError:
+            flash('请选择正确的月份！', 'danger')
+            return redirect(url_for('admin.generate_utility_bills'))
+        if not file or file.filename == '':
+            flash('未选择文件！', 'danger')
+            return redirect(url_for('admin.generate_utility_bills'))
+        if file.filename.endswith('.csv'):
+            fmt = 'csv'
+        elif file.filename.endswith(('.jsonl', '.json')):
+            fmt = 'jsonl'
+        else:
+            flash('请上传CSV或JSONL格式的抄表文件！', 'danger')
+            return redirect(url_for('admin.generate_utility_bills'))
+        
+        # 先保存到临时文件，再交给后台任务出账
+        fd, path = tempfile.mkstemp(suffix='.' + fmt, dir=current_app.config['JOB_UPLOAD_FOLDER'])
+        with os.fdopen(fd, 'wb') as f:
+            file.save(f)
+        job = jobs.submit('generate_bills', {'path': path, 'month': month, 'fmt': fmt}, created_by=current_user.id)
+        flash(f'{month}月份账单批量生成已提交为后台任务（#{job.id}），可在任务列表中查看进度和报告。', 'success')
+        return redirect(url_for('admin.jobs_list'))
+    
+    return render_template('admin/generate_utility_bills.html',
+                           electricity_tariffs=current_app.config['ELECTRICITY_TARIFFS'],
+                           water_tariffs=current_app.config['WATER_TARIFFS'])
+
 @admin_bp.route('/utility_bills/edit/<int:bill_id>', methods=['GET', 'POST'])
 @login_required
 def edit_utility_bill(bill_id):
@@ -599,15 +631,18 @@ def edit_utility_bill(bill_id):
     bill = UtilityBill.query.get_or_404(bill_id)
     
     if request.method == 'POST':
+        try:
+            bill_due_date(request.form['month'])
+        except ValueError:
+            flash('请选择正确的月份！', 'danger')
+            return redirect(url_for('admin.edit_utility_bill', bill_id=bill_id))
         bill.dorm_id = request.form['dorm_id']
         bill.month = request.form['month']
         bill.electricity = float(request.form['electricity'])
         bill.water = float(request.form['water'])
         
         # 重新计算费用
-        bill.electricity_cost = round(bill.electricity * 1.0, 2)
-        bill.water_cost = round(bill.water * 2.0, 2)
-        bill.total_cost = round(bill.electricity_cost + bill.water_cost, 2)
+        bill.electricity_cost, bill.water_cost, bill.total_cost = compute_bill_costs(bill.electricity, bill.water)
         
         db.session.commit()
         
@@ -615,7 +650,7 @@ def edit_utility_bill(bill_id):
         return redirect(url_for('admin.utility_bills'))
     
     # 获取所有宿舍列表
-    dormitories = Dormitory.query.order_by(Dormitory.building, Dormitory.dorm_number).all()
+    dormitories = get_dorm_options()
     
     return render_template('admin/edit_utility_bill.html', bill=bill, dormitories=dormitories)
 
@@ -641,60 +676,18 @@ def utility_bills_statistics():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    # 统计数据
-    from collections import defaultdict
-    
-    # 获取所有账单
-    bills = UtilityBill.query.all()
-    
-    # 计算总费用
-    total_electricity = sum(bill.electricity for bill in bills)
-    total_water = sum(bill.water for bill in bills)
-    total_electricity_cost = sum(bill.electricity_cost for bill in bills)
-    total_water_cost = sum(bill.water_cost for bill in bills)
-    total_cost = sum(bill.total_cost for bill in bills)
-    
-    # 按楼栋统计
-    building_stats = defaultdict(lambda: {
-        'electricity': 0,
-        'water': 0,
-        'electricity_cost': 0,
-        'water_cost': 0,
-        'total_cost': 0
-    })
-    
-    for bill in bills:
-        building = bill.dormitory.building
-        building_stats[building]['electricity'] += bill.electricity
-        building_stats[building]['water'] += bill.water
-        building_stats[building]['electricity_cost'] += bill.electricity_cost
-        building_stats[building]['water_cost'] += bill.water_cost
-        building_stats[building]['total_cost'] += bill.total_cost
-    
-    # 按月份统计
-    monthly_stats = defaultdict(lambda: {
-        'electricity': 0,
-        'water': 0,
-        'electricity_cost': 0,
-        'water_cost': 0,
-        'total_cost': 0
-    })
-    
-    for bill in bills:
-        monthly_stats[bill.month]['electricity'] += bill.electricity
-        monthly_stats[bill.month]['water'] += bill.water
-        monthly_stats[bill.month]['electricity_cost'] += bill.electricity_cost
-        monthly_stats[bill.month]['water_cost'] += bill.water_cost
-        monthly_stats[bill.month]['total_cost'] += bill.total_cost
+    # 从按 (楼栋, 月份) 维护的汇总表读取统计数据
+    stats = get_bill_statistics()
+    totals = stats['totals']
     
     return render_template('admin/utility_bills_statistics.html',
-                         total_electricity=total_electricity,
-                         total_water=total_water,
-                         total_electricity_cost=total_electricity_cost,
-                         total_water_cost=total_water_cost,
-                         total_cost=total_cost,
-                         building_stats=building_stats,
-                         monthly_stats=monthly_stats)
+                         total_electricity=totals['electricity'],
+                         total_water=totals['water'],
+                         total_electricity_cost=totals['electricity_cost'],
+                         total_water_cost=totals['water_cost'],
+                         total_cost=totals['total_cost'],
+                         building_stats=stats['building_stats'],
+                         monthly_stats=stats['monthly_stats'])
 
 @admin_bp.route('/payments')
 @login_required
@@ -703,10 +696,14 @@ def payments():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    # 获取所有缴费记录
-    payments = Payment.query.order_by(Payment.payment_date.desc()).all()
+    # 分页获取缴费记录
+    page = paginate(payment_list_query(), ListParams.from_request(), Payment.id,
+                    sort_columns={'payment_date': Payment.payment_date, 'amount': Payment.amount},
+                    default_sort='payment_date',
+                    filters={'status': Payment.payment_status,
+                             'building': building_filter(UtilityBill.dorm_id, (UtilityBill, Payment.bill_id == UtilityBill.id))})
     
-    return render_template('admin/payments.html', payments=payments)
+    return render_template('admin/payments.html', payments=page.items, page=page, buildings=_building_choices())
 
 # 报修管理
 @admin_bp.route('/repairs')
@@ -716,8 +713,12 @@ def repairs():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    repairs = Repair.query.filter_by(is_deleted=False).all()  # 只显示未删除的报修
-    return render_template('admin/repairs.html', repairs=repairs)
+    query = repair_list_query().filter_by(is_deleted=False)  # 只显示未删除的报修
+    page = paginate(query, ListParams.from_request(filter_names=('status', 'building', 'q')), Repair.id,
+                    sort_columns={'created_at': Repair.created_at, 'updated_at': Repair.updated_at},
+                    default_sort='created_at',
+                    filters={'status': Repair.status, 'building': building_filter(Repair.dorm_id), 'q': search_filter('repair')})
+    return render_template('admin/repairs.html', repairs=page.items, page=page, buildings=_building_choices())
 
 @admin_bp.route('/get_repair_details/<int:repair_id>')
 @login_required
@@ -812,8 +813,39 @@ def visitors():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    visitors = Visitor.query.filter_by(is_deleted=False).all()  # 只显示未删除的访客
-    return render_template('admin/visitors.html', visitors=visitors)
+    query = visitor_list_query().filter_by(is_deleted=False)  # 只显示未删除的访客
+    page = paginate(query, ListParams.from_request(filter_names=('status', 'building', 'q')), Visitor.id,
+                    sort_columns={'visit_date': Visitor.visit_date, 'name': Visitor.name},
+                    default_sort='visit_date',
+                    filters={'status': Visitor.status,
+                             'building': building_filter(Student.dorm_id, (Student, Visitor.student_id == Student.id)),
+                             'q': search_filter('visitor')})
+    return render_template('admin/visitors.html', visitors=page.items, page=page, buildings=_building_choices())
+
+@admin_bp.route('/visitors/history')
+@login_required
+def visitor_history():
+    if current_user.role != 'admin':
+        flash('无权访问！', 'danger')
+        return redirect(url_for('main.login'))
+    
+    # 已移入历史分区的访问记录，按月份查看（默认最近的月份）
+    months = visitor_log.history_months()
+    params = ListParams.from_request(filter_names=('month',))
+    if params.filters.get('month') not in months:
+        params.filters.pop('month', None)
+        if months:
+            params.filters['month'] = months[0]
+    month = params.filters.get('month')
+    query = visitor_log.history_query(month) if month else None
+    if query is None:
+        return render_template('admin/visitor_history.html', visitors=[], page=None, months=months, month=None)
+    
+    table = visitor_log.history_table(month)
+    page = paginate(query.filter(table.c.is_deleted == False), params, table.c.id,
+                    sort_columns={'visit_date': table.c.visit_date, 'name': table.c.name},
+                    default_sort='visit_date')
+    return render_template('admin/visitor_history.html', visitors=page.items, page=page, months=months, month=month)
 
 @admin_bp.route('/get_visitor_details/<int:visitor_id>')
 @login_required
@@ -863,6 +895,24 @@ def mark_visitor_leave(visitor_id):
     
     return {'success': True, 'message': '标记成功！'}
 
+@admin_bp.route('/visitors/checkout', methods=['POST'])
+@login_required
+def bulk_checkout_visitors():
+    if current_user.role != 'admin':
+        return {'success': False, 'message': '无权访问！'}
+    
+    # 按楼栋/宿舍号/登记时长批量标记离开，条件留空表示不限
+    try:
+        before = checkout_cutoff(request.form.get('older_than'))
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}
+    report = bulk_checkout(
+        building=request.form.get('building') or None,
+        dorm_number=(request.form.get('dorm_number') or '').strip() or None,
+        before=before
+    )
+    return {'success': True, 'message': f'已将 {report.total} 名访客标记为离开！', 'count': report.total}
+
 # 邀请码管理
 @admin_bp.route('/invitation_codes', methods=['GET', 'POST'])
 @login_required
@@ -891,9 +941,29 @@ def password_reset_requests():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    # 显示所有请求，按时间倒序
-    requests = PasswordResetRequest.query.order_by(PasswordResetRequest.request_time.desc()).all()
-    return render_template('admin/password_reset_requests.html', requests=requests)
+    # 分页显示请求，默认按时间倒序
+    page = paginate(password_reset_request_list_query(), ListParams.from_request(), PasswordResetRequest.id,
+                    sort_columns={'request_time': PasswordResetRequest.request_time},
+                    default_sort='request_time',
+                    filters={'status': PasswordResetRequest.status})
+    return render_template('admin/password_reset_requests.html', requests=page.items, page=page)
+
+@admin_bp.route('/password_reset_requests/bulk_approve', methods=['POST'])
+@login_required
+def bulk_approve_password_resets():
+    if current_user.role != 'admin':
+        flash('无权访问！', 'danger')
+        return redirect(url_for('main.login'))
+    
+    request_ids = request.form.getlist('request_ids', type=int)
+    if not request_ids:
+        flash('请选择要通过的申请！', 'warning')
+        return redirect(url_for('admin.password_reset_requests'))
+    
+    result = approve_reset_requests(request_ids, current_user.id)
+    
+    # 直接显示新密码列表和耗时（未绑定邮箱的用户需要管理员线下告知）
+    return render_template('admin/password_reset_bulk_result.html', result=result)
 
 @admin_bp.route('/handle_password_reset/<int:req_id>/<action>', methods=['GET', 'POST'])
 @login_required
@@ -915,20 +985,18 @@ def handle_password_reset(req_id, action):
         chars = string.ascii_letters + string.digits
         new_password = ''.join(random.choices(chars, k=8))
         
-        user.password = generate_password_hash(new_password)
+        user.password = hash_password(new_password)
         req.status = 'completed'
         req.handled_at = datetime.now()
         req.handled_by = current_user.id
+        
+        # 邮件通知写入发件箱，与密码修改在同一事务中提交，由后台线程发送
+        if user.email:
+            send_password_reset_email(user.email, new_password)
         db.session.commit()
         
-        # 发送邮件通知
-        email_sent = False
         if user.email:
-            email_sent = send_password_reset_email(user.email, new_password)
-            if email_sent:
-                flash(f'密码已重置，邮件已发送。新密码：{new_password}', 'success')
-            else:
-                flash(f'密码已重置，但邮件发送失败。新密码：{new_password}', 'warning')
+            flash(f'密码已重置，邮件已加入发送队列。新密码：{new_password}', 'success')
         else:
             flash(f'密码已重置。用户未绑定邮箱。新密码：{new_password}', 'warning')
             
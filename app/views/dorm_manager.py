@@ -2,11 +2,16 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from app import db
 from app.models.models import User, DormManager, Student, Dormitory, Repair, Visitor, DormChangeRequest, PasswordResetRequest
-from werkzeug.security import generate_password_hash
+from app.services.identity import hash_password
 from datetime import datetime
 import random
 import string
 from app.utils import send_password_reset_email
+from app.services.dashboard_counters import get_building_counters
+from app.services.occupancy import lock_dorm_change_request, move_student, DormFullError
+from app.services.pagination import ListParams, paginate
+from app.services.gate import bulk_checkout, checkout_cutoff
+from app.services.queries import student_list_query, repair_list_query, visitor_list_query, dorm_change_request_list_query, password_reset_request_list_query
 
 dorm_manager_bp = Blueprint('dorm_manager', __name__)
 
@@ -17,39 +22,25 @@ def dashboard():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     
-    # 统计数据
-    # 本楼栋学生数量
-    total_students = Student.query.join(Dormitory).filter(
-        Dormitory.building == dorm_manager.responsible_building
-    ).count()
-    
-    # 本楼栋宿舍数量
-    total_dorms = Dormitory.query.filter_by(building=dorm_manager.responsible_building).count()
-    
-    # 本楼栋待处理报修数量
-    pending_repairs = Repair.query.join(Dormitory, Repair.dorm_id == Dormitory.id).filter(
-        Dormitory.building == dorm_manager.responsible_building,
-        Repair.status == 'pending'
-    ).count()
-    
-    # 本楼栋在访访客数量
-    current_visitors = Visitor.query.join(Student).join(Dormitory).filter(
-        Dormitory.building == dorm_manager.responsible_building,
-        Visitor.status == 'in'
-    ).count()
+    # 统计数据（从本楼栋计数缓存读取）
+    counters = get_building_counters(dorm_manager.responsible_building)
+    total_students = counters['total_students']
+    total_dorms = counters['total_dorms']
+    pending_repairs = counters['pending_repairs']
+    current_visitors = counters['current_visitors']
     
     # 获取最新活动
-    latest_repairs = Repair.query.join(Dormitory, Repair.dorm_id == Dormitory.id).filter(
+    latest_repairs = repair_list_query().join(Dormitory, Repair.dorm_id == Dormitory.id).filter(
         Dormitory.building == dorm_manager.responsible_building
     ).order_by(Repair.created_at.desc()).limit(5).all()
     
-    latest_visitors = Visitor.query.join(Student).join(Dormitory).filter(
+    latest_visitors = visitor_list_query().join(Student).join(Dormitory).filter(
         Dormitory.building == dorm_manager.responsible_building
     ).order_by(Visitor.visit_date.desc()).limit(5).all()
     
-    latest_dorm_changes = DormChangeRequest.query.join(Student).join(Dormitory, Student.dorm_id == Dormitory.id).filter(
+    latest_dorm_changes = dorm_change_request_list_query().join(Student).join(Dormitory, Student.dorm_id == Dormitory.id).filter(
         Dormitory.building == dorm_manager.responsible_building
     ).order_by(DormChangeRequest.created_at.desc()).limit(5).all()
     
@@ -97,15 +88,18 @@ def students():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     
-    # 获取本楼栋的所有学生
-    students = Student.query.join(Dormitory).filter(
+    # 分页获取本楼栋的学生
+    query = student_list_query().join(Dormitory).filter(
         Dormitory.building == dorm_manager.responsible_building,
         Student.is_deleted == False
-    ).all()
+    )
+    page = paginate(query, ListParams.from_request(default_order='asc'), Student.id,
+                    sort_columns={'student_id': Student.student_id, 'name': Student.name, 'grade': Student.grade},
+                    default_sort='student_id')
     
-    return render_template('dorm_manager/students.html', students=students, dorm_manager=dorm_manager)
+    return render_template('dorm_manager/students.html', students=page.items, page=page, dorm_manager=dorm_manager)
 
 # 宿舍管理
 @dorm_manager_bp.route('/dormitories')
@@ -115,12 +109,15 @@ def dormitories():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     
-    # 获取本楼栋的所有宿舍
-    dormitories = Dormitory.query.filter_by(building=dorm_manager.responsible_building).all()
+    # 分页获取本楼栋的宿舍
+    query = Dormitory.query.filter_by(building=dorm_manager.responsible_building)
+    page = paginate(query, ListParams.from_request(default_order='asc'), Dormitory.id,
+                    sort_columns={'dorm_number': Dormitory.dorm_number, 'floor': Dormitory.floor, 'current_occupancy': Dormitory.current_occupancy},
+                    default_sort='dorm_number')
     
-    return render_template('dorm_manager/dormitories.html', dormitories=dormitories, dorm_manager=dorm_manager)
+    return render_template('dorm_manager/dormitories.html', dormitories=page.items, page=page, dorm_manager=dorm_manager)
 
 @dorm_manager_bp.route('/get_dorm_students/<int:dorm_id>')
 @login_required
@@ -128,7 +125,7 @@ def get_dorm_students(dorm_id):
     if current_user.role != 'dorm_manager':
         return {'success': False, 'message': '无权访问！'}
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     dormitory = Dormitory.query.get(dorm_id)
     
     # 检查宿舍是否属于当前宿管负责的楼栋
@@ -164,15 +161,19 @@ def repairs():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     
-    # 获取本楼栋的所有报修
-    repairs = Repair.query.join(Dormitory, Repair.dorm_id == Dormitory.id).filter(
+    # 分页获取本楼栋的报修
+    query = repair_list_query().join(Dormitory, Repair.dorm_id == Dormitory.id).filter(
         Dormitory.building == dorm_manager.responsible_building,
         Repair.is_deleted == False
-    ).all()
+    )
+    page = paginate(query, ListParams.from_request(), Repair.id,
+                    sort_columns={'created_at': Repair.created_at, 'updated_at': Repair.updated_at},
+                    default_sort='created_at',
+                    filters={'status': Repair.status})
     
-    return render_template('dorm_manager/repairs.html', repairs=repairs, dorm_manager=dorm_manager)
+    return render_template('dorm_manager/repairs.html', repairs=page.items, page=page, dorm_manager=dorm_manager)
 
 @dorm_manager_bp.route('/process_repair', methods=['POST'])
 @login_required
@@ -204,15 +205,19 @@ def visitors():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     
-    # 获取本楼栋的所有访客
-    visitors = Visitor.query.join(Student).join(Dormitory).filter(
+    # 分页获取本楼栋的访客
+    query = Visitor.query.join(Student).join(Dormitory).filter(
         Dormitory.building == dorm_manager.responsible_building,
         Visitor.is_deleted == False
-    ).all()
+    )
+    page = paginate(query, ListParams.from_request(), Visitor.id,
+                    sort_columns={'visit_date': Visitor.visit_date, 'name': Visitor.name},
+                    default_sort='visit_date',
+                    filters={'status': Visitor.status})
     
-    return render_template('dorm_manager/visitors.html', visitors=visitors, dorm_manager=dorm_manager)
+    return render_template('dorm_manager/visitors.html', visitors=page.items, page=page, dorm_manager=dorm_manager)
 
 @dorm_manager_bp.route('/mark_visitor_leave/<int:visitor_id>', methods=['POST'])
 @login_required
@@ -231,6 +236,24 @@ def mark_visitor_leave(visitor_id):
     
     return {'success': True, 'message': '标记成功！'}
 
+@dorm_manager_bp.route('/visitors/checkout', methods=['POST'])
+@login_required
+def bulk_checkout_visitors():
+    if current_user.role != 'dorm_manager':
+        return {'success': False, 'message': '无权访问！'}
+    
+    # 只处理本楼栋的访客，可再按宿舍号/登记时长筛选
+    try:
+        before = checkout_cutoff(request.form.get('older_than'))
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}
+    report = bulk_checkout(
+        building=current_user.dorm_manager.responsible_building,
+        dorm_number=(request.form.get('dorm_number') or '').strip() or None,
+        before=before
+    )
+    return {'success': True, 'message': f'已将 {report.total} 名访客标记为离开！', 'count': report.total}
+
 # 宿舍调换申请管理
 @dorm_manager_bp.route('/dorm_change_requests')
 @login_required
@@ -239,14 +262,18 @@ def dorm_change_requests():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     
-    # 获取本楼栋的所有宿舍调换申请
-    requests = DormChangeRequest.query.join(Student).join(Dormitory, Student.dorm_id == Dormitory.id).filter(
+    # 分页获取本楼栋的宿舍调换申请
+    query = dorm_change_request_list_query().join(Student).join(Dormitory, Student.dorm_id == Dormitory.id).filter(
         Dormitory.building == dorm_manager.responsible_building
-    ).all()
+    )
+    page = paginate(query, ListParams.from_request(), DormChangeRequest.id,
+                    sort_columns={'created_at': DormChangeRequest.created_at, 'updated_at': DormChangeRequest.updated_at},
+                    default_sort='created_at',
+                    filters={'status': DormChangeRequest.status})
     
-    return render_template('dorm_manager/dorm_change_requests.html', requests=requests, dorm_manager=dorm_manager)
+    return render_template('dorm_manager/dorm_change_requests.html', requests=page.items, page=page, dorm_manager=dorm_manager)
 
 @dorm_manager_bp.route('/approve_dorm_change/<int:request_id>', methods=['POST'])
 @login_required
@@ -255,27 +282,29 @@ def approve_dorm_change(request_id):
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_change_request = DormChangeRequest.query.get(request_id)
+    # 加锁读取，避免同一申请被重复审批
+    dorm_change_request = lock_dorm_change_request(request_id)
     if not dorm_change_request:
         flash('申请不存在！', 'danger')
         return redirect(url_for('dorm_manager.dorm_change_requests'))
+    if dorm_change_request.status != 'pending':
+        db.session.rollback()
+        flash('该申请已处理！', 'danger')
+        return redirect(url_for('dorm_manager.dorm_change_requests'))
     
     # 更新申请状态
     dorm_change_request.status = 'approved'
     dorm_change_request.approved_by = current_user.id
     dorm_change_request.updated_at = datetime.utcnow()
     
-    # 执行宿舍调换
-    student = dorm_change_request.student
-    old_dorm = dorm_change_request.current_dorm
-    new_dorm = dorm_change_request.target_dorm
-    
-    if old_dorm:
-        old_dorm.current_occupancy -= 1
-    
-    if new_dorm:
-        new_dorm.current_occupancy += 1
-        student.dorm_id = new_dorm.id
+    # 执行宿舍调换：目标宿舍原子占用床位，原宿舍释放床位
+    if dorm_change_request.target_dorm_id:
+        try:
+            move_student(dorm_change_request.student, dorm_change_request.target_dorm_id)
+        except DormFullError:
+            db.session.rollback()
+            flash('目标宿舍已满员，无法调换！', 'danger')
+            return redirect(url_for('dorm_manager.dorm_change_requests'))
     
     db.session.commit()
     
@@ -312,14 +341,18 @@ def password_reset_requests():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    dorm_manager = DormManager.query.filter_by(user_id=current_user.id).first()
+    dorm_manager = current_user.dorm_manager
     
-    # 获取本楼栋学生的密码重置申请（显示所有状态）
-    requests = PasswordResetRequest.query.join(User, PasswordResetRequest.user_id == User.id).filter(User.role == 'student').join(Student).join(Dormitory).filter(
+    # 分页获取本楼栋学生的密码重置申请（显示所有状态）
+    query = password_reset_request_list_query().join(User, PasswordResetRequest.user_id == User.id).filter(User.role == 'student').join(Student).join(Dormitory).filter(
         Dormitory.building == dorm_manager.responsible_building
-    ).order_by(PasswordResetRequest.request_time.desc()).all()
+    )
+    page = paginate(query, ListParams.from_request(), PasswordResetRequest.id,
+                    sort_columns={'request_time': PasswordResetRequest.request_time},
+                    default_sort='request_time',
+                    filters={'status': PasswordResetRequest.status})
     
-    return render_template('dorm_manager/password_reset_requests.html', requests=requests, dorm_manager=dorm_manager)
+    return render_template('dorm_manager/password_reset_requests.html', requests=page.items, page=page, dorm_manager=dorm_manager)
 
 @dorm_manager_bp.route('/handle_password_reset/<int:req_id>/<action>', methods=['GET', 'POST'])
 @login_required
@@ -341,20 +374,18 @@ def handle_password_reset(req_id, action):
         chars = string.ascii_letters + string.digits
         new_password = ''.join(random.choices(chars, k=8))
         
-        user.password = generate_password_hash(new_password)
+        user.password = hash_password(new_password)
         req.status = 'completed'
         req.handled_at = datetime.now()
         req.handled_by = current_user.id
+        
+        # 邮件通知写入发件箱，与密码修改在同一事务中提交，由后台线程发送
+        if user.email:
+            send_password_reset_email(user.email, new_password)
         db.session.commit()
         
-        # 发送邮件通知
-        email_sent = False
         if user.email:
-            email_sent = send_password_reset_email(user.email, new_password)
-            if email_sent:
-                flash(f'密码已重置，邮件已发送。新密码：{new_password}', 'success')
-            else:
-                flash(f'密码已重置，但邮件发送失败。新密码：{new_password}', 'warning')
+            flash(f'密码已重置，邮件已加入发送队列。新密码：{new_password}', 'success')
         else:
             flash(f'密码已重置。用户未绑定邮箱。新密码：{new_password}', 'warning')
             
@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
-from app.models.models import User, InvitationCode, PasswordResetRequest, Dormitory
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.models.models import User, InvitationCode, PasswordResetRequest
+from app.services.identity import hash_password, verify_password
+from app.services.reference_data import get_buildings
+from app.services.soft_delete import include_deleted
 import random
 import string
 from datetime import datetime
@@ -22,7 +24,7 @@ def login():
         
         user = User.query.filter_by(username=username, role=user_type).first()
         
-        if user and check_password_hash(user.password, password):
+        if verify_password(user, password):
             login_user(user)
             flash('登录成功！', 'success')
             
@@ -35,11 +37,8 @@ def login():
         else:
             flash('用户名、密码或用户类型错误！', 'danger')
     
-    # 获取楼栋列表供注册使用
-    buildings = db.session.query(Dormitory.building).distinct().all()
-    buildings = [b[0] for b in buildings]
-    
-    return render_template('login.html', buildings=buildings)
+    # 获取楼栋列表供注册使用（参考数据缓存，宿舍表变更时失效）
+    return render_template('login.html', buildings=get_buildings())
 
 @main_bp.route('/logout')
 @login_required
@@ -80,16 +79,16 @@ def register():
             flash('两次输入的密码不一致！', 'danger')
         else:
             # 检查用户名和邮箱是否已存在
-            if User.query.filter_by(username=username).first():
+            if include_deleted(User.query).filter_by(username=username).first():
                 flash('学号/工号已存在！', 'danger')
-            elif User.query.filter_by(email=email).first():
+            elif include_deleted(User.query).filter_by(email=email).first():
                 flash('邮箱已存在！', 'danger')
             else:
                 # 创建用户
                 user = User(
                     username=username,
                     email=email,
-                    password=generate_password_hash(password),
+                    password=hash_password(password),
                     role=user_type
                 )
                 
@@ -129,11 +128,8 @@ def register():
                 flash('注册成功！请登录', 'success')
                 return redirect(url_for('main.login'))
     
-    # 获取楼栋列表供注册使用
-    buildings = db.session.query(Dormitory.building).distinct().all()
-    buildings = [b[0] for b in buildings]
-    
-    return render_template('login.html', buildings=buildings)
+    # 获取楼栋列表供注册使用（参考数据缓存，宿舍表变更时失效）
+    return render_template('login.html', buildings=get_buildings())
 
 @main_bp.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
@@ -3,11 +3,19 @@ from flask_login import login_required, current_user
 from app import db
 from app.models.models import Student, Repair, Dormitory, Visitor, DormChangeRequest, UtilityBill, Payment
 import os
-import qrcode
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.services.queries import dorm_change_request_list_query
+from app.services.photos import replace_student_photo, PhotoError
+from app.services.reference_data import get_available_dorms
 
 student_bp = Blueprint('student', __name__)
 
+@student_bp.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    # 请求体超过 MAX_CONTENT_LENGTH 时，CSRF 校验在进入视图前解析表单就会抛出，只能在这里处理
+    flash('上传的文件过大！', 'danger')
+    return redirect(request.path)
+
 @student_bp.route('/dashboard')
 @login_required
 def dashboard():
@@ -15,7 +23,7 @@ def dashboard():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     return render_template('student/dashboard.html', student=student)
 
 @student_bp.route('/my_info', methods=['GET', 'POST'])
@@ -25,28 +33,17 @@ def my_info():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     
     if request.method == 'POST':
-        # 处理照片上传
-        if 'photo' in request.files:
-            file = request.files['photo']
-            if file.filename != '':
-                # 确保上传目录存在
-                upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                
-                # 保存文件
-                filename = secure_filename(file.filename)
-                file_ext = os.path.splitext(filename)[1].lower()
-                new_filename = f'student_{student.id}{file_ext}'
-                file_path = os.path.join(upload_folder, new_filename)
-                file.save(file_path)
-                
-                # 更新学生照片路径
-                student.photo = f'uploads/{new_filename}'
-                db.session.commit()
+        # 处理照片上传（分块写入磁盘、按内容去重，缩略图由后台任务生成）
+        file = request.files.get('photo')
+        if file and file.filename != '':
+            try:
+                replace_student_photo(student, file)
                 flash('照片上传成功！', 'success')
+            except PhotoError as e:
+                flash(str(e), 'danger')
     
     return render_template('student/my_info.html', student=student)
 
@@ -57,7 +54,7 @@ def my_dorm():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     dorm = Dormitory.query.get(student.dorm_id) if student.dorm_id else None
     roommates = []
     if dorm:
@@ -71,7 +68,7 @@ def submit_repair():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     
     if request.method == 'POST':
         title = request.form['title']
@@ -109,7 +106,7 @@ def my_repairs():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     repairs = Repair.query.filter_by(student_id=student.id, is_deleted=False).all()
     
     return render_template('student/my_repairs.html', repairs=repairs)
@@ -121,7 +118,7 @@ def visitor_register():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     
     if request.method == 'POST':
         name = request.form['name']
@@ -141,32 +138,8 @@ def visitor_register():
             student_id=student.id
         )
         
+        # 二维码在查看时按需生成（见 api.visitor_qr_code），登记时不再写图片文件
         db.session.add(visitor)
-        db.session.flush()  # 获取visitor.id
-        
-        # 生成QR码
-        qr_data = f"visitor_id={visitor.id}&name={name}&id_card={id_card}&visit_date={visitor.visit_date.strftime('%Y-%m-%d %H:%M:%S')}"
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # 保存QR码图片
-        qr_folder = os.path.join(current_app.root_path, 'static', 'qr_codes')
-        os.makedirs(qr_folder, exist_ok=True)
-        qr_filename = f"visitor_{visitor.id}.png"
-        qr_path = os.path.join(qr_folder, qr_filename)
-        img.save(qr_path)
-        
-        # 更新访客记录的QR码路径
-        visitor.qr_code = f"qr_codes/{qr_filename}"
-        
         db.session.commit()
         
         flash('访客登记成功！', 'success')
@@ -181,7 +154,7 @@ def my_visitors():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     visitors = Visitor.query.filter_by(student_id=student.id, is_deleted=False).all()
     
     return render_template('student/my_visitors.html', visitors=visitors)
@@ -193,7 +166,7 @@ def submit_dorm_change():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     
     if request.method == 'POST':
         target_dorm_id = request.form.get('target_dorm_id')
@@ -214,11 +187,7 @@ def submit_dorm_change():
         return redirect(url_for('student.my_dorm'))
     
     # 获取可选的宿舍列表（同性别、未满员的宿舍）
-    available_dorms = Dormitory.query.filter(
-        Dormitory.gender == student.gender,
-        Dormitory.current_occupancy < Dormitory.capacity,
-        Dormitory.id != student.dorm_id
-    ).all()
+    available_dorms = get_available_dorms(student.gender, exclude_dorm_id=student.dorm_id)
     
     return render_template('student/submit_dorm_change.html', student=student, available_dorms=available_dorms)
 
@@ -229,8 +198,8 @@ def my_dorm_change_requests():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
-    requests = DormChangeRequest.query.filter_by(student_id=student.id).order_by(DormChangeRequest.created_at.desc()).all()
+    student = current_user.student
+    requests = dorm_change_request_list_query().filter_by(student_id=student.id).order_by(DormChangeRequest.created_at.desc()).all()
     
     return render_template('student/my_dorm_change_requests.html', requests=requests)
 
@@ -241,7 +210,7 @@ def my_utility_bills():
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     
     # 获取学生宿舍的水电费账单
     bills = UtilityBill.query.join(Dormitory, UtilityBill.dorm_id == Dormitory.id).join(Student, Dormitory.id == Student.dorm_id).filter(Student.id == student.id).all()
@@ -255,7 +224,7 @@ def pay_utility_bill(bill_id):
         flash('无权访问！', 'danger')
         return redirect(url_for('main.login'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     bill = UtilityBill.query.get_or_404(bill_id)
     
     # 检查账单是否属于该学生
@@ -1,5 +1,6 @@
 # 配置文件
 import os
+import json
 import tempfile
 
 class Config:
@@ -21,7 +22,109 @@ class Config:
     # 邮件配置 (163邮箱示例)
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.163.com'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 465)
-    MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL') == 'True' or True
+    MAIL_USE_SSL = (os.environ.get('MAIL_USE_SSL') or 'True') == 'True'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME') or 'm13136064359@163.com'  # 请替换为真实邮箱
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD') or 'XSTKpwH3WgtcPmiP'      # 请替换为真实授权码
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'm13136064359@163.com'
+    
+    # 发件箱配置：MAIL_BACKEND=console 时只打印到控制台；调试时可运行 python -m app.services.mail_debug_server
+    # 并设置 MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_SSL=False
+    MAIL_BACKEND = os.environ.get('MAIL_BACKEND') or 'smtp'
+    MAIL_TIMEOUT = int(os.environ.get('MAIL_TIMEOUT') or 30)
+    MAIL_QUEUE_THREAD = (os.environ.get('MAIL_QUEUE_THREAD') or 'True') == 'True'
+    MAIL_POLL_INTERVAL = int(os.environ.get('MAIL_POLL_INTERVAL') or 30)  # 秒
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or 50)
+    MAIL_SEND_LEASE = int(os.environ.get('MAIL_SEND_LEASE') or 600)  # 秒
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS') or 5)
+    MAIL_RETRY_BACKOFF = int(os.environ.get('MAIL_RETRY_BACKOFF') or 30)  # 秒，每次失败后翻倍
+    MAIL_RETRY_BACKOFF_MAX = int(os.environ.get('MAIL_RETRY_BACKOFF_MAX') or 3600)
+    # 已发送/已放弃的邮件发送后即清空正文（含新密码），保留 MAIL_OUTBOX_RETENTION_DAYS 天后删除
+    # MAIL_OUTBOX_PURGE_INTERVAL 为自动清理的间隔（秒，0 表示关闭）
+    MAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get('MAIL_OUTBOX_RETENTION_DAYS') or 7)
+    MAIL_OUTBOX_PURGE_INTERVAL = int(os.environ.get('MAIL_OUTBOX_PURGE_INTERVAL') or 86400)
+    
+    # 缓存配置（未配置 CACHE_REDIS_URL 时使用进程内缓存）
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX') or 'dormitory:'
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL') or 300)
+    # 楼栋/宿舍下拉框等参考数据的缓存时间（秒），宿舍表变更时立即失效
+    REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL') or 3600)
+    # 登录用户及其学生/宿管资料的缓存时间（秒，0 表示不缓存）；进程内缓存时其他 worker 的修改最多延迟这么久生效
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 30)
+    
+    # 响应压缩（超过 COMPRESS_MIN_SIZE 字节的 JSON 和文本响应，HTML 页面不压缩；安装 brotli 包后优先使用 br）
+    COMPRESS_ENABLED = (os.environ.get('COMPRESS_ENABLED') or 'True') == 'True'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 500)
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY') or 5)
+    # 变化缓慢的参考数据的浏览器缓存时间（秒）：楼栋列表 / 宿管的宿舍列表
+    REFERENCE_DATA_MAX_AGE = int(os.environ.get('REFERENCE_DATA_MAX_AGE') or 300)
+    DORM_LIST_MAX_AGE = int(os.environ.get('DORM_LIST_MAX_AGE') or 60)
+    
+    # 管理员批量接口单次请求最多处理的记录数
+    API_BATCH_MAX_ITEMS = int(os.environ.get('API_BATCH_MAX_ITEMS') or 1000)
+    
+    # 后台任务配置（JOB_WORKERS=0 时同步执行）
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_UPLOAD_FOLDER = os.environ.get('JOB_UPLOAD_FOLDER') or tempfile.gettempdir()
+    # 周期任务调度线程（如自动归档），每 JOB_SCHEDULER_TICK 秒检查一次是否有到期的任务
+    JOB_SCHEDULER_ENABLED = (os.environ.get('JOB_SCHEDULER_ENABLED') or 'True') == 'True'
+    JOB_SCHEDULER_TICK = int(os.environ.get('JOB_SCHEDULER_TICK') or 60)
+    
+    # 软删除归档：删除超过 SOFT_DELETE_RETENTION_DAYS 天的记录移入对应的 *_archive 表
+    # ARCHIVE_INTERVAL 为自动归档的间隔（秒，0 表示只能通过 python alter_db.py --archive-deleted 手动归档）
+    SOFT_DELETE_RETENTION_DAYS = int(os.environ.get('SOFT_DELETE_RETENTION_DAYS') or 30)
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 500)
+    ARCHIVE_INTERVAL = int(os.environ.get('ARCHIVE_INTERVAL') or 86400)
+
+    # 宿管端实时推送（SSE）：每 SSE_HEARTBEAT 秒发送一次心跳，连接保持 SSE_MAX_AGE 秒后由浏览器自动重连；
+    # 每个 worker 最多 SSE_MAX_CLIENTS 个连接（每个连接占用一个 gthread 线程，须小于 gunicorn --threads），
+    # 单个连接积压超过 SSE_QUEUE_SIZE 条消息时通知页面刷新。多个 worker 时须配置 CACHE_REDIS_URL 才能互相转发事件
+    SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT') or 15)
+    SSE_MAX_AGE = int(os.environ.get('SSE_MAX_AGE') or 300)
+    SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS') or 200)
+    SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE') or 100)
+    SSE_RETRY = int(os.environ.get('SSE_RETRY') or 5000)  # 断线重连间隔（毫秒）
+
+    # 访客记录轮转：早于 VISITOR_HOT_DAYS 天且已离开的访问按月移入 visitor_history_YYYY_MM 历史分区
+    # 历史分区保留 VISITOR_HISTORY_RETENTION_MONTHS 个月（0 表示永久保留），VISITOR_ROTATE_INTERVAL 为自动轮转的间隔（秒，0 表示关闭）
+    # 超过 QR_CACHE_MAX_AGE_DAYS 天未修改的二维码缓存文件在轮转时删除
+    VISITOR_HOT_DAYS = int(os.environ.get('VISITOR_HOT_DAYS') or 30)
+    VISITOR_ROTATE_BATCH_SIZE = int(os.environ.get('VISITOR_ROTATE_BATCH_SIZE') or 1000)
+    VISITOR_ROTATE_INTERVAL = int(os.environ.get('VISITOR_ROTATE_INTERVAL') or 86400)
+    VISITOR_HISTORY_RETENTION_MONTHS = int(os.environ.get('VISITOR_HISTORY_RETENTION_MONTHS') or 24)
+    QR_CACHE_MAX_AGE_DAYS = int(os.environ.get('QR_CACHE_MAX_AGE_DAYS') or 30)
+    
+    # 水电费阶梯单价（JSON）：[[本档上限, 单价], ...]，最后一档上限为 null
+    # 例如 [[100, 0.6], [200, 0.8], [null, 1.2]] 表示前100度0.6元/度，100-200度0.8元/度，其余1.2元/度
+    ELECTRICITY_TARIFFS = json.loads(os.environ.get('ELECTRICITY_TARIFFS') or '[[null, 1.0]]')
+    WATER_TARIFFS = json.loads(os.environ.get('WATER_TARIFFS') or '[[null, 2.0]]')
+    
+    # 密码哈希算法和成本（werkzeug 格式，如 scrypt、scrypt:16384:8:1、pbkdf2:sha256:600000）
+    # 修改后旧密码仍可登录，并在用户下次登录时自动按新配置重新哈希
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt'
+    
+    # 批量重置密码时并行计算哈希的线程数（0 表示按CPU核数自动选择，最多4个）
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 0)
+    
+    # 访客二维码缓存（磁盘目录默认为 instance/qr_cache）
+    QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')
+    QR_MEMORY_CACHE_SIZE = int(os.environ.get('QR_MEMORY_CACHE_SIZE') or 256)
+    QR_CACHE_MAX_AGE = int(os.environ.get('QR_CACHE_MAX_AGE') or 86400)  # 秒
+    
+    # 访客二维码令牌的签名密钥（未配置时由 SECRET_KEY 派生）和有效期（登记后天数，0 表示不过期）
+    VISITOR_QR_SECRET = os.environ.get('VISITOR_QR_SECRET')
+    VISITOR_QR_MAX_AGE_DAYS = int(os.environ.get('VISITOR_QR_MAX_AGE_DAYS') or 7)
+    
+    # 每晚自动清场：每天 VISITOR_SWEEP_TIME（HH:MM，为空表示关闭）把登记超过 VISITOR_SWEEP_MIN_AGE_HOURS 小时仍在访的访客标记为离开
+    VISITOR_SWEEP_TIME = os.environ.get('VISITOR_SWEEP_TIME', '23:30')
+    VISITOR_SWEEP_MIN_AGE_HOURS = int(os.environ.get('VISITOR_SWEEP_MIN_AGE_HOURS') or 1)
+    
+    # 上传限制与学生照片缩略图（边长，像素）
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024)
+    PHOTO_MAX_BYTES = int(os.environ.get('PHOTO_MAX_BYTES') or 5 * 1024 * 1024)
+    PHOTO_VARIANTS = {'thumb': 96, 'medium': 320}
+    # 未被任何学生引用的照片由后台任务清理：跳过 PHOTO_PURGE_GRACE 秒内写入或复用过的文件
+    # PHOTO_PURGE_INTERVAL 为自动清理的间隔（秒，0 表示关闭）
+    PHOTO_PURGE_GRACE = int(os.environ.get('PHOTO_PURGE_GRACE') or 3600)
+    PHOTO_PURGE_INTERVAL = int(os.environ.get('PHOTO_PURGE_INTERVAL') or 86400)
@@ -1,6 +1,6 @@
 from app import create_app, db
 from flask_login import LoginManager
-from app.models.models import User
+from app.services.identity import load_user
 import os
 
 app = create_app()
@@ -9,26 +9,26 @@ app = create_app()
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'main.login'
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+# 一次查询加载用户及其学生/宿管资料，并按用户ID短时缓存
+login_manager.user_loader(load_user)
 
 # 确保instance目录存在
 if not os.path.exists('instance'):
     os.makedirs('instance')
 
-# 创建数据库表
+# 创建数据库表并执行迁移
 with app.app_context():
     db.create_all()
+    from app.migrations import upgrade
+    upgrade()
     # 检查并创建默认超级管理员
     from app.models.models import User
-    from werkzeug.security import generate_password_hash
+    from app.services.identity import hash_password
     admin = User.query.filter_by(username='123').first()
     if not admin:
         admin = User(
             username='123',
-            password=generate_password_hash('123'),
+            password=hash_password('123'),
             role='admin'
         )
         db.session.add(admin)
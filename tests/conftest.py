@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+# 测试使用临时目录下的独立 SQLite 数据库，并关闭发件箱线程、周期任务调度和任务线程池（任务同步执行）
+# 须在导入 app 之前设置：Config 在导入时读取环境变量
+_TEST_DIR = tempfile.mkdtemp(prefix='dormitory-tests-')
+TEST_DATABASE = os.path.join(_TEST_DIR, 'test.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + TEST_DATABASE
+os.environ['MAIL_QUEUE_THREAD'] = 'False'
+os.environ['MAIL_BACKEND'] = 'console'
+os.environ['JOB_SCHEDULER_ENABLED'] = 'False'
+os.environ['JOB_WORKERS'] = '0'
+
+import pytest
+from flask import g
+from flask_login import LoginManager
+from app import create_app, db
+from app.migrations import upgrade
+from app.models.models import User
+from app.services.identity import load_user
+
+def make_app():
+    """
+    创建使用全新数据库的应用（与 run.py 相同：建表、执行迁移、配置 Flask-Login）
+    """
+    if os.path.exists(TEST_DATABASE):
+        os.remove(TEST_DATABASE)
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.user_loader(load_user)
+    with app.app_context():
+        db.create_all()
+        upgrade()
+    return app
+
+def login(client, username):
+    """
+    直接写入会话登录，不经过登录页的密码校验
+    """
+    # 测试中外层应用上下文一直存在，清除 Flask-Login 缓存在 g 上的上一个用户
+    g.pop('_login_user', None)
+    user = User.query.filter_by(username=username).first()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+@pytest.fixture
+def app():
+    app = make_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
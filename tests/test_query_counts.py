@@ -0,0 +1,108 @@
+from datetime import datetime
+import pytest
+from app import db
+from app.models.models import User, Student, Dormitory, DormManager, Repair, Visitor, UtilityBill, Payment, DormChangeRequest, PasswordResetRequest
+from app.services.queries import count_queries
+from conftest import make_app, login
+
+# 列表页发出的 SQL 语句数不能随行数增长（N+1 懒加载）：分别在 N 行和 4N 行的数据上渲染同一页面，语句数必须相同
+# (登录用户, 页面)；per_page 足够大，保证所有行都在第一页渲染
+LIST_PAGES = [
+    ('admin', '/admin/dashboard'),
+    ('admin', '/admin/students'),
+    ('admin', '/admin/repairs'),
+    ('admin', '/admin/visitors'),
+    ('admin', '/admin/payments'),
+    ('admin', '/admin/utility_bills'),
+    ('admin', '/admin/password_reset_requests'),
+    ('admin', '/admin/dormitories'),
+    ('dmA', '/dorm_manager/dashboard'),
+    ('dmA', '/dorm_manager/students'),
+    ('dmA', '/dorm_manager/visitors'),
+    ('dmA', '/dorm_manager/dorm_change_requests'),
+    ('dmA', '/dorm_manager/password_reset_requests'),
+    ('dmA', '/dorm_manager/dormitories'),
+    ('s1', '/student/my_dorm_change_requests'),
+]
+PER_PAGE = 200
+
+def seed(scale):
+    """
+    每个单位：10 间宿舍（A/B 两栋）、20 名学生及其报修、访客、账单、缴费、调宿申请和密码重置申请
+    """
+    admin = User(username='admin', password='x', role='admin')
+    db.session.add(admin)
+    for building in ('A', 'B'):
+        user = User(username=f'dm{building}', password='x', role='dorm_manager')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(DormManager(user_id=user.id, name=f'dm{building}', phone='1', responsible_building=building))
+
+    dorms = []
+    for i in range(10 * scale):
+        dorm = Dormitory(dorm_number=f'{i:04d}', building='AB'[i % 2], floor=1, capacity=4, current_occupancy=0, gender='男')
+        db.session.add(dorm)
+        dorms.append(dorm)
+    db.session.flush()
+
+    students = []
+    for i in range(20 * scale):
+        user = User(username=f's{i}', password='x', role='student', email=f's{i}@example.com')
+        db.session.add(user)
+        db.session.flush()
+        dorm = dorms[i % len(dorms)]
+        dorm.current_occupancy += 1
+        student = Student(user_id=user.id, student_id=f'S{i}', name=f'stu{i}', gender='男', major='cs', grade='1',
+                          phone='1', dorm_id=dorm.id)
+        db.session.add(student)
+        students.append(student)
+    db.session.flush()
+
+    for i, student in enumerate(students):
+        db.session.add(Repair(dorm_id=student.dorm_id, student_id=student.id, title=f'r{i}', content='c',
+                              location_type='dorm', repair_type='water', location_detail='x', contact_phone='1',
+                              status='pending' if i % 2 else 'completed'))
+        db.session.add(Visitor(name=f'v{i}', id_card='1', phone='1', purpose='p', dorm_number=dorms[i % len(dorms)].dorm_number,
+                               student_name=student.name, student_id=student.id))
+        db.session.add(DormChangeRequest(student_id=student.id, current_dorm_id=student.dorm_id,
+                                         target_dorm_id=dorms[(i + 1) % len(dorms)].id, reason='r'))
+        db.session.add(PasswordResetRequest(user_id=student.user_id))
+    for i, dorm in enumerate(dorms):
+        bill = UtilityBill(dorm_id=dorm.id, month='2024-01', electricity=1, water=1, electricity_cost=1, water_cost=1,
+                           total_cost=2, due_date=datetime(2024, 1, 28))
+        db.session.add(bill)
+        db.session.flush()
+        db.session.add(Payment(bill_id=bill.id, student_id=students[i].id, amount=2, payment_method='cash'))
+    db.session.commit()
+
+def statement_counts(scale):
+    """
+    在 scale 倍数据上请求每个列表页，返回 {页面: SQL 语句数}
+
+    每个页面先请求一次预热登录身份、参考数据和仪表板计数等缓存，只统计第二次请求
+    """
+    app = make_app()
+    counts = {}
+    with app.app_context():
+        seed(scale)
+        client = app.test_client()
+        for username, url in LIST_PAGES:
+            login(client, username)
+            db.session.remove()
+            assert client.get(url, query_string={'per_page': PER_PAGE}).status_code == 200, url
+            db.session.remove()
+            with count_queries() as counter:
+                response = client.get(url, query_string={'per_page': PER_PAGE})
+            assert response.status_code == 200, url
+            counts[url] = counter.count
+        db.session.remove()
+        db.engine.dispose()
+    return counts
+
+@pytest.fixture(scope='module')
+def counts():
+    return {scale: statement_counts(scale) for scale in (1, 4)}
+
+@pytest.mark.parametrize('url', [url for _, url in LIST_PAGES])
+def test_list_page_statement_count_is_constant(counts, url):
+    assert counts[4][url] == counts[1][url], f'{url}: {counts[1][url]} 条语句（N 行）-> {counts[4][url]} 条（4N 行）'